@@ -0,0 +1,196 @@
+import math
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from configurator_core import ConfiguratorCore
+from transaction import Transaction, read_text, write_text
+
+# Times the file operations behind the configurator's buttons on synthetic installs that
+# are 1x, 10x, 100x and 1000x the size of the shipped files, to catch regressions and
+# operations that grow faster than the files do.
+#
+# Each tree is built from this install's resource/ and "configurator files/": SDL files
+# (.set/.inc) get their top-level blocks repeated, Lua files get commented-out copies of
+# their code appended, so every parser and regex sees scale times the bytes. The GUI
+# only stages edits and hands them to ConfiguratorCore, which needs no Tk, so the same
+# calls are timed here without a display. Caches are dropped before every run, so each
+# number includes reading the files.
+#
+#   python ce_cli.py bench --scales 1 10 100 --repeat 5 --out bench.json
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+BENCH_PERIODS = ["normal", "late"]
+SUPER_LINEAR_EXPONENT = 1.2
+
+
+def inflate_sdl(text: str, scale: int) -> str:
+    header, newline, body = text.partition("\n") if text.startswith(";SDL") else ("", "", text)
+    return header + newline + body + "".join(f"\n;synthetic copy {i}\n{body}" for i in range(2, scale + 1))
+
+
+def inflate_lua(text: str, scale: int) -> str:
+    commented = "".join(f"-- {line}" for line in text.splitlines(True))
+    if not commented.endswith("\n"):
+        commented += "\n"
+    return text + "".join(f"\n-- synthetic copy {i}\n{commented}" for i in range(2, scale + 1))
+
+
+def inflate_file(src: str, dst: str, scale: int) -> int:
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if scale > 1 and src.endswith((".set", ".inc")):
+        write_text(dst, inflate_sdl(read_text(src), scale))
+    elif scale > 1 and src.endswith(".lua"):
+        write_text(dst, inflate_lua(read_text(src), scale))
+    else:
+        shutil.copyfile(src, dst)
+    return os.path.getsize(dst)
+
+
+def build_tree(config: Dict[str, Any], root: str, scale: int, periods: Sequence[str] = BENCH_PERIODS) -> int:
+    # resource/ and the period folders of the template install, inflated; returns the tree size in bytes
+    source_root = os.path.join(config.get("source_dir", config['base_dir']), "configurator files")
+    folders = {os.path.join(config['base_dir'], "resource"): os.path.join(root, "resource")}
+    for period in periods:
+        folder = period if period == "normal" else f"{period}war"
+        folders[os.path.join(source_root, folder)] = os.path.join(root, "configurator files", folder)
+    size = 0
+    for folder, target in folders.items():
+        for directory, _, files in os.walk(folder):
+            for file in files:
+                src = os.path.join(directory, file)
+                size += inflate_file(src, os.path.join(target, os.path.relpath(src, folder)), scale)
+    # the modded/vanilla ballistics and resupply sources
+    for file in os.listdir(source_root):
+        src = os.path.join(source_root, file)
+        if os.path.isfile(src):
+            size += inflate_file(src, os.path.join(root, "configurator files", file), scale)
+    return size
+
+
+def tree_config(config: Dict[str, Any], root: str, periods: Sequence[str] = BENCH_PERIODS) -> Dict[str, Any]:
+    state = os.path.join(root, "state")
+    return {
+        "base_dir": root,
+        "backup_dir": os.path.join(state, "backups"),
+        "index_file": os.path.join(state, "file_index.json"),
+        "hash_cache_file": os.path.join(state, "hash_cache.json"),
+        "journal_dir": os.path.join(state, "journal"),
+        "roster_index_file": os.path.join(state, "roster_index.sqlite"),
+        "history_file": os.path.join(state, "history.jsonl"),
+        "backup_compress": config.get("backup_compress", True),
+        "backup_keep": config.get("backup_keep", 50),
+        "periods": list(periods),
+        "files_to_update": config['files_to_update'],
+    }
+
+
+def _commit(core: ConfiguratorCore, stage: Callable[[Transaction], None]) -> int:
+    transaction = Transaction()
+    stage(transaction)
+    files = transaction.files
+    core.commit(transaction)
+    return sum(os.path.getsize(file) for file in files)
+
+
+def operations(core: ConfiguratorCore, periods: Sequence[str]) -> Dict[str, Callable[[int], int]]:
+    # name -> function of the run number returning the bytes it touched; values change every run so files are written
+    difficulty = core.difficulty_file("normal")
+
+    def parse_difficulty(run: int) -> int:
+        core.models.document(difficulty)
+        return os.path.getsize(difficulty)
+
+    def switch(run: int) -> int:
+        stats = core.update_files(periods[(run + 1) % len(periods)])
+        return stats["copied_bytes"] + stats["skipped_bytes"]
+
+    def backup(run: int) -> int:
+        return sum(entry.get("size", 0) for entry in core.backup_files("benchmark")["files"].values())
+
+    def rollback(run: int) -> int:
+        core.rollback()
+        return sum(os.path.getsize(core.resource_target(file)) for file in core.config['files_to_update'])
+
+    def preview(run: int) -> int:
+        return sum(len(diff.new) for diff in core.preview_period(periods[(run + 1) % len(periods)]))
+
+    return {
+        "parse_difficulty": parse_difficulty,
+        "points_to_win": lambda run: _commit(core, lambda t: core.stage_points_to_win(t, str(500 + run))),
+        "preparation_times": lambda run: _commit(core, lambda t: core.stage_preparation_time(
+            t, core.preparation_file(), {"oneFlagOffsetTime": str(500 + run)})),
+        "bot_resources": lambda run: _commit(core, lambda t: core.stage_bot_resources(
+            t, difficulty, f"{2 + run % 5}.0")),
+        "player_army_size": lambda run: _commit(core, lambda t: core.stage_player_army_size(
+            t, difficulty, str(90 + run), str(500 + run))),
+        "ammo_regen": lambda run: _commit(core, lambda t: core.stage_ammo_regen(
+            t, core.resupply_file(), run % 2 == 0)),
+        "backup_files": backup,
+        "update_files": switch,
+        "rollback": rollback,
+        "preview_period": preview,
+    }
+
+
+def run_scale(config: Dict[str, Any], root: str, scale: int, repeat: int,
+              names: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    tree_bytes = build_tree(config, root, scale)
+    core = ConfiguratorCore(tree_config(config, root))
+    core.update_files(BENCH_PERIODS[0])
+    results = []
+    for name, operation in operations(core, BENCH_PERIODS).items():
+        if names and name not in names:
+            continue
+        timings = []
+        touched = 0
+        for run in range(repeat):
+            core.models.invalidate()
+            start = time.perf_counter()
+            touched = operation(run)
+            timings.append(time.perf_counter() - start)
+        results.append({"scale": scale, "operation": name, "tree_bytes": tree_bytes, "bytes": touched,
+                        "median_ms": round(statistics.median(timings) * 1000, 3),
+                        "min_ms": round(min(timings) * 1000, 3), "max_ms": round(max(timings) * 1000, 3),
+                        "mb_per_s": round(touched / statistics.median(timings) / 1e6, 2) if touched else 0.0})
+    return results
+
+
+def scaling(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # growth exponent of the median time between consecutive scales: 1 is linear, 2 quadratic
+    by_operation: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_operation.setdefault(result["operation"], []).append(result)
+    summary = {}
+    for name, runs in by_operation.items():
+        runs.sort(key=lambda result: result["scale"])
+        exponents = [round(math.log(max(b["median_ms"], 1e-3) / max(a["median_ms"], 1e-3)) /
+                           math.log(b["scale"] / a["scale"]), 2) for a, b in zip(runs, runs[1:])]
+        summary[name] = {"exponents": exponents,
+                         "super_linear": bool(exponents) and exponents[-1] > SUPER_LINEAR_EXPONENT}
+    return summary
+
+
+def run_benchmarks(config: Dict[str, Any], scales: Sequence[int] = DEFAULT_SCALES, repeat: int = 5,
+                   names: Optional[Sequence[str]] = None, work_dir: Optional[str] = None,
+                   progress: Optional[Callable[[int, int, str], None]] = None) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    for i, scale in enumerate(scales):
+        if progress:
+            progress(i, len(scales), f"{scale}x")
+        with tempfile.TemporaryDirectory(prefix=f"ce-bench-{scale}x-", dir=work_dir) as root:
+            results += run_scale(config, root, scale, repeat, names)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "scales": list(scales),
+        "results": results,
+        "scaling": scaling(results),
+    }
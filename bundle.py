@@ -0,0 +1,115 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, NamedTuple, Optional
+
+from tracing import span
+
+# One packed file per war period holding the files update_files copies, so a period switch
+# opens and maps a single file instead of walking the period folder and opening each file.
+#
+#   magic "CEBUNDL1"  |  uint32 index length  |  JSON index  |  member data
+#
+# The index maps each file name to its offset and length in the data, its uncompressed
+# size, SHA-1 (the same digest the hash cache uses) and the size and mtime of the source
+# file it was built from. Members are stored as is, or zlib-compressed; uncompressed
+# members are handed out as memoryview slices of the mapping without being copied. A
+# bundle whose sources changed on disk is stale and is rebuilt by the core.
+
+MAGIC = b"CEBUNDL1"
+HEADER = struct.Struct("<I")
+
+
+class BundleMember(NamedTuple):
+    offset: int
+    length: int
+    size: int
+    compressed: bool
+    digest: str
+    source_size: int
+    source_mtime_ns: int
+
+
+def build_bundle(bundle_path: str, sources: Dict[str, str], compress: bool = False) -> Dict[str, int]:
+    # sources maps member names to the files to pack; written to a temp file and renamed into place
+    index: Dict[str, list] = {}
+    chunks = []
+    offset = 0
+    for name, source in sources.items():
+        stat = os.stat(source)
+        with span("read", path=source, size=stat.st_size), open(source, "rb") as f:
+            data = f.read()
+        stored = zlib.compress(data, 6) if compress else data
+        index[name] = list(BundleMember(offset, len(stored), len(data), compress, hashlib.sha1(data).hexdigest(),
+                                        stat.st_size, stat.st_mtime_ns))
+        chunks.append(stored)
+        offset += len(stored)
+
+    header = json.dumps({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "members": index}).encode("utf-8")
+    os.makedirs(os.path.dirname(os.path.abspath(bundle_path)), exist_ok=True)
+    tmp_path = f"{bundle_path}.tmp"
+    with span("write", "bundle", bundle_path, offset), open(tmp_path, "wb") as f:
+        f.write(MAGIC + HEADER.pack(len(header)) + header)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, bundle_path)
+    return {"members": len(index), "stored_bytes": offset,
+            "source_bytes": sum(member[2] for member in index.values())}
+
+
+class PeriodBundle:
+    def __init__(self, bundle_path: str):
+        self.path = bundle_path
+        with span("read", "bundle map", bundle_path), open(bundle_path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self.map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a period bundle: {bundle_path}")
+            length, = HEADER.unpack_from(self.map, len(MAGIC))
+            start = len(MAGIC) + HEADER.size
+            header = json.loads(bytes(self.map[start:start + length]).decode("utf-8"))
+            self.data_offset = start + length
+            self.members: Dict[str, BundleMember] = {
+                name: BundleMember(*member) for name, member in header["members"].items()}
+        except Exception:
+            self.map.close()
+            raise
+
+    def close(self):
+        self.map.close()
+
+    def stale(self, sources: Dict[str, str]) -> bool:
+        # a member was added, removed, or its source has a different size or mtime
+        if set(sources) != set(self.members):
+            return True
+        for name, source in sources.items():
+            try:
+                stat = os.stat(source)
+            except FileNotFoundError:
+                return True
+            member = self.members[name]
+            if stat.st_size != member.source_size or stat.st_mtime_ns != member.source_mtime_ns:
+                return True
+        return False
+
+    def read(self, name: str) -> memoryview:
+        # a slice of the mapping for stored members, decompressed bytes otherwise
+        member = self.members[name]
+        start = self.data_offset + member.offset
+        view = memoryview(self.map)[start:start + member.length]
+        return memoryview(zlib.decompress(view)) if member.compressed else view
+
+    def extract(self, name: str, file_path: str):
+        with span("copy", "bundle member", file_path, self.members[name].size), open(file_path, "wb") as f:
+            f.write(self.read(name))
+
+
+def open_bundle(bundle_path: str) -> Optional[PeriodBundle]:
+    try:
+        return PeriodBundle(bundle_path)
+    except (FileNotFoundError, ValueError, KeyError, TypeError, struct.error):
+        return None
@@ -0,0 +1,605 @@
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from configurator_core import ConfiguratorCore, load_config
+from research_curves import CHECKPOINTS, CurveParams, format_params, levels_at
+from tracing import tracer
+from transaction import Transaction
+
+# Headless entry point for dedicated-server hosts. Only imports the Tk-free core.
+#
+#   python ce_cli.py apply profile.json
+#   python ce_cli.py period mid
+#   python ce_cli.py --trace period.json --timings period late
+#   python ce_cli.py period late --dry-run [--fields]
+#   python ce_cli.py bundle [--period mid late] [--rebuild]
+#   python ce_cli.py rollback [--snapshot 20241018-120000-000000]
+#   python ce_cli.py snapshots
+#   python ce_cli.py deploy --period late --profile server.toml D:/GoH C:/mods/GoH-test
+#   python ce_cli.py startup --runs 10
+#   python ce_cli.py bench --scales 1 10 100 1000 --repeat 5 --out bench.json
+#   python ce_cli.py roster --side ger --roster mid --stage 3
+#   python ce_cli.py research ger --period mid --unit squad_gd_motor_con
+#   python ce_cli.py research rus --scale 1.25 --minimum 1
+#   python ce_cli.py scale "Bots/DefenseLevel/*/DefenseBudget*" 0.8 --difficulty hard unfair
+#   python ce_cli.py curve --start 2 --rate 0.75 --delay 1 --cap 20 --offset hard=1 Short=-1 --preview
+#   python ce_cli.py supply --item "mgun_ger*" --field ammo --scale 1.2
+#   python ce_cli.py supply --merge modded --define "truck_ammo*"
+#   python ce_cli.py ballistics vanilla --curve bullet bullet_sniper
+#   python ce_cli.py watch [--once]
+#   python ce_cli.py sweep grid.toml variants/ --period mid --workers 8
+#   python ce_cli.py validate [--period mid installed] [--warnings]
+#   python ce_cli.py undo | redo | history
+#   python ce_cli.py serve [--port 8731]
+#   python ce_cli.py rpc set_ai_army_size '{"value": 6.5, "difficulty": "hard"}'
+#   python ce_cli.py simulate --period mid --games 0 5 10 20 --typhoon 0 1 --base-scale 0.8 1.0 1.2
+
+
+def load_profile(path: str) -> Dict[str, Any]:
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def print_preview(diffs, fields: bool = False) -> int:
+    # prints each file as soon as it is computed; returns the number of files that would change
+    changed = 0
+    for diff in diffs:
+        if not diff.changed:
+            print(f"{diff.status:<9} {diff.label or diff.path}")
+            continue
+        changed += 1
+        added, removed = diff.line_counts()
+        print(f"{diff.status:<9} {diff.label or diff.path}  +{added} -{removed}")
+        if fields:
+            for change in diff.fields():
+                print(f"    {change.path}: {change.old if change.old is not None else '(none)'} -> "
+                      f"{change.new if change.new is not None else '(none)'}")
+        else:
+            print(diff.unified(), end="")
+        sys.stdout.flush()
+    print(f"{changed} file(s) would change.")
+    return changed
+
+
+def add_dry_run(subparser: argparse.ArgumentParser):
+    subparser.add_argument("--dry-run", action="store_true", help="show what would change without writing")
+    subparser.add_argument("--fields", action="store_true", help="with --dry-run, list changed values, not lines")
+
+
+def measure_startup(runs: int) -> Dict[str, Any]:
+    # Cold start of each entry point in a fresh interpreter, from process spawn to ready
+    here = os.path.dirname(os.path.abspath(__file__))
+    entry_points = {
+        "cli": "import ce_cli, configurator_core; configurator_core.ConfiguratorCore()",
+        "gui": "import tkinter, myprogramm; root = tkinter.Tk(); myprogramm.Configurator(root); root.destroy()",
+    }
+    results = {}
+    for name, code in entry_points.items():
+        timings: List[float] = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True)
+            timings.append(time.perf_counter() - start)
+            if completed.returncode != 0:
+                results[name] = {"error": completed.stderr.decode(errors="replace").strip().splitlines()[-1]}
+                break
+        else:
+            results[name] = {"median_ms": round(statistics.median(timings) * 1000, 1),
+                             "min_ms": round(min(timings) * 1000, 1)}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="CE Configurator (headless)")
+    parser.add_argument("--config", default="config.json", help="path to config.json")
+    parser.add_argument("--trace", metavar="FILE", help="write timings of every file operation as a Chrome trace")
+    parser.add_argument("--timings", action="store_true", help="print a table of where the time went")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    apply_parser = subparsers.add_parser("apply", help="apply a JSON or TOML settings profile")
+    apply_parser.add_argument("profile")
+    add_dry_run(apply_parser)
+
+    period_parser = subparsers.add_parser("period", help="switch the war period")
+    period_parser.add_argument("period", choices=["normal", "early", "mid", "late"])
+    add_dry_run(period_parser)
+
+    bundle_parser = subparsers.add_parser("bundle", help="pack each war period into one file for faster switching")
+    bundle_parser.add_argument("--period", nargs="+", choices=["normal", "early", "mid", "late"],
+                               help="defaults to every period")
+    bundle_parser.add_argument("--rebuild", action="store_true", help="rebuild even if the sources are unchanged")
+
+    rollback_parser = subparsers.add_parser("rollback", help="restore the files from a backup snapshot")
+    rollback_parser.add_argument("--snapshot", help="snapshot id, defaults to the latest one")
+
+    subparsers.add_parser("snapshots", help="list backup snapshots")
+    subparsers.add_parser("undo", help="undo the last change written by the configurator")
+    subparsers.add_parser("redo", help="redo the last undone change")
+    subparsers.add_parser("history", help="list the changes that can be undone and redone")
+
+    deploy_parser = subparsers.add_parser("deploy", help="apply a period and/or profile to several installs")
+    deploy_parser.add_argument("installs", nargs="+", help="install root directories")
+    deploy_parser.add_argument("--period", choices=["normal", "early", "mid", "late"])
+    deploy_parser.add_argument("--profile")
+    deploy_parser.add_argument("--workers", type=int)
+
+    supply_parser = subparsers.add_parser("supply", help="list, adjust or merge resupply.inc entries")
+    supply_parser.add_argument("--define", default="*", help="define pattern, e.g. 'items_*_ger'")
+    supply_parser.add_argument("--item", default="*", help="item pattern, e.g. 'mgun_ger'")
+    supply_parser.add_argument("--variant", default="*", help="variant pattern, e.g. 'belt*'")
+    supply_parser.add_argument("--field", choices=["ammo", "value"], help="value to adjust")
+    supply_parser.add_argument("--scale", type=float, default=1.0)
+    supply_parser.add_argument("--offset", type=float, default=0.0)
+    supply_parser.add_argument("--min", type=float, dest="minimum")
+    supply_parser.add_argument("--merge", metavar="SOURCE", help="take matching entries from modded, cheat or a file")
+    add_dry_run(supply_parser)
+
+    ballistics_parser = subparsers.add_parser("ballistics", help="merge damage curves from the modded or vanilla set")
+    ballistics_parser.add_argument("source", choices=["modded", "vanilla"])
+    ballistics_parser.add_argument("--curve", nargs="+", help="only these curves")
+    add_dry_run(ballistics_parser)
+
+    watch_parser = subparsers.add_parser("watch", help="report files changed on disk and keep the caches current")
+    watch_parser.add_argument("--once", action="store_true", help="report changes since the last run and exit")
+    watch_parser.add_argument("--interval", type=float, default=2.0, help="polling interval without inotify")
+
+    sweep_parser = subparsers.add_parser("sweep", help="write one output tree per combination of a parameter grid")
+    sweep_parser.add_argument("grid", help="JSON or TOML file with 'grid' and optionally 'base' and 'period'")
+    sweep_parser.add_argument("out", help="output directory, gets one folder per variant and manifest.json")
+    sweep_parser.add_argument("--period", choices=["normal", "early", "mid", "late"])
+    sweep_parser.add_argument("--workers", type=int, help="worker processes, defaults to the CPU count")
+
+    roster_parser = subparsers.add_parser("roster", help="list roster units matching every given filter")
+    roster_parser.add_argument("--side")
+    roster_parser.add_argument("--roster", choices=["normal", "early", "mid", "late"], help="war period folder")
+    roster_parser.add_argument("--stage", type=int, help="units available at this stage")
+    roster_parser.add_argument("--vehicle")
+    roster_parser.add_argument("--member", help="units containing this soldier or crew member")
+    roster_parser.add_argument("--tag")
+
+    research_parser = subparsers.add_parser("research", help="inspect or rebalance a research tree")
+    research_parser.add_argument("faction", help="ger, ger2, rus, ...")
+    research_parser.add_argument("--period", choices=["normal", "early", "mid", "late"],
+                                 help="war period folder, defaults to the installed files")
+    research_parser.add_argument("--unit", help="show the unlock path and cost of this entry")
+    research_parser.add_argument("--scale", type=float, help="multiply every non-zero cost")
+    research_parser.add_argument("--offset", type=int, default=0, help="add to every non-zero cost")
+    research_parser.add_argument("--minimum", type=int, default=0, help="lowest cost after rebalancing")
+
+    validate_parser = subparsers.add_parser("validate", help="check research, roster and StageCP references")
+    validate_parser.add_argument("--period", nargs="+", choices=["normal", "early", "mid", "late", "installed"],
+                                 help="defaults to every period and the installed files")
+    validate_parser.add_argument("--warnings", action="store_true", help="list warnings, not just their count")
+    validate_parser.add_argument("--workers", type=int, help="worker processes, defaults to the CPU count")
+
+    scale_parser = subparsers.add_parser("scale", help="scale numeric dcg values across periods and difficulties")
+    scale_parser.add_argument("pattern", help="field path pattern, e.g. 'RiskFactor/*/BotResources' or '*Budget*'")
+    scale_parser.add_argument("factor", type=float)
+    scale_parser.add_argument("--offset", type=float, default=0.0)
+    scale_parser.add_argument("--min", type=float, dest="minimum")
+    scale_parser.add_argument("--max", type=float, dest="maximum")
+    scale_parser.add_argument("--period", nargs="+", choices=["normal", "early", "mid", "late", "installed"])
+    scale_parser.add_argument("--difficulty", nargs="+", choices=["performance", "normal", "hard", "unfair"])
+    scale_parser.add_argument("--dry-run", action="store_true", help="print the changes without writing them")
+
+    curve_parser = subparsers.add_parser("curve", help="generate the bots' ResearchStages curves")
+    curve_parser.add_argument("--start", type=int, default=1, help="research level after 0 games")
+    curve_parser.add_argument("--rate", type=float, default=1.0, help="levels gained per game")
+    curve_parser.add_argument("--delay", type=int, default=0, help="games before the level starts rising")
+    curve_parser.add_argument("--cap", type=int, default=20, help="highest research level")
+    curve_parser.add_argument("--offset", nargs="+", default=[], metavar="NAME=LEVELS",
+                              help="level offset per difficulty or duration, e.g. hard=1 Short=-1")
+    curve_parser.add_argument("--period", nargs="+", choices=["normal", "early", "mid", "late", "installed"])
+    curve_parser.add_argument("--difficulty", nargs="+", choices=["performance", "normal", "hard", "unfair"])
+    curve_parser.add_argument("--preview", action="store_true", help="print current and new curves only")
+
+    simulate_parser = subparsers.add_parser("simulate", help="simulate the bots' army size over a match")
+    simulate_parser.add_argument("--period", nargs="+", choices=["normal", "early", "mid", "late", "installed"],
+                                 default=["installed"])
+    simulate_parser.add_argument("--difficulty", nargs="+", choices=["performance", "normal", "hard", "unfair"])
+    simulate_parser.add_argument("--games", nargs="+", type=int, default=[0, 5, 10, 20], help="games played")
+    simulate_parser.add_argument("--flags", nargs="+", type=int, default=[1], help="flags of the mission")
+    simulate_parser.add_argument("--attacking", nargs="+", type=int, choices=[0, 1], default=[1],
+                                 help="1 when the bots attack, 0 when they defend")
+    simulate_parser.add_argument("--typhoon", nargs="+", type=int, choices=[0, 1], default=[0],
+                                 help="1 for typhoon wave mode")
+    simulate_parser.add_argument("--base-scale", nargs="+", type=float, default=[1.0], help="Base CP factor")
+    simulate_parser.add_argument("--round-scale", nargs="+", type=float, default=[1.0],
+                                 help="RoundMultiplier factor")
+    simulate_parser.add_argument("--attack-multiplier", nargs="+", type=float, help="replaces AttackMultiplier")
+    simulate_parser.add_argument("--first-wave", nargs="+", type=float, help="seconds, replaces the flag offset")
+    simulate_parser.add_argument("--spawn-cooldown", nargs="+", type=float, help="seconds between spawns")
+    simulate_parser.add_argument("--unit-cp", nargs="+", type=float, help="CP of a spawned unit")
+    simulate_parser.add_argument("--player-mp", nargs="+", type=float, help="player MP, for the bots' MP")
+    simulate_parser.add_argument("--minutes", type=float, default=60.0, help="match length")
+    simulate_parser.add_argument("--step", type=float, default=10.0, help="seconds per simulation step")
+    simulate_parser.add_argument("--json", action="store_true", help="print every result row as JSON")
+
+    bench_parser = subparsers.add_parser("bench", help="time the file operations on synthetic installs")
+    bench_parser.add_argument("--scales", type=int, nargs="+",
+                              help="sizes relative to the shipped files, defaults to 1 10 100 1000")
+    bench_parser.add_argument("--repeat", type=int, default=5)
+    bench_parser.add_argument("--operation", nargs="+", help="only these operations")
+    bench_parser.add_argument("--dir", help="where to build the synthetic trees, defaults to the temp directory")
+    bench_parser.add_argument("--out", help="write the JSON results here instead of stdout")
+
+    serve_parser = subparsers.add_parser("serve", help="answer JSON-RPC requests on localhost, files kept loaded")
+    serve_parser.add_argument("--port", type=int, default=8731)
+
+    rpc_parser = subparsers.add_parser("rpc", help="send one request to a running serve")
+    rpc_parser.add_argument("method", help="e.g. set_points_to_win, set_period, status")
+    rpc_parser.add_argument("params", nargs="?", default="{}", help="JSON object of named parameters")
+    rpc_parser.add_argument("--port", type=int, default=8731)
+
+    startup_parser = subparsers.add_parser("startup", help="compare CLI and GUI cold start times")
+    startup_parser.add_argument("--runs", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        return run(args)
+    finally:
+        if args.trace:
+            tracer.export(args.trace)
+        if args.timings:
+            print(tracer.summary_table(), file=sys.stderr)
+
+
+# Commands that don't load the install (they build their own cores or none)
+
+
+def cmd_startup(args: argparse.Namespace) -> int:
+    print(json.dumps(measure_startup(args.runs), indent=4))
+    return 0
+
+
+def cmd_rpc(args: argparse.Namespace) -> int:
+    # http.client pulls in the email package; only the commands that talk HTTP pay for it
+    from daemon import call, read_token, token_file
+    try:
+        token = read_token(token_file(load_config(args.config)))
+        print(json.dumps(call(args.method, json.loads(args.params), args.port, token=token), indent=4))
+    except Exception as e:
+        logging.error(str(e))
+        return 1
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    from benchmark import DEFAULT_SCALES, run_benchmarks
+    report = run_benchmarks(load_config(args.config), args.scales or DEFAULT_SCALES, args.repeat, args.operation,
+                            args.dir, lambda done, total, scale: print(f"Benchmarking {scale}...", file=sys.stderr))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0
+
+
+def cmd_deploy(args: argparse.Namespace) -> int:
+    from deploy import deploy
+    profile = load_profile(args.profile) if args.profile else {}
+    print_lock = threading.Lock()
+
+    def report(install: str, message: str):
+        with print_lock:
+            print(f"[{install}] {message}")
+
+    summary = deploy(load_config(args.config), args.installs, args.period, profile, args.workers, report)
+    for result in summary["results"]:
+        status = "ok" if result.ok else f"FAILED ({result.error})"
+        print(f"{result.install}: {status}, {result.files_written} file(s) written, {result.seconds:.3f}s")
+    print(f"{summary['succeeded']} succeeded, {summary['failed']} failed in {summary['wall_seconds']:.3f}s "
+          f"({summary['installs_per_second']:.1f} installs/s, "
+          f"{summary['copied_bytes_per_second'] / 1e6:.1f} MB/s copied)")
+    return 1 if summary["failed"] else 0
+
+
+def cmd_sweep(args: argparse.Namespace) -> int:
+    from variants import generate_variants
+    spec = load_profile(args.grid)
+    summary = generate_variants(load_config(args.config), args.out, spec.get("grid", {}), spec.get("base"),
+                                args.period or spec.get("period"), args.workers)
+    for result in summary["results"]:
+        status = "ok" if result.ok else f"FAILED ({result.error})"
+        parameters = ", ".join(f"{key}={value}" for key, value in result.parameters.items())
+        print(f"{result.variant}: {status}, {len(result.files_written)} file(s) written, "
+              f"{result.linked_files} linked, {result.seconds:.3f}s  {parameters}")
+    print(f"{summary['succeeded']} succeeded, {summary['failed']} failed in {summary['wall_seconds']:.3f}s "
+          f"({summary['variants_per_second']:.1f} variants/s), manifest: {summary['manifest']}")
+    return 1 if summary["failed"] else 0
+
+
+# Commands on the install of config.json
+
+
+def cmd_apply(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    if args.dry_run:
+        print_preview(core.preview_profile(load_profile(args.profile)), args.fields)
+    else:
+        written = core.apply_profile(load_profile(args.profile))
+        print(f"Profile applied, {len(written)} file(s) written.")
+    return 0
+
+
+def cmd_period(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    if args.dry_run:
+        print_preview(core.preview_period(args.period), args.fields)
+    else:
+        stats = core.set_period(args.period)
+        print(f"{args.period.capitalize()} war period set: {stats}")
+    return 0
+
+
+def cmd_bundle(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    for period in args.period or core.config['periods']:
+        bundle = core.period_bundle(period, args.rebuild)
+        if bundle is None:
+            return 1
+        members = bundle.members.values()
+        print(f"{period:<7} {len(bundle.members)} file(s), {sum(member.size for member in members)} bytes "
+              f"in {os.path.getsize(bundle.path)} ({bundle.path})")
+    core.close_bundles()
+    return 0
+
+
+def cmd_rollback(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    stats = core.snapshots.restore(args.snapshot)
+    print(f"Files restored from backup: {stats}")
+    return 0
+
+
+def cmd_snapshots(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    for manifest in core.snapshots.list():
+        print(f"{manifest['id']}  {manifest['created']}  {len(manifest['files'])} file(s)  {manifest['label']}")
+    return 0
+
+
+def cmd_roster(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    units = core.roster().query(side=args.side, roster=args.roster, stage=args.stage, vehicle=args.vehicle,
+                                member=args.member, tag=args.tag)
+    for unit in units:
+        print(f"{unit['roster']:<7} {unit['faction']:<5} {unit['name'] or '-':<40} "
+              f"stages {unit['min_stage']}-{unit['max_stage']}  {unit['template'] or ''}")
+    print(f"{len(units)} unit(s)")
+    return 0
+
+
+def cmd_research(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    if args.scale is not None or args.offset:
+        transaction = Transaction()
+        core.stage_research_rebalance(transaction, args.faction, args.period, args.scale or 1.0, args.offset,
+                                      args.minimum)
+        print(f"Research costs rebalanced, {len(core.commit(transaction))} file(s) written.")
+    tree = core.research_tree(args.faction, args.period)
+    if args.unit:
+        if args.unit not in tree.entries:
+            print(f"{args.unit} is not in the research tree")
+            return 1
+        for name in tree.prerequisites(args.unit) + [args.unit]:
+            print(f"{tree.depth[name]:>3}  {tree.entries[name].cost:>4}  {name}")
+        print(f"Total cost to unlock {args.unit}: {tree.cost_to_unlock(args.unit)}")
+    else:
+        print(f"{len(tree.entries)} entries in {len(tree.files)} file(s), "
+              f"max depth {max(tree.depth.values(), default=0)}, "
+              f"total cost {sum(entry.cost for entry in tree.entries.values())}")
+        for problem in tree.problems():
+            print(problem)
+    return 0
+
+
+def cmd_validate(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    from validator import ERROR
+    result = core.validate(args.period, args.workers)
+    errors = [violation for violation in result["violations"] if violation.severity == ERROR]
+    for violation in result["violations"]:
+        if violation.severity == ERROR or args.warnings:
+            print(f"{violation.severity:<7} {violation.period:<9} {violation.check:<9} {violation.file}: "
+                  f"{violation.message}")
+    print(f"{len(errors)} error(s), {len(result['violations']) - len(errors)} warning(s); "
+          f"{result['checked']} of {result['units']} check(s) run, the rest unchanged since the last run")
+    return 1 if errors else 0
+
+
+def cmd_scale(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    matrix = core.numeric_matrix()
+    mask = matrix.select(args.pattern, args.period, args.difficulty)
+    matrix.apply(mask, args.factor, args.offset, args.minimum, args.maximum)
+    if args.dry_run:
+        for period, difficulty, field, old, new in matrix.summary(mask):
+            if old != new:
+                print(f"{period:<9} {difficulty:<11} {field:<50} {old:g} -> {new:g}")
+    else:
+        transaction = Transaction()
+        changed = core.stage_numeric_matrix(transaction, matrix)
+        print(f"{changed} value(s) changed, {len(core.commit(transaction))} file(s) written.")
+    return 0
+
+
+def cmd_curve(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    params = CurveParams(args.start, args.rate, args.delay, args.cap)
+    offsets = {name: int(value) for name, _, value in (offset.partition("=") for offset in args.offset)}
+    if args.preview:
+        for preview in core.preview_research_curves(params, args.period, args.difficulty, offsets):
+            levels = [f"{old} -> {new}" for old, new in zip(levels_at(preview.current), levels_at(preview.new))]
+            print(f"{preview.period} {preview.difficulty} {preview.duration}\n"
+                  f"  current: {preview.current}\n  fitted:  {format_params(preview.fitted)}\n"
+                  f"  new:     {preview.new}\n  level after {'/'.join(map(str, CHECKPOINTS))} games: "
+                  f"{', '.join(levels)}")
+    else:
+        transaction = Transaction()
+        core.stage_research_curves(transaction, params, args.period, args.difficulty, offsets)
+        print(f"Research curves written to {len(core.commit(transaction))} file(s).")
+    return 0
+
+
+def cmd_supply(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    transaction = Transaction()
+    if args.merge:
+        core.stage_supply_merge(transaction, args.merge, args.define, args.item, args.variant)
+    if args.field:
+        core.stage_supply_adjust(transaction, args.field, args.scale, args.offset, args.minimum, args.define,
+                                 args.item, args.variant)
+    if len(transaction) and args.dry_run:
+        print_preview(core.preview(transaction), args.fields)
+    elif len(transaction):
+        print(f"Resupply updated, {len(core.commit(transaction))} file(s) written.")
+    else:
+        for entry in core.supply_table():
+            if fnmatch.fnmatchcase(entry.define, args.define) and fnmatch.fnmatchcase(entry.item, args.item) \
+                    and fnmatch.fnmatchcase(entry.variant, args.variant):
+                print(f"{entry.define:<22} {entry.item:<24} {entry.variant:<20} "
+                      f"ammo {entry.ammo:>5g}  value {entry.value:>4g}")
+    return 0
+
+
+def cmd_ballistics(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    transaction = Transaction()
+    core.stage_damage_mode(transaction, args.source == "modded", args.curve)
+    if args.dry_run:
+        print_preview(core.preview(transaction), args.fields)
+    else:
+        print(f"Ballistics merged from the {args.source} set, {len(core.commit(transaction))} file(s) written.")
+    return 0
+
+
+def cmd_simulate(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    from simulator import sweep
+    axes = {"games": args.games, "flags": args.flags, "attacking": [bool(value) for value in args.attacking],
+            "typhoon": [bool(value) for value in args.typhoon], "base_scale": args.base_scale,
+            "round_scale": args.round_scale}
+    for axis in ("attack_multiplier", "first_wave", "spawn_cooldown", "unit_cp", "player_mp"):
+        if getattr(args, axis):
+            axes[axis] = getattr(args, axis)
+    scenarios = sweep(**axes)
+    start = time.perf_counter()
+    results = core.simulate_bots(scenarios, args.period, args.difficulty, args.minutes * 60, args.step)
+    seconds = time.perf_counter() - start
+    for period, difficulty, simulation in results:
+        for row in simulation.rows():
+            if args.json:
+                print(json.dumps({"period": period, "difficulty": difficulty, **row}))
+                continue
+            print(f"{period:<9} {difficulty:<11} games {row['games']:>3} flags {row['flags']} "
+                  f"{'attack' if row['attacking'] else 'defend'} {'typhoon' if row['typhoon'] else 'normal '} "
+                  f"x{row['base_scale']:g}/{row['round_scale']:g}  wave {row['first_wave']:>5.0f}s  "
+                  f"army {row['army_10m']:>6.1f} {row['army_20m']:>6.1f} {row['army_30m']:>6.1f} "
+                  f"peak {row['peak']:>6.1f}/{row['cap']:<6.1f} MP {row['mp']:>8.0f} "
+                  f"defense {row['defense_ai']:>8.0f}")
+    total = len(scenarios) * len(results)
+    print(f"{total} scenario(s) simulated in {seconds * 1000:.1f} ms ({total / seconds if seconds else 0:.0f}/s)")
+    return 0
+
+
+def cmd_watch(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    from watcher import ChangeWatcher
+    watcher = ChangeWatcher(core, poll_interval=args.interval)
+
+    def report(changes):
+        for change in changes:
+            print(f"{change.kind:<8} {'external' if change.external else 'own':<8} {change.path}")
+
+    report(watcher.poll())
+    period = core.selected_period()
+    for file, src, dst in core.period_divergence(period):
+        print(f"differs from {period} war: {dst or file} ({src})")
+    if not args.once:
+        print(f"Watching {', '.join(watcher.roots)} ({'inotify' if watcher.inotify else 'polling'}), Ctrl+C to stop")
+        watcher.start(report)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    watcher.close()
+    return 0
+
+
+def cmd_step(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    # undo and redo
+    entry = core.undo() if args.command == "undo" else core.redo()
+    if entry is None:
+        print(f"Nothing to {args.command}.")
+        return 1
+    print(f"{args.command.capitalize()}: {entry.label} ({len(entry.files)} file(s) rewritten)")
+    return 0
+
+
+def cmd_history(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    for entry in core.history.undo_stack:
+        print(f"{entry.id}  {entry.created}  {len(entry.files)} file(s)  {entry.label}")
+    for entry in reversed(core.history.redo_stack):
+        print(f"{entry.id}  {entry.created}  {len(entry.files)} file(s)  {entry.label}  (undone)")
+    return 0
+
+
+def cmd_serve(core: ConfiguratorCore, args: argparse.Namespace) -> int:
+    from daemon import create_server
+    server = create_server(core, args.port)
+    print(f"Loaded {server.configurator.warm()}, listening on http://127.0.0.1:{args.port}/ (Ctrl+C to stop)",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+STANDALONE_COMMANDS: Dict[str, Callable[[argparse.Namespace], int]] = {
+    "startup": cmd_startup,
+    "rpc": cmd_rpc,
+    "bench": cmd_bench,
+    "deploy": cmd_deploy,
+    "sweep": cmd_sweep,
+}
+
+COMMANDS: Dict[str, Callable[[ConfiguratorCore, argparse.Namespace], int]] = {
+    "apply": cmd_apply,
+    "period": cmd_period,
+    "bundle": cmd_bundle,
+    "rollback": cmd_rollback,
+    "snapshots": cmd_snapshots,
+    "roster": cmd_roster,
+    "research": cmd_research,
+    "validate": cmd_validate,
+    "scale": cmd_scale,
+    "curve": cmd_curve,
+    "supply": cmd_supply,
+    "ballistics": cmd_ballistics,
+    "simulate": cmd_simulate,
+    "watch": cmd_watch,
+    "undo": cmd_step,
+    "redo": cmd_step,
+    "history": cmd_history,
+    "serve": cmd_serve,
+}
+
+
+def run(args: argparse.Namespace) -> int:
+    if args.command in STANDALONE_COMMANDS:
+        return STANDALONE_COMMANDS[args.command](args)
+    core = ConfiguratorCore(load_config(args.config))
+    try:
+        return COMMANDS[args.command](core, args)
+    except Exception as e:
+        logging.error(f"{args.command} failed: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
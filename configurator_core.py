@@ -0,0 +1,762 @@
+import json
+import logging
+import os
+import re
+import shutil
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from bundle import PeriodBundle, build_bundle, open_bundle
+from file_index import FileIndex
+from hash_cache import HashCache
+from history import EditHistory, HistoryEntry
+from journal import Journal
+from model_cache import ModelCache
+from numeric_matrix import NumericMatrix, apply_slot_changes
+from preview import FileDiff, preview_copies, preview_transaction
+from research import ResearchTree, load_research, rebalance_costs
+from research_curves import CurveParams, CurvePreview, fit_curve, format_curve, generate_curve, parse_curve
+from roster import RosterIndex
+from sdl import SdlDocument
+from simulator import BotModel, Scenario, Simulation, WaveModel, read_bot_model, read_wave_model, simulate
+from snapshots import SnapshotStore
+from supply import SupplyItem, adjust_supply, merge_ballistics, merge_supply, set_supply_setting, supply_table
+from tracing import span
+from transaction import Transaction
+from validator import CheckUnit, ValidationCache, build_units, validate
+
+# File-editing logic shared by the Tk GUI (myprogramm.py) and the headless CLI (ce_cli.py).
+# Nothing in here may import tkinter.
+
+# Block paths inside a dcg_*.inc file, relative to its top-level difficulty block
+BOT_RESOURCES_PATH = "RiskFactor/*/BotResources"
+STAGE_CP_PATH = "StageCP"
+START_BUDGET_PATH = "Resources/Standard/Budget/Start"
+RESEARCH_STAGES_PATH = "Duration/*/Bots/ResearchStages"
+RESOURCE_PATHS = {
+    "Research Points": "Resources/Standard/RP/StartVal",
+    "Manpower Points": "Resources/Standard/MP/StartVal",
+    "Star Call Points": "Resources/Standard/SP/StartVal",
+    "Ammo Points": "Resources/Standard/AP/StartVal"
+}
+RISK_LEVEL_PATHS = {
+    "Low Risk": "RiskFactor/Low/Rewards",
+    "Standard Risk": "RiskFactor/Standard/Rewards",
+    "High Risk": "RiskFactor/High/Rewards"
+}
+RESEARCH_PROGRESSIONS = {
+    "normal": "0:1 1:2 2:3 3:4 4:5 5:6 6:7 7:8 8:9 9:10 10:11 11:12 12:13 13:14 14:15 15:16 16:17 17:18 18:19 19:20",
+    "slow30": "0:1 1:1 2:2 3:2 4:3 5:4 6:5 7:6 8:7 9:8 10:9 11:10 12:11 13:12 14:13 15:14 16:15 17:16 18:17 19:18 20:19 21:20",
+    "slow60": "0:1 1:1 2:2 3:2 4:2 5:3 6:3 7:4 8:4 9:5 10:5 11:6 12:7 13:8 14:9 15:9 16:10 17:11 18:12 19:13 20:14 21:15 22:16 23:17 24:18 25:19 25:20",
+    "fast": "0:2 1:2 2:4 3:4 4:6 5:6 6:8 7:8 8:10 9:10 10:12 11:13 12:14 13:15 14:16 15:18 16:19 17:20"
+}
+DEFENSE_LEVEL_PATHS = {
+    "Second Level": "Bots/DefenseLevel/level_2/unlock",
+    "Third Level": "Bots/DefenseLevel/level_3/unlock"
+}
+# supply zones whose ammo regeneration the Regeneration option switches on and off
+AMMO_REGEN_DEFINES = ["truck_ammo_heavyfin", "truck_ammo_heavyger", "truck_ammo_heavyrus"]
+AMMO_REGEN_PERIOD = "5"
+PREPARATION_TIME_KEYS = ["oneFlagOffsetTime", "twoFlagOffsetTime", "threeFlagOffsetTime",
+                         "fourFlagOffsetTime", "fiveFlagOffsetTime"]
+DIFFICULTY_FILES = {
+    "performance": "dcg_easy.inc",
+    "normal": "dcg_normal.inc",
+    "hard": "dcg_hard.inc",
+    "unfair": "dcg_heroic.inc"
+}
+
+ProgressCallback = Callable[[int, int, str], None]
+
+
+def create_default_config(config_path: str = 'config.json') -> Dict[str, Any]:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    config = {
+        "base_dir": base_dir,
+        "backup_dir": os.path.join(base_dir, "backups"),
+        "index_file": os.path.join(base_dir, "file_index.json"),
+        "hash_cache_file": os.path.join(base_dir, "hash_cache.json"),
+        "journal_dir": os.path.join(base_dir, "journal"),
+        "roster_index_file": os.path.join(base_dir, "roster_index.sqlite"),
+        "backup_compress": True,
+        "backup_keep": 50,
+        "periods": ["normal", "early", "mid", "late"],
+        "files_to_update": [
+            "units_fin.set", "units_fin2.set", "units_ger.set", "units_ger2.set",
+            "units_rus.set", "units_rus2.set", "bot.wave_system.lua", "bot.lua",
+            "dcg_easy.inc", "dcg_normal.inc", "dcg_hard.inc", "dcg_heroic.inc",
+            "unit_research_fin.set", "unit_research_fin2.set", "unit_research_ger.set",
+            "unit_research_ger2.set", "unit_research_rus.set", "unit_research_rus2.set"
+        ]
+    }
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    return config
+
+
+def load_config(config_path: str = 'config.json') -> Dict[str, Any]:
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return create_default_config(config_path)
+
+
+class ConfiguratorCore:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else load_config()
+        self.file_index = FileIndex(self.config.get(
+            "index_file", os.path.join(self.config['base_dir'], "file_index.json")))
+        self.hash_cache = HashCache(self.config.get(
+            "hash_cache_file", os.path.join(self.config['base_dir'], "hash_cache.json")))
+        self.journal = Journal(self.config.get("journal_dir", os.path.join(self.config['base_dir'], "journal")))
+        self.snapshots = SnapshotStore(self.config['backup_dir'], self.config['base_dir'], self.hash_cache,
+                                       self.config.get("backup_compress", True), self.journal)
+        self.models = ModelCache()
+        self.history = EditHistory(
+            self.config.get("history_file", os.path.join(self.config['base_dir'], "history.jsonl")),
+            self.config['base_dir'], self.config.get("history_keep", 100))
+        self._roster: Optional[RosterIndex] = None
+        self._research: Dict[str, Tuple[List[Tuple[str, str]], ResearchTree]] = {}
+        self._bundles: Dict[str, PeriodBundle] = {}
+        self._validation: Optional[ValidationCache] = None
+        # finish or discard a commit that was interrupted by a crash before anything reads the files
+        self.journal.recover()
+
+    # File locations
+
+    def resource_root(self) -> str:
+        return os.path.join(self.config['base_dir'], "resource")
+
+    def source_root(self) -> str:
+        # "configurator files" normally sits next to resource/; source_dir points elsewhere (sweep variants)
+        return os.path.join(self.config.get("source_dir", self.config['base_dir']), "configurator files")
+
+    def period_root(self, period: str) -> str:
+        # the all-war files live in "normal", the others in "<period>war"
+        folder = period if period == "normal" else f"{period}war"
+        return os.path.join(self.source_root(), folder)
+
+    def resource_target(self, file: str) -> str:
+        # files not present in resource/ yet are placed at its top level
+        return self.file_index.locate(self.resource_root(), file) or os.path.join(self.resource_root(), file)
+
+    def difficulty_file(self, difficulty: str) -> str:
+        if difficulty not in DIFFICULTY_FILES:
+            raise ValueError(f"Unknown difficulty: {difficulty}")
+        return os.path.join(self.resource_root(), "set", "dynamic_campaign", DIFFICULTY_FILES[difficulty])
+
+    def capture_the_flag_file(self) -> str:
+        return os.path.join(self.resource_root(), "set", "multiplayer", "games", "campaign_capture_the_flag.set")
+
+    def resupply_file(self) -> str:
+        return os.path.join(self.resource_root(), "properties", "resupply.inc")
+
+    def ballistics_file(self) -> str:
+        return os.path.join(self.resource_root(), "set", "ballistics.set")
+
+    def ballistics_source(self, modded: bool) -> str:
+        name = "moddedballistics.set" if modded else "vanillaballistics.set"
+        return os.path.join(self.source_root(), name)
+
+    def supply_source(self, name: str) -> str:
+        # "modded" or "cheat"
+        return os.path.join(self.source_root(), f"{name}resupply.inc")
+
+    def preparation_file(self) -> str:
+        return os.path.join(self.resource_root(), "conquest_configuration", "bot.conquest_configuration.lua")
+
+    @staticmethod
+    def difficulty_path(document: SdlDocument, path: str) -> str:
+        return f"{document.top_key}/{path}"
+
+    # Reading current values
+
+    def read_player_army_size(self, file_path: str) -> Tuple[str, str]:
+        document = self.models.document(file_path)
+        stage_cp = document.find(self.difficulty_path(document, STAGE_CP_PATH))
+        start_budget = document.find(self.difficulty_path(document, START_BUDGET_PATH))
+        return (" ".join(stage_cp.values) if stage_cp else "",
+                "".join(start_budget.values) if start_budget else "")
+
+    def read_difficulty_values(self, file_path: str, paths: Dict[str, str]) -> Dict[str, str]:
+        document = self.models.document(file_path)
+        values = {}
+        for name, path in paths.items():
+            block = document.find(self.difficulty_path(document, path))
+            if block and block.values:
+                values[name] = block.values[0]
+        return values
+
+    def read_ai_fortifications(self, file_path: str) -> Dict[str, str]:
+        document = self.models.document(file_path)
+        levels = {}
+        for level, path in DEFENSE_LEVEL_PATHS.items():
+            block = document.find(self.difficulty_path(document, path))
+            games = block.param_token("games") if block else None
+            if games:
+                levels[level] = games.value
+        return levels
+
+    def read_preparation_times(self, file_path: str) -> Dict[str, str]:
+        content = self.models.text(file_path)
+        times = {}
+        for key in PREPARATION_TIME_KEYS:
+            match = re.search(rf"{key} = (\d+)", content)
+            if match:
+                times[key] = match.group(1)
+        return times
+
+    # Staging edits
+
+    def stage_bot_resources(self, transaction: Transaction, file_path: str, value: str):
+        def edit(document: SdlDocument):
+            for path, _ in document.find_all(self.difficulty_path(document, BOT_RESOURCES_PATH)):
+                document.set_value(path, value)
+
+        transaction.edit_document(file_path, edit, f"BotResources {value}")
+
+    def stage_numeric_setting(self, transaction: Transaction, file_path: str, setting: str, value: str, pattern: str):
+        def edit(content: str) -> str:
+            with span("regex", setting, file_path, len(content)):
+                return re.sub(pattern, f"{setting} {value}", content)
+
+        transaction.edit_text(file_path, edit, f"{setting} {value}")
+
+    def stage_points_to_win(self, transaction: Transaction, points: str):
+        self.stage_numeric_setting(transaction, self.capture_the_flag_file(), "winpoints", points, r"winpoints *?\d+")
+
+    def stage_ammo_regen(self, transaction: Transaction, file_path: str, regen: bool):
+        period = AMMO_REGEN_PERIOD if regen else "0"
+        transaction.edit_document(file_path, lambda document: set_supply_setting(
+            document, "regenerationPeriod", period, AMMO_REGEN_DEFINES), f"regenerationPeriod {period}")
+
+    def stage_damage_mode(self, transaction: Transaction, modded: bool, curves: Optional[List[str]] = None):
+        # merges the curves of the modded or vanilla ballistics into the installed file
+        source = self.models.document(self.ballistics_source(modded))
+        transaction.edit_document(self.ballistics_file(), lambda document: merge_ballistics(document, source, curves),
+                                  f"{'modded' if modded else 'vanilla'} ballistics")
+
+    def supply_table(self) -> List[SupplyItem]:
+        return supply_table(self.models.document(self.resupply_file()))
+
+    def stage_supply_adjust(self, transaction: Transaction, field: str, scale: float = 1.0, offset: float = 0.0,
+                            minimum: Optional[float] = None, define: str = "*", item: str = "*", variant: str = "*"):
+        transaction.edit_document(self.resupply_file(), lambda document: adjust_supply(
+            document, field, scale, offset, minimum, define, item, variant), f"resupply {field} x{scale} {offset:+g}")
+
+    def stage_supply_merge(self, transaction: Transaction, source: str, define: str = "*", item: str = "*",
+                           variant: str = "*"):
+        # source is "modded", "cheat" or a file path
+        source_file = source if os.path.exists(source) else self.supply_source(source)
+        source_document = self.models.document(source_file)
+        transaction.edit_document(self.resupply_file(), lambda document: merge_supply(
+            document, source_document, define, item, variant), f"merge resupply from {source_file}")
+
+    def stage_file_copy(self, transaction: Transaction, source_file: str, target_file: str):
+        content = self.models.text(source_file)
+        transaction.edit_text(target_file, lambda _: content, f"copy {source_file}")
+
+    def stage_player_army_size(self, transaction: Transaction, file_path: str, stage_size: str, budget: str):
+        def edit(document: SdlDocument):
+            document.set_values(self.difficulty_path(document, STAGE_CP_PATH), stage_size.split())
+            # read as one value, written back in the file's pieces: 0:"5511" is an atom 0: and a string
+            document.set_values(self.difficulty_path(document, START_BUDGET_PATH), re.findall(r"[^:\s]+:?", budget))
+
+        transaction.edit_document(file_path, edit, f"StageCP {stage_size}, Start {budget}")
+
+    def stage_preparation_time(self, transaction: Transaction, file_path: str, times: Dict[str, str]):
+        # the values end up in Lua source, so only known keys and whole seconds get through
+        seconds = {}
+        for key, value in times.items():
+            if key not in PREPARATION_TIME_KEYS:
+                raise ValueError(f"Unknown preparation time: {key}")
+            if not re.fullmatch(r"\d+", str(value).strip()):
+                raise ValueError(f"{key} must be a whole number of seconds, got {value!r}")
+            seconds[key] = str(int(value))
+
+        def edit(content: str) -> str:
+            for key, value in seconds.items():
+                with span("regex", key, file_path, len(content)):
+                    content = re.sub(rf"{re.escape(key)} = \d+", lambda match: f"{key} = {value}", content)
+            return content
+
+        transaction.edit_text(file_path, edit, "preparation times")
+
+    def stage_resources_starting(self, transaction: Transaction, file_path: str, resources: Dict[str, str]):
+        def edit(document: SdlDocument):
+            for resource, value in resources.items():
+                document.set_value(self.difficulty_path(document, RESOURCE_PATHS[resource]), value)
+
+        transaction.edit_document(file_path, edit, "starting resources")
+
+    def stage_resource_income(self, transaction: Transaction, file_path: str, risk_levels: Dict[str, str]):
+        def edit(document: SdlDocument):
+            for risk, value in risk_levels.items():
+                document.set_value(self.difficulty_path(document, RISK_LEVEL_PATHS[risk]), value)
+
+        transaction.edit_document(file_path, edit, "resource income multipliers")
+
+    def stage_ai_fortifications(self, transaction: Transaction, file_path: str, levels: Dict[str, str]):
+        def edit(document: SdlDocument):
+            for level, value in levels.items():
+                document.set_param(self.difficulty_path(document, DEFENSE_LEVEL_PATHS[level]), "games", value)
+
+        transaction.edit_document(file_path, edit, "AI defense unlocks")
+
+    def stage_ai_researches(self, transaction: Transaction, file_path: str, progression: str):
+        stages = RESEARCH_PROGRESSIONS[progression]
+
+        def edit(document: SdlDocument):
+            for path, _ in document.find_all(self.difficulty_path(document, RESEARCH_STAGES_PATH)):
+                document.set_value(path, stages)
+
+        transaction.edit_document(file_path, edit, f"ResearchStages {progression}")
+
+    # Settings profiles
+
+    def stage_profile(self, transaction: Transaction, profile: Dict[str, Any]):
+        if "ai_army_size" in profile:
+            size = float(profile["ai_army_size"])
+            if not 1 <= size <= 10:
+                raise ValueError("AI Army Size must be between 1 and 10")
+        if "points_to_win" in profile and int(profile["points_to_win"]) <= 0:
+            raise ValueError("Points to Win must be a positive integer")
+        if "research_progression" in profile and profile["research_progression"] not in RESEARCH_PROGRESSIONS:
+            raise ValueError(f"Unknown research progression: {profile['research_progression']}")
+
+        if "points_to_win" in profile:
+            self.stage_points_to_win(transaction, str(int(profile["points_to_win"])))
+        if "ammo_regen" in profile:
+            self.stage_ammo_regen(transaction, self.resupply_file(), bool(profile["ammo_regen"]))
+        if "damage_mode" in profile:
+            self.stage_damage_mode(transaction, profile["damage_mode"] == "modded")
+        if "preparation_times" in profile:
+            self.stage_preparation_time(transaction, self.preparation_file(),
+                                        {key: str(value) for key, value in profile["preparation_times"].items()})
+
+        difficulties = profile.get("difficulties") or [profile.get("difficulty", "normal")]
+        for difficulty in difficulties:
+            file_path = self.difficulty_file(difficulty)
+            if "ai_army_size" in profile:
+                self.stage_bot_resources(transaction, file_path, str(float(profile["ai_army_size"])))
+            if "stage_cp" in profile or "start_budget" in profile:
+                stage_size, budget = self.read_player_army_size(file_path)
+                self.stage_player_army_size(transaction, file_path, str(profile.get("stage_cp", stage_size)),
+                                            str(profile.get("start_budget", budget)))
+            if "starting_resources" in profile:
+                self.stage_resources_starting(transaction, file_path, {
+                    resource: str(value) for resource, value in profile["starting_resources"].items()})
+            if "resource_income" in profile:
+                self.stage_resource_income(transaction, file_path, {
+                    risk: str(value) for risk, value in profile["resource_income"].items()})
+            if "defense_unlocks" in profile:
+                self.stage_ai_fortifications(transaction, file_path, {
+                    level: str(value) for level, value in profile["defense_unlocks"].items()})
+            if "research_progression" in profile:
+                self.stage_ai_researches(transaction, file_path, profile["research_progression"])
+
+    def apply_profile(self, profile: Dict[str, Any], progress: Optional[ProgressCallback] = None) -> List[str]:
+        if "period" in profile:
+            self.set_period(profile["period"], progress)
+        transaction = Transaction()
+        self.stage_profile(transaction, profile)
+        return self.commit(transaction)
+
+    def commit(self, transaction: Transaction, progress: Optional[ProgressCallback] = None) -> List[str]:
+        # the originals are the cached texts the commit renders from, so the history costs no extra reads
+        label = ", ".join(transaction.descriptions()) or "edit"
+        originals = {file_path: self.models.text(file_path) for file_path in transaction.files
+                     if os.path.exists(file_path)}
+        written = transaction.commit(self.journal, progress, self.models)
+        self.history.record(label, {file_path: (originals.get(file_path), self.models.text(file_path))
+                                    for file_path in written})
+        return written
+
+    # Undo and redo
+
+    def undo(self) -> Optional[HistoryEntry]:
+        # reverts the last recorded edit in the files it changed; None if there is nothing to undo
+        return self.history.undo(self.journal, self.models)
+
+    def redo(self) -> Optional[HistoryEntry]:
+        return self.history.redo(self.journal, self.models)
+
+    # Bulk numeric edits across every period and difficulty
+
+    def difficulty_files(self, periods: Optional[List[str]] = None) -> List[Tuple[str, str, str]]:
+        # (period, difficulty, path) of each dcg file; "installed" is the copy in resource/
+        files = []
+        for period in periods or self.config['periods'] + ["installed"]:
+            for difficulty, name in DIFFICULTY_FILES.items():
+                if period == "installed":
+                    path = self.difficulty_file(difficulty)
+                else:
+                    self.file_index.refresh(self.period_root(period))
+                    path = self.file_index.locate(self.period_root(period), name)
+                if path and os.path.exists(path):
+                    files.append((period, difficulty, path))
+        return files
+
+    def numeric_matrix(self, periods: Optional[List[str]] = None) -> NumericMatrix:
+        files = self.difficulty_files(periods)
+        return NumericMatrix(files, [self.models.document(path) for _, _, path in files])
+
+    def stage_numeric_matrix(self, transaction: Transaction, matrix: NumericMatrix) -> int:
+        changes = matrix.changes()
+        for file_id, file_changes in changes.items():
+            transaction.edit_document(matrix.files[file_id][2],
+                                      lambda document, file_changes=file_changes: apply_slot_changes(document,
+                                                                                                     file_changes),
+                                      f"{len(file_changes)} numeric value(s)")
+        return sum(len(file_changes) for file_changes in changes.values())
+
+    # Research stage curves
+
+    def read_research_curves(self, periods: Optional[List[str]] = None,
+                             difficulties: Optional[List[str]] = None) -> List[Tuple[str, str, str, str]]:
+        # (period, difficulty, duration, curve) for every ResearchStages block
+        curves = []
+        for period, difficulty, file_path in self.difficulty_files(periods):
+            if difficulties and difficulty not in difficulties:
+                continue
+            document = self.models.document(file_path)
+            for path, block in document.find_all(self.difficulty_path(document, RESEARCH_STAGES_PATH)):
+                curves.append((period, difficulty, path.split("/")[2], "".join(block.values)))
+        return curves
+
+    @staticmethod
+    def research_curve(params: CurveParams, difficulty: str, duration: str,
+                       offsets: Optional[Dict[str, int]] = None) -> str:
+        # offsets are keyed by difficulty ("hard") and/or duration ("Short"), both apply
+        offsets = offsets or {}
+        return format_curve(generate_curve(params, offsets.get(difficulty, 0) + offsets.get(duration, 0)))
+
+    def preview_research_curves(self, params: CurveParams, periods: Optional[List[str]] = None,
+                                difficulties: Optional[List[str]] = None,
+                                offsets: Optional[Dict[str, int]] = None) -> List[CurvePreview]:
+        return [CurvePreview(period, difficulty, duration, curve, fit_curve(parse_curve(curve)),
+                             self.research_curve(params, difficulty, duration, offsets))
+                for period, difficulty, duration, curve in self.read_research_curves(periods, difficulties)]
+
+    def stage_research_curves(self, transaction: Transaction, params: CurveParams,
+                              periods: Optional[List[str]] = None, difficulties: Optional[List[str]] = None,
+                              offsets: Optional[Dict[str, int]] = None):
+        for _, difficulty, file_path in self.difficulty_files(periods):
+            if difficulties and difficulty not in difficulties:
+                continue
+
+            def edit(document: SdlDocument, difficulty: str = difficulty):
+                for path, _ in document.find_all(self.difficulty_path(document, RESEARCH_STAGES_PATH)):
+                    document.set_value(path, self.research_curve(params, difficulty, path.split("/")[2], offsets))
+
+            transaction.edit_document(file_path, edit, f"ResearchStages {params}")
+
+    # Offline bot army simulation
+
+    def bot_models(self, periods: Optional[List[str]] = None,
+                   difficulties: Optional[List[str]] = None) -> List[Tuple[str, str, BotModel]]:
+        return [(period, difficulty, read_bot_model(self.models.document(file_path)))
+                for period, difficulty, file_path in self.difficulty_files(periods)
+                if not difficulties or difficulty in difficulties]
+
+    def wave_model(self) -> WaveModel:
+        file_path = self.preparation_file()
+        return read_wave_model(self.models.text(file_path)) if os.path.exists(file_path) else WaveModel()
+
+    def simulate_bots(self, scenarios: List[Scenario], periods: Optional[List[str]] = None,
+                      difficulties: Optional[List[str]] = None, duration: float = 3600.0,
+                      step: float = 10.0) -> List[Tuple[str, str, Simulation]]:
+        waves = self.wave_model()
+        return [(period, difficulty, simulate(model, waves, scenarios, duration, step))
+                for period, difficulty, model in self.bot_models(periods, difficulties)]
+
+    # Unit rosters
+
+    def roster_sources(self) -> Dict[str, str]:
+        sources = {}
+        for period in self.config['periods']:
+            root = self.period_root(period)
+            self.file_index.refresh(root)
+            for file in self.config['files_to_update']:
+                path = self.file_index.locate(root, file) if file.startswith("units_") else None
+                if path:
+                    sources[path] = period
+        self.file_index.save()
+        return sources
+
+    def roster(self) -> RosterIndex:
+        # opened on first use, then only re-parses roster files whose content changed
+        if self._roster is None:
+            self._roster = RosterIndex(self.config.get(
+                "roster_index_file", os.path.join(self.config['base_dir'], "roster_index.sqlite")), self.hash_cache)
+        self._roster.refresh(self.roster_sources())
+        return self._roster
+
+    # Research trees
+
+    def research_file(self, faction: str, period: Optional[str] = None) -> Optional[str]:
+        # the installed file, or the one of a war period folder
+        file = f"unit_research_{faction}.set"
+        if period is None:
+            self.file_index.refresh(self.resource_root())
+            return self.file_index.locate(self.resource_root(), file)
+        self.file_index.refresh(self.period_root(period))
+        return self.file_index.locate(self.period_root(period), file)
+
+    def research_tree(self, faction: str, period: Optional[str] = None) -> ResearchTree:
+        file_path = self.research_file(faction, period)
+        if file_path is None:
+            raise Exception(f"No research file for {faction}" + (f" in {period} war" if period else ""))
+        # reused until one of the files of the tree (the file and its includes) changes
+        cached = self._research.get(file_path)
+        if cached and all(os.path.exists(path) and self.hash_cache.digest(path) == digest
+                          for path, digest in cached[0]):
+            return cached[1]
+
+        entries, files = load_research(file_path)
+        side = faction.rstrip("0123456789")
+        known = {value for unit in self.roster().query(side=side) for value in (unit["name"], unit["vehicle"]) if value}
+        tree = ResearchTree(entries, known, files)
+        self._research[file_path] = ([(path, self.hash_cache.digest(path)) for path in files], tree)
+        self.hash_cache.save()
+        return tree
+
+    def stage_research_rebalance(self, transaction: Transaction, faction: str, period: Optional[str] = None,
+                                 scale: float = 1.0, offset: int = 0, minimum: int = 0,
+                                 names: Optional[Set[str]] = None):
+        for file_path in self.research_tree(faction, period).files:
+            transaction.edit_document(file_path, lambda document: rebalance_costs(document, scale, offset, minimum,
+                                                                                  names),
+                                      f"research costs x{scale} {offset:+d}")
+
+    # Consistency checks
+
+    def validation_units(self, periods: Optional[List[str]] = None) -> List[CheckUnit]:
+        periods = periods or self.config['periods'] + ["installed"]
+        difficulty_files: Dict[str, List[str]] = {}
+        for period, _, path in self.difficulty_files(periods):
+            difficulty_files.setdefault(period, []).append(path)
+        units = []
+        for period in periods:
+            root = self.resource_root() if period == "installed" else self.period_root(period)
+            self.file_index.refresh(root)
+            files = {file: self.file_index.locate(root, file) for file in self.config['files_to_update']}
+            units += build_units(period, {file: path for file, path in files.items() if path},
+                                 difficulty_files.get(period, []))
+        self.file_index.save()
+        return units
+
+    def validate(self, periods: Optional[List[str]] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+        # every check of every period; units whose files are unchanged since the last run come from the cache
+        if self._validation is None:
+            self._validation = ValidationCache(self.config.get(
+                "validation_cache_file", os.path.join(self.config['base_dir'], "validation_cache.json")))
+        units = self.validation_units(periods)
+        digests = {path: self.hash_cache.digest(path) for unit in units for path in unit.files}
+        self.hash_cache.save()
+        violations, checked = validate(units, digests, self._validation, workers)
+        return {"violations": [violation._replace(file=self.display_path(violation.file))
+                               for violation in violations],
+                "units": len(units), "checked": checked}
+
+    # Change detection
+
+    def refresh_indexes(self):
+        # after files changed on disk; the caches re-read only the changed ones
+        for root in (self.resource_root(), self.source_root()):
+            self.file_index.refresh(root)
+        if self._roster is not None:
+            self._roster.refresh(self.roster_sources())
+        self.file_index.save()
+        self.hash_cache.save()
+
+    def selected_period(self) -> Optional[str]:
+        # the period folder the most installed files are identical to
+        matches = {period: len(self.period_files(period)) - len(self.period_divergence(period))
+                   for period in self.config['periods']}
+        best = max(matches, key=matches.get, default=None)
+        return best if best is not None and matches[best] > 0 else None
+
+    def period_files(self, period: str) -> List[Tuple[str, str, Optional[str]]]:
+        # (file, source in the period folder, installed copy or None) of files_to_update
+        self.file_index.refresh(self.period_root(period))
+        self.file_index.refresh(self.resource_root())
+        files = []
+        for file in self.config['files_to_update']:
+            src = self.file_index.locate(self.period_root(period), file)
+            if src is not None:
+                files.append((file, src, self.file_index.locate(self.resource_root(), file)))
+        return files
+
+    def period_divergence(self, period: Optional[str] = None) -> List[Tuple[str, str, Optional[str]]]:
+        # files whose installed copy differs from (or is missing for) the period's source
+        period = period or self.selected_period()
+        if period is None:
+            return []
+        diverged = [(file, src, dst) for file, src, dst in self.period_files(period)
+                    if dst is None or not self.hash_cache.same_content(src, dst)]
+        self.hash_cache.save()
+        return diverged
+
+    # Dry runs
+
+    def display_path(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.config['base_dir']).replace(os.sep, "/")
+
+    def preview(self, transaction: Transaction) -> Iterator[FileDiff]:
+        # what commit would write, one file at a time
+        return preview_transaction(transaction, self.models, self.display_path)
+
+    def preview_period(self, period: str, skip: Optional[Set[str]] = None) -> Iterator[FileDiff]:
+        # what update_files would copy; identical files are settled by their cached digests
+        copies = [(src, dst or self.resource_target(file)) for file, src, dst in self.period_files(period)]
+        yield from preview_copies([(src, dst) for src, dst in copies if os.path.normpath(dst) not in (skip or set())],
+                                  self.hash_cache, self.display_path)
+        self.hash_cache.save()
+
+    def preview_profile(self, profile: Dict[str, Any]) -> Iterator[FileDiff]:
+        # the period switch and the settings together, edits of replaced files apply to the period's version
+        transaction = Transaction()
+        self.stage_profile(transaction, profile)
+        sources = {}
+        if "period" in profile:
+            sources = {os.path.normpath(dst or self.resource_target(file)): src
+                       for file, src, dst in self.period_files(profile["period"])}
+            yield from self.preview_period(profile["period"], set(transaction.files))
+        yield from preview_transaction(transaction, self.models, self.display_path,
+                                       {path: sources[path] for path in transaction.files if path in sources})
+
+    # War period switching
+
+    def set_period(self, period: str, progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        # update_files is journaled, so a failure leaves resource/ as it was and needs no rollback
+        try:
+            self.backup_files(f"before {period} war")
+            return self.update_files(period, progress)
+        except Exception as e:
+            logging.error(f"Error setting {period} period: {str(e)}")
+            raise
+
+    def bundle_path(self, period: str) -> str:
+        return os.path.join(self.config.get("bundle_dir", os.path.join(self.config['base_dir'], "bundles")),
+                            f"{period}.bundle")
+
+    def period_bundle(self, period: str, rebuild: bool = False) -> Optional[PeriodBundle]:
+        # the packed period folder, rebuilt when any of its source files changed; None if it can't be built
+        sources = {file: src for file, src, _ in self.period_files(period)}
+        bundle = self._bundles.pop(period, None) or open_bundle(self.bundle_path(period))
+        try:
+            if bundle is None or rebuild or bundle.stale(sources):
+                if bundle is not None:
+                    bundle.close()
+                stats = build_bundle(self.bundle_path(period), sources, self.config.get("bundle_compress", False))
+                logging.info(f"Built {period} war bundle: {stats}")
+                bundle = PeriodBundle(self.bundle_path(period))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not build the {period} war bundle, copying the files instead: {str(e)}")
+            return None
+        self._bundles[period] = bundle
+        return bundle
+
+    def close_bundles(self):
+        for bundle in self._bundles.values():
+            bundle.close()
+        self._bundles.clear()
+
+    def backup_files(self, label: str = "") -> Dict[str, Any]:
+        self.file_index.refresh(self.resource_root())
+        files = {}
+        for file in self.config['files_to_update']:
+            src = self.file_index.locate(self.resource_root(), file)
+            if src is None:
+                logging.warning(f"File not found, skipping backup: {file}")
+                continue
+            files[file] = src
+
+        manifest = self.snapshots.snapshot(files, label)
+        self.snapshots.prune(self.config.get("backup_keep", 50))
+        self.file_index.save()
+        return manifest
+
+    def update_files(self, period: str, progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        total_files = len(self.config['files_to_update'])
+        stats = {"copied_files": 0, "copied_bytes": 0, "skipped_files": 0, "skipped_bytes": 0}
+        self.file_index.refresh(self.period_root(period))
+        self.file_index.refresh(self.resource_root())
+        bundle = self.period_bundle(period) if self.config.get("period_bundles", True) else None
+
+        writers = {}
+        digests = {}
+        done = 0
+
+        # skipped files are reported while planning, copied ones as the journal stages them
+        def advance(file: str):
+            nonlocal done
+            done += 1
+            if progress:
+                progress(done, total_files, file)
+
+        def copier(src: str, file: str):
+            def copy(tmp_path: str):
+                if bundle is not None:
+                    bundle.extract(file, tmp_path)
+                else:
+                    # copyfile uses the platform's in-kernel copy (sendfile, fcopyfile, ...) where available
+                    with span("copy", "period file", src, os.path.getsize(src)):
+                        shutil.copyfile(src, tmp_path)
+                advance(file)
+            return copy
+
+        for file in self.config['files_to_update']:
+            src = self.file_index.locate(self.period_root(period), file)
+            if src is None:
+                logging.warning(f"File not found, skipping update: {file}")
+                advance(file)
+                continue
+
+            dst = self.resource_target(file)
+            if bundle is not None:
+                # the bundle's index has the digest, the source file is not opened
+                size, digest = bundle.members[file].size, bundle.members[file].digest
+                identical = os.path.exists(dst) and os.path.getsize(dst) == size and \
+                    self.hash_cache.digest(dst) == digest
+            else:
+                size = os.path.getsize(src)
+                identical = self.hash_cache.same_content(src, dst)
+                digest = None if identical else self.hash_cache.digest(src)
+            if identical:
+                stats["skipped_files"] += 1
+                stats["skipped_bytes"] += size
+                advance(file)
+            else:
+                writers[dst] = copier(src, file)
+                digests[dst] = digest
+                stats["copied_files"] += 1
+                stats["copied_bytes"] += size
+
+        originals = {dst: self.models.text(dst) if os.path.exists(dst) else None for dst in writers}
+        try:
+            self.journal.run(writers)
+        except PermissionError as e:
+            raise Exception(f"Permission denied when trying to update {e.filename}")
+        self.history.record(f"{period} war period", {dst: (original, self.models.text(dst))
+                                                     for dst, original in originals.items()})
+        for dst, digest in digests.items():
+            self.hash_cache.record(dst, digest)
+
+        self.file_index.refresh(self.resource_root())
+        self.file_index.save()
+        self.hash_cache.save()
+        logging.info(f"Switched to {period} war: {stats}")
+        return stats
+
+    def restore(self, snapshot_id: Optional[str] = None,
+                progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        return self.snapshots.restore(snapshot_id, progress=progress)
+
+    def rollback(self, snapshot_id: Optional[str] = None) -> Dict[str, int]:
+        try:
+            return self.snapshots.restore(snapshot_id)
+        except Exception as e:
+            logging.error(f"Error during rollback: {str(e)}")
+            return {"restored_files": 0, "skipped_files": 0}
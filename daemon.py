@@ -0,0 +1,349 @@
+import contextlib
+import functools
+import hmac
+import http.client
+import inspect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from configurator_core import DIFFICULTY_FILES, RESOURCE_PATHS, RISK_LEVEL_PATHS, ConfiguratorCore
+from tracing import span
+from transaction import Transaction
+
+# Long-running local service for scripts that change settings between matches. It keeps
+# one ConfiguratorCore with its parsed files and indexes in memory, so a request only
+# pays for the edit itself instead of interpreter start-up and a cold read of every file.
+#
+# JSON-RPC 2.0 over HTTP on 127.0.0.1 only, one request per POST. Every start writes a new
+# random token to daemon_token in base_dir (readable by the owner only); requests
+# must send it as X-CE-Token and be Content-Type: application/json, so neither other local
+# users nor web pages open in a browser can change the files:
+#
+#   python ce_cli.py serve --port 8731
+#   curl -H "Content-Type: application/json" -H "X-CE-Token: $(cat daemon_token)" \
+#       -d '{"jsonrpc": "2.0", "id": 1, "method": "set_points_to_win", "params": {"value": 24000}}' \
+#       http://127.0.0.1:8731/
+#
+# Requests run on their own threads. Edits to the same file are serialized by per-file
+# locks (taken in path order, so two requests can't deadlock); edits to different files
+# run side by side. Operations that refresh the file index and hash cache (period switch,
+# status, validate) additionally hold one index lock, always taken last.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8731
+TOKEN_HEADER = "X-CE-Token"
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+OPERATION_FAILED = -32000
+
+# set_* method -> settings profile key; each takes value and optionally difficulty or difficulties
+SETTING_METHODS = {
+    "set_ai_army_size": "ai_army_size",
+    "set_points_to_win": "points_to_win",
+    "set_ammo_regen": "ammo_regen",
+    "set_damage_mode": "damage_mode",
+    "set_preparation_times": "preparation_times",
+    "set_starting_resources": "starting_resources",
+    "set_resource_income": "resource_income",
+    "set_defense_unlocks": "defense_unlocks",
+    "set_research_progression": "research_progression",
+}
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class FileLocks:
+    def __init__(self):
+        self.guard = threading.Lock()
+        self.locks: Dict[str, threading.Lock] = {}
+
+    @contextlib.contextmanager
+    def hold(self, paths: List[str]) -> Iterator[None]:
+        keys = sorted({os.path.normcase(os.path.abspath(path)) for path in paths})
+        with self.guard:
+            locks = [self.locks.setdefault(key, threading.Lock()) for key in keys]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+class ConfiguratorDaemon:
+    def __init__(self, core: ConfiguratorCore):
+        self.core = core
+        self.locks = FileLocks()
+        self.index_lock = threading.Lock()
+        self.started = time.time()
+        self.methods: Dict[str, Callable[..., Any]] = {
+            "ping": self.ping,
+            "status": self.status,
+            "read_settings": self.read_settings,
+            "apply": self.apply,
+            "set_period": self.set_period,
+            "set_player_army_size": self.set_player_army_size,
+            "undo": lambda: self.step(False),
+            "redo": lambda: self.step(True),
+            "validate": self.validate,
+        }
+        for method, key in SETTING_METHODS.items():
+            self.methods[method] = functools.partial(self.set_setting, key)
+
+    def warm(self) -> Dict[str, Any]:
+        # the indexes and every installed file a button edits, parsed once up front
+        start = time.perf_counter()
+        with self.index_lock:
+            self.core.refresh_indexes()
+            self.core.roster()
+        documents = [self.core.difficulty_file(difficulty) for difficulty in DIFFICULTY_FILES]
+        documents += [self.core.capture_the_flag_file(), self.core.resupply_file(), self.core.ballistics_file(),
+                      self.core.ballistics_source(True), self.core.ballistics_source(False)]
+        loaded = 0
+        for file_path in documents + [self.core.preparation_file()]:
+            if os.path.exists(file_path):
+                if file_path in documents:
+                    self.core.models.document(file_path)
+                else:
+                    self.core.models.text(file_path)
+                loaded += 1
+        return {"files": loaded, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    @staticmethod
+    def _difficulties(difficulty: Optional[str], difficulties: Optional[List[str]]) -> Dict[str, Any]:
+        if difficulties:
+            return {"difficulties": difficulties}
+        return {"difficulty": difficulty} if difficulty else {}
+
+    # RPC methods
+
+    def ping(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "uptime_s": round(time.time() - self.started, 1)}
+
+    def status(self) -> Dict[str, Any]:
+        with self.index_lock:
+            period = self.core.selected_period()
+        return {"period": period, "undo": len(self.core.history.undo_stack),
+                "redo": len(self.core.history.redo_stack), "cached_files": len(self.core.models.entries)}
+
+    def read_settings(self, difficulty: str = "normal") -> Dict[str, Any]:
+        file_path = self.core.difficulty_file(difficulty)
+        stage_cp, start_budget = self.core.read_player_army_size(file_path)
+        return {"stage_cp": stage_cp, "start_budget": start_budget,
+                "starting_resources": self.core.read_difficulty_values(file_path, RESOURCE_PATHS),
+                "resource_income": self.core.read_difficulty_values(file_path, RISK_LEVEL_PATHS),
+                "defense_unlocks": self.core.read_ai_fortifications(file_path),
+                "preparation_times": self.core.read_preparation_times(self.core.preparation_file())}
+
+    def apply(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        # any settings profile; a "period" in it is switched to first
+        settings = dict(settings)
+        result: Dict[str, Any] = {}
+        if "period" in settings:
+            result["period"] = self.set_period(settings.pop("period"))
+        # staging reads current values (the StageCP a start budget is written with), so it has to
+        # happen under the locks too; a first pass on a throwaway transaction names the files
+        files = self._staged(settings).files
+        with self.locks.hold(files):
+            written = self.core.commit(self._staged(settings))
+        result["written"] = [self.core.display_path(file_path) for file_path in written]
+        return result
+
+    def _staged(self, settings: Dict[str, Any]) -> Transaction:
+        transaction = Transaction()
+        self.core.stage_profile(transaction, settings)
+        return transaction
+
+    def set_setting(self, key: str, value: Any, difficulty: Optional[str] = None,
+                    difficulties: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.apply({key: value, **self._difficulties(difficulty, difficulties)})
+
+    def set_player_army_size(self, stage_cp: Optional[str] = None, start_budget: Optional[str] = None,
+                             difficulty: Optional[str] = None, difficulties: Optional[List[str]] = None) -> Dict:
+        settings = self._difficulties(difficulty, difficulties)
+        if stage_cp is not None:
+            settings["stage_cp"] = stage_cp
+        if start_budget is not None:
+            settings["start_budget"] = start_budget
+        return self.apply(settings)
+
+    def set_period(self, period: str) -> Dict[str, int]:
+        if period not in self.core.config['periods']:
+            raise ValueError(f"Unknown war period: {period}")
+        with self.index_lock:
+            targets = [self.core.resource_target(file) for file in self.core.config['files_to_update']]
+        with self.locks.hold(targets), self.index_lock:
+            return self.core.set_period(period)
+
+    def step(self, redo: bool) -> Optional[Dict[str, Any]]:
+        # locks the files of the entry about to be undone or redone, then checks it still is the next one
+        history = self.core.history
+        with history.lock:
+            stack = history.redo_stack if redo else history.undo_stack
+            if not stack:
+                return None
+            entry = stack[-1]
+        with self.locks.hold(history.paths(entry)):
+            with history.lock:
+                if not stack or stack[-1] is not entry:
+                    raise Exception("The history changed while waiting, try again")
+                entry = self.core.redo() if redo else self.core.undo()
+        return {"label": entry.label, "written": [delta.path for delta in entry.files]}
+
+    def validate(self, periods: Optional[List[str]] = None) -> Dict[str, Any]:
+        with self.index_lock:
+            result = self.core.validate(periods)
+        return {**result, "violations": [violation._asdict() for violation in result["violations"]]}
+
+    # JSON-RPC
+
+    @staticmethod
+    def _arguments(func: Callable[..., Any], params: Any) -> Tuple[list, dict]:
+        # only parameters that don't fit the method are invalid params; a TypeError raised
+        # while the method runs is a failure of the operation like any other
+        if params is None:
+            params = {}
+        if not isinstance(params, (dict, list)):
+            raise RpcError(INVALID_PARAMS, "params must be an object or an array")
+        args, kwargs = ([], params) if isinstance(params, dict) else (params, {})
+        try:
+            inspect.signature(func).bind(*args, **kwargs)
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        return args, kwargs
+
+    def call(self, method: str, params: Any) -> Any:
+        func = self.methods.get(method)
+        if func is None:
+            raise RpcError(METHOD_NOT_FOUND, f"Unknown method: {method}")
+        args, kwargs = self._arguments(func, params)
+        with span("rpc", method):
+            try:
+                return func(*args, **kwargs)
+            except ValueError as e:
+                raise RpcError(INVALID_PARAMS, str(e))
+            except Exception as e:
+                logging.error(f"RPC {method} failed: {str(e)}")
+                raise RpcError(OPERATION_FAILED, str(e))
+
+    def handle(self, body: bytes) -> Dict[str, Any]:
+        request_id = None
+        try:
+            try:
+                request = json.loads(body)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise RpcError(PARSE_ERROR, str(e))
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise RpcError(INVALID_REQUEST, "Expected an object with a method")
+            request_id = request.get("id")
+            result = self.call(request["method"], request.get("params"))
+            return {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RpcError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": str(e)}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, so a script sending several requests connects once
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get_content_type() != "application/json":
+            self.send_error(415, "Content-Type must be application/json")
+            return
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.server.token):
+            self.send_error(403, f"Missing or wrong {TOKEN_HEADER}")
+            return
+        data = json.dumps(self.server.configurator.handle(body)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if self.server.stopping.is_set():
+            # stopped only once the reply to "shutdown" is out
+            self.close_connection = True
+            threading.Thread(target=self.server.shutdown).start()
+
+    def log_message(self, format: str, *args):
+        logging.debug(f"RPC {self.address_string()} {format % args}")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # scripts may fire many requests at once; the default backlog of 5 resets the rest
+    request_queue_size = 64
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.token_path)
+
+
+def token_file(config: Dict[str, Any]) -> str:
+    return config.get("daemon_token_file", os.path.join(config['base_dir'], "daemon_token"))
+
+
+def write_token(token_path: str) -> str:
+    token = secrets.token_urlsafe(32)
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(token_path)
+    # created readable by the owner only, before the token is written into it
+    with os.fdopen(os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+        f.write(token)
+    return token
+
+
+def read_token(token_path: str) -> str:
+    with open(token_path, "r") as f:
+        return f.read().strip()
+
+
+def create_server(core: ConfiguratorCore, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    server = _Server((DEFAULT_HOST, port), _Handler)
+    server.configurator = ConfiguratorDaemon(core)
+    server.token_path = token_file(core.config)
+    server.token = write_token(server.token_path)
+    server.stopping = threading.Event()
+    server.configurator.methods["shutdown"] = server.stopping.set
+    return server
+
+
+def call(method: str, params: Optional[Dict[str, Any]] = None, port: int = DEFAULT_PORT, timeout: float = 60.0,
+         token: Optional[str] = None) -> Any:
+    # client for scripts: returns the result, raises on an RPC error; the token defaults to
+    # the one of a daemon running on the default config
+    if token is None:
+        token = read_token(token_file({"base_dir": os.path.dirname(os.path.abspath(__file__))}))
+    connection = http.client.HTTPConnection(DEFAULT_HOST, port, timeout=timeout)
+    try:
+        connection.request("POST", "/", json.dumps({"jsonrpc": "2.0", "id": 1, "method": method,
+                                                    "params": params or {}}),
+                           {"Content-Type": "application/json", TOKEN_HEADER: token})
+        reply = connection.getresponse()
+        body = reply.read()
+    finally:
+        connection.close()
+    if reply.status != 200:
+        raise Exception(f"{method} failed: HTTP {reply.status} {reply.reason}")
+    response = json.loads(body)
+    if "error" in response:
+        raise Exception(f"{method} failed: {response['error']['message']}")
+    return response["result"]
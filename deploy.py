@@ -0,0 +1,93 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from configurator_core import ConfiguratorCore
+from transaction import Transaction
+
+# Applies a period switch and/or a settings profile to several game installs at once.
+# Each install gets its own ConfiguratorCore (own backups, indexes and caches), so a
+# failure in one install is rolled back there and never touches the others.
+
+DeployProgress = Callable[[str, str], None]
+
+
+class InstallResult(NamedTuple):
+    install: str
+    ok: bool
+    error: str
+    stats: Dict[str, int]
+    files_written: int
+    seconds: float
+
+
+def install_config(config: Dict[str, Any], install_root: str) -> Dict[str, Any]:
+    install_root = os.path.abspath(install_root)
+    install = dict(config)
+    install["base_dir"] = install_root
+    install["backup_dir"] = os.path.join(install_root, "backups")
+    install["index_file"] = os.path.join(install_root, "file_index.json")
+    install["hash_cache_file"] = os.path.join(install_root, "hash_cache.json")
+    install["journal_dir"] = os.path.join(install_root, "journal")
+    install["history_file"] = os.path.join(install_root, "history.jsonl")
+    install["roster_index_file"] = os.path.join(install_root, "roster_index.sqlite")
+    install["validation_cache_file"] = os.path.join(install_root, "validation_cache.json")
+    install["bundle_dir"] = os.path.join(install_root, "bundles")
+    install["watch_manifest_file"] = os.path.join(install_root, "watch_manifest.json")
+    return install
+
+
+def deploy_install(config: Dict[str, Any], install_root: str, period: Optional[str], profile: Dict[str, Any],
+                   progress: Optional[DeployProgress] = None) -> InstallResult:
+    start = time.perf_counter()
+    core = ConfiguratorCore(install_config(config, install_root))
+    stats: Dict[str, int] = {}
+
+    def report(message: str):
+        if progress:
+            progress(install_root, message)
+
+    try:
+        if period:
+            stats = core.set_period(period, lambda done, total, file: report(f"{done}/{total} {file}"))
+            report(f"{period} war set")
+        settings = {key: value for key, value in profile.items() if key != "period"}
+        transaction = Transaction()
+        core.stage_profile(transaction, settings)
+        try:
+            written = core.commit(transaction)
+        except Exception:
+            if period:
+                core.rollback()
+            raise
+        report(f"profile applied, {len(written)} file(s) written")
+        return InstallResult(install_root, True, "", stats, len(written), time.perf_counter() - start)
+    except Exception as e:
+        logging.error(f"Deployment to {install_root} failed: {str(e)}")
+        report(f"failed: {str(e)}")
+        return InstallResult(install_root, False, str(e), stats, 0, time.perf_counter() - start)
+
+
+def deploy(config: Dict[str, Any], install_roots: List[str], period: Optional[str], profile: Dict[str, Any],
+           workers: Optional[int] = None, progress: Optional[DeployProgress] = None) -> Dict[str, Any]:
+    period = period or profile.get("period")
+    start = time.perf_counter()
+    results: List[InstallResult] = []
+    with ThreadPoolExecutor(max_workers=workers or min(len(install_roots), 8) or 1) as executor:
+        futures = [executor.submit(deploy_install, config, root, period, profile, progress)
+                   for root in install_roots]
+        for future in as_completed(futures):
+            results.append(future.result())
+    wall_time = time.perf_counter() - start
+
+    copied_bytes = sum(result.stats.get("copied_bytes", 0) for result in results)
+    return {
+        "results": sorted(results, key=lambda result: install_roots.index(result.install)),
+        "succeeded": sum(result.ok for result in results),
+        "failed": sum(not result.ok for result in results),
+        "wall_seconds": wall_time,
+        "installs_per_second": len(results) / wall_time if wall_time else 0.0,
+        "copied_bytes_per_second": copied_bytes / wall_time if wall_time else 0.0,
+    }
@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from tracing import span
+
+# Persistent name -> path index of the resource/ and configurator files/ trees.
+# Every directory is stored with its mtime, so refresh() only has to stat the known
+# directories and re-list the ones whose entries changed instead of walking the tree.
+
+
+def _scan_dir(path: str):
+    files, subdirs = [], []
+    with span("walk", "scandir", path), os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    return os.stat(path).st_mtime_ns, sorted(files), sorted(subdirs)
+
+
+class FileIndex:
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        # root -> relative dir ("" for the root itself) -> [mtime_ns, files, subdirs]
+        self.trees: Dict[str, Dict[str, List[Any]]] = {}
+        self.names: Dict[str, Dict[str, str]] = {}
+        self.dirty = False
+        if cache_path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                self.trees = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.trees = {}
+        self.names = {root: self._build_names(tree) for root, tree in self.trees.items()}
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.trees, f)
+            self.dirty = False
+        except OSError as e:
+            logging.warning(f"Could not save file index {self.cache_path}: {str(e)}")
+
+    @staticmethod
+    def _build_names(tree: Dict[str, List[Any]]) -> Dict[str, str]:
+        names = {}
+        # shallowest match wins, like the first hit of a top-down os.walk
+        for rel_dir in sorted(tree, key=lambda d: (d.count("/"), d)):
+            for name in tree[rel_dir][1]:
+                names.setdefault(name, f"{rel_dir}/{name}" if rel_dir else name)
+        return names
+
+    def _scan_tree(self, root: str, tree: Dict[str, List[Any]], rel_dir: str):
+        path = os.path.join(root, *rel_dir.split("/")) if rel_dir else root
+        entry = tree[rel_dir] = list(_scan_dir(path))
+        for subdir in entry[2]:
+            self._scan_tree(root, tree, f"{rel_dir}/{subdir}" if rel_dir else subdir)
+
+    @staticmethod
+    def _drop_tree(tree: Dict[str, List[Any]], rel_dir: str):
+        prefix = rel_dir + "/"
+        for key in [key for key in tree if key == rel_dir or key.startswith(prefix)]:
+            del tree[key]
+
+    def refresh(self, root: str) -> bool:
+        root = os.path.abspath(root)
+        tree = self.trees.get(root)
+        if tree is None:
+            tree = self.trees[root] = {}
+            if os.path.isdir(root):
+                self._scan_tree(root, tree, "")
+            self.names[root] = self._build_names(tree)
+            self.dirty = True
+            return True
+
+        changed = False
+        for rel_dir in sorted(tree, key=lambda d: d.count("/")):
+            if rel_dir not in tree:
+                continue
+            path = os.path.join(root, *rel_dir.split("/")) if rel_dir else root
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                self._drop_tree(tree, rel_dir)
+                changed = True
+                continue
+            if mtime == tree[rel_dir][0]:
+                continue
+            old_subdirs = set(tree[rel_dir][2])
+            tree[rel_dir] = list(_scan_dir(path))
+            for subdir in old_subdirs - set(tree[rel_dir][2]):
+                self._drop_tree(tree, f"{rel_dir}/{subdir}" if rel_dir else subdir)
+            for subdir in set(tree[rel_dir][2]) - old_subdirs:
+                self._scan_tree(root, tree, f"{rel_dir}/{subdir}" if rel_dir else subdir)
+            changed = True
+
+        if changed:
+            self.names[root] = self._build_names(tree)
+            self.dirty = True
+        return changed
+
+    def locate(self, root: str, name: str) -> Optional[str]:
+        root = os.path.abspath(root)
+        if root not in self.names:
+            self.refresh(root)
+        rel_path = self.names[root].get(name)
+        return os.path.join(root, *rel_path.split("/")) if rel_path else None
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from tracing import span
+
+# Content digests cached by (size, mtime), so unchanged files are never read twice.
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with span("hash", path=path) as timing, open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            timing.size += len(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        # absolute path -> [size, mtime_ns, digest]
+        self.entries: Dict[str, List] = {}
+        self.dirty = False
+        if cache_path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.entries, f)
+            self.dirty = False
+        except OSError as e:
+            logging.warning(f"Could not save hash cache {self.cache_path}: {str(e)}")
+
+    def digest(self, path: str, stat: Optional[os.stat_result] = None) -> str:
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self.entries[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.dirty = True
+        return digest
+
+    def record(self, path: str, digest: str):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self.entries[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.dirty = True
+
+    def same_content(self, first: str, second: str) -> bool:
+        try:
+            first_stat, second_stat = os.stat(first), os.stat(second)
+        except FileNotFoundError:
+            return False
+        if first_stat.st_size != second_stat.st_size:
+            return False
+        return self.digest(first, first_stat) == self.digest(second, second_stat)
@@ -0,0 +1,256 @@
+import difflib
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from journal import Journal
+from model_cache import ModelCache
+from sdl import ENCODING
+from transaction import read_text, write_text
+
+# Undo/redo for every change the configurator writes. Each entry keeps, per file, the
+# changed character ranges (offset in the old and the new text, old and new characters)
+# and the SHA-1 of the file before and after, nothing else. Undo checks that the file is
+# still the version the entry produced, then puts the old characters back; only the files
+# of that entry are rewritten, through the journal like any commit.
+#
+# The history is an append-only JSON-lines log, one record per edit, undo or redo, and is
+# rewritten without the dropped entries once it grows past twice the kept entries.
+#
+#   {"op": "edit", "entry": {"id": ..., "created": ..., "label": ..., "files": [...]}}
+#   {"op": "undo", "id": ...}
+
+DEFAULT_KEEP = 100
+# above this many differing lines (of a region that changed its line count) the region is stored as one range
+MAX_DIFF_LINES = 2000
+
+
+class Patch(NamedTuple):
+    old_start: int
+    new_start: int
+    old: str
+    new: str
+
+
+class FileDelta(NamedTuple):
+    path: str  # relative to base_dir
+    before: Optional[str]  # None if the edit created the file
+    after: str
+    patches: List[Patch]
+
+
+class HistoryEntry(NamedTuple):
+    id: str
+    created: str
+    label: str
+    files: List[FileDelta]
+
+
+def text_digest(text: str) -> str:
+    # the digest of the file the text is written to, as the hash cache computes it
+    return hashlib.sha1(text.encode(ENCODING)).hexdigest()
+
+
+def _offsets(lines: List[str], start: int) -> List[int]:
+    return list(itertools.accumulate(map(len, lines), initial=start))
+
+
+def _trimmed(patch: Patch) -> Patch:
+    # an edited line usually differs in a few characters
+    prefix = len(os.path.commonprefix([patch.old, patch.new]))
+    suffix = len(os.path.commonprefix([patch.old[prefix:][::-1], patch.new[prefix:][::-1]]))
+    return Patch(patch.old_start + prefix, patch.new_start + prefix, patch.old[prefix:len(patch.old) - suffix],
+                 patch.new[prefix:len(patch.new) - suffix])
+
+
+def diff_patches(old: str, new: str) -> List[Patch]:
+    old_lines, new_lines = old.splitlines(True), new.splitlines(True)
+    # identical leading and trailing lines are skipped before diffing the rest line by line
+    start = 0
+    while start < min(len(old_lines), len(new_lines)) and old_lines[start] == new_lines[start]:
+        start += 1
+    end = 0
+    while end < min(len(old_lines), len(new_lines)) - start and old_lines[-1 - end] == new_lines[-1 - end]:
+        end += 1
+    old_middle, new_middle = old_lines[start:len(old_lines) - end], new_lines[start:len(new_lines) - end]
+    if not old_middle and not new_middle:
+        return []
+
+    offset = sum(map(len, old_lines[:start]))
+    old_offsets, new_offsets = _offsets(old_middle, offset), _offsets(new_middle, offset)
+    if len(old_middle) == len(new_middle):
+        # values edited in place: lines pair up one to one, no alignment needed
+        opcodes = [("replace", i, i + 1, i, i + 1) for i, (old_line, new_line) in enumerate(zip(old_middle, new_middle))
+                   if old_line != new_line]
+    elif len(old_middle) + len(new_middle) > MAX_DIFF_LINES:
+        opcodes = [("replace", 0, len(old_middle), 0, len(new_middle))]
+    else:
+        opcodes = difflib.SequenceMatcher(None, old_middle, new_middle).get_opcodes()
+    patches = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            patch = Patch(old_offsets[i1], new_offsets[j1], "".join(old_middle[i1:i2]), "".join(new_middle[j1:j2]))
+            patches.append(_trimmed(patch) if i2 - i1 == j2 - j1 == 1 else patch)
+    return patches
+
+
+def apply_patches(text: str, patches: List[Patch], reverse: bool = False) -> str:
+    # forward turns the old text into the new one, reverse the new into the old
+    pieces = []
+    position = 0
+    for patch in patches:
+        start, remove, insert = (patch.new_start, patch.new, patch.old) if reverse else \
+            (patch.old_start, patch.old, patch.new)
+        pieces.append(text[position:start])
+        pieces.append(insert)
+        position = start + len(remove)
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def _entry_from_json(data: Dict) -> HistoryEntry:
+    return HistoryEntry(data["id"], data["created"], data["label"],
+                        [FileDelta(path, before, after, [Patch(*patch) for patch in patches])
+                         for path, before, after, patches in data["files"]])
+
+
+def _entry_to_json(entry: HistoryEntry) -> Dict:
+    return {"id": entry.id, "created": entry.created, "label": entry.label,
+            "files": [[delta.path, delta.before, delta.after, [list(patch) for patch in delta.patches]]
+                      for delta in entry.files]}
+
+
+class EditHistory:
+    def __init__(self, history_path: Optional[str], base_dir: str, keep: int = DEFAULT_KEEP):
+        self.history_path = history_path
+        self.base_dir = base_dir
+        self.keep = keep
+        self.undo_stack: List[HistoryEntry] = []
+        self.redo_stack: List[HistoryEntry] = []
+        self._records = 0
+        # record, undo and redo may be called from several threads (the daemon)
+        self.lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not self.history_path or not os.path.exists(self.history_path):
+            return
+        with open(self.history_path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last record of a crash while appending
+                    logging.warning(f"Ignoring unreadable history record {number} of {self.history_path}")
+                    break
+                self._records += 1
+                if record["op"] == "edit":
+                    # trimmed as record() trims it, so a dropped entry doesn't come back once later ones are undone
+                    self.undo_stack.append(_entry_from_json(record["entry"]))
+                    del self.undo_stack[:-self.keep]
+                    self.redo_stack.clear()
+                elif record["op"] == "undo" and self.undo_stack and self.undo_stack[-1].id == record["id"]:
+                    self.redo_stack.append(self.undo_stack.pop())
+                elif record["op"] == "redo" and self.redo_stack and self.redo_stack[-1].id == record["id"]:
+                    self.undo_stack.append(self.redo_stack.pop())
+
+    def _append(self, record: Dict):
+        if not self.history_path:
+            return
+        if self._records >= 2 * self.keep:
+            self._rewrite()
+        os.makedirs(os.path.dirname(os.path.abspath(self.history_path)), exist_ok=True)
+        with open(self.history_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._records += 1
+
+    def _rewrite(self):
+        # the kept entries as edits, followed by undos for the ones on the redo stack
+        records = [{"op": "edit", "entry": _entry_to_json(entry)}
+                   for entry in self.undo_stack + self.redo_stack[::-1]]
+        records += [{"op": "undo", "id": entry.id} for entry in self.redo_stack]
+        tmp_path = self.history_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        os.replace(tmp_path, self.history_path)
+        self._records = len(records)
+
+    def _relative(self, file_path: str) -> str:
+        return os.path.relpath(os.path.abspath(file_path), self.base_dir).replace(os.sep, "/")
+
+    def _absolute(self, path: str) -> str:
+        return os.path.normpath(os.path.join(self.base_dir, path))
+
+    def paths(self, entry: HistoryEntry) -> List[str]:
+        return [self._absolute(delta.path) for delta in entry.files]
+
+    def record(self, label: str, changes: Dict[str, Tuple[Optional[str], str]]) -> Optional[HistoryEntry]:
+        # changes maps each written file to its old (None if it did not exist) and new text
+        files = [FileDelta(self._relative(file_path), text_digest(old) if old is not None else None, text_digest(new),
+                           diff_patches(old or "", new))
+                 for file_path, (old, new) in changes.items() if old != new]
+        if not files:
+            return None
+        entry = HistoryEntry(uuid.uuid4().hex[:12], time.strftime("%Y-%m-%dT%H:%M:%S"), label, files)
+        with self.lock:
+            self.undo_stack.append(entry)
+            del self.undo_stack[:-self.keep]
+            self.redo_stack.clear()
+            self._append({"op": "edit", "entry": _entry_to_json(entry)})
+        return entry
+
+    def undo(self, journal: Optional[Journal] = None, cache: Optional[ModelCache] = None) -> Optional[HistoryEntry]:
+        with self.lock:
+            if not self.undo_stack:
+                return None
+            entry = self.undo_stack[-1]
+            self._apply(entry, True, journal, cache)
+            self.redo_stack.append(self.undo_stack.pop())
+            self._append({"op": "undo", "id": entry.id})
+            return entry
+
+    def redo(self, journal: Optional[Journal] = None, cache: Optional[ModelCache] = None) -> Optional[HistoryEntry]:
+        with self.lock:
+            if not self.redo_stack:
+                return None
+            entry = self.redo_stack[-1]
+            self._apply(entry, False, journal, cache)
+            self.undo_stack.append(self.redo_stack.pop())
+            self._append({"op": "redo", "id": entry.id})
+            return entry
+
+    def _apply(self, entry: HistoryEntry, reverse: bool, journal: Optional[Journal], cache: Optional[ModelCache]):
+        # every file is checked before any is written, so a file changed elsewhere leaves them all untouched
+        contents: Dict[str, str] = {}
+        removed: List[str] = []
+        for delta in entry.files:
+            file_path = self._absolute(delta.path)
+            expected = delta.after if reverse else delta.before
+            exists = os.path.exists(file_path)
+            current = (cache.text(file_path) if cache else read_text(file_path)) if exists else None
+            if (current is None and expected is not None) or \
+                    (current is not None and (expected is None or text_digest(current) != expected)):
+                raise Exception(f"{delta.path} was changed after '{entry.label}', it can't be "
+                                f"{'undone' if reverse else 'redone'}")
+            if reverse and delta.before is None:
+                removed.append(file_path)
+            else:
+                contents[file_path] = apply_patches(current or "", delta.patches, reverse)
+
+        def writer(file_path: str):
+            return lambda tmp_path: write_text(tmp_path, contents[file_path])
+
+        (journal or Journal()).run({file_path: writer(file_path) for file_path in contents})
+        for file_path in removed:
+            os.unlink(file_path)
+        if cache:
+            for file_path, content in contents.items():
+                cache.store(file_path, content)
+            for file_path in removed:
+                cache.invalidate(file_path)
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from tracing import span
+
+# Write-ahead journal for multi-file commits.
+#
+#   staging     new contents are written to temp files next to their targets and the
+#               current targets are hard-linked (or copied) aside as undo images
+#   committing  temp files are renamed over their targets
+#   (removed)   the commit is complete
+#
+# An exception while committing undoes the files already renamed. After a crash,
+# recover() rolls a "committing" journal forward with the remaining temp files (they
+# were fsynced before the state changed) and discards a "staging" one, so a commit is
+# never left half-applied. Both only touch the files listed in the journal.
+
+Writer = Callable[[str], None]
+
+
+def _fsync_file(path: str):
+    with span("write", "fsync", path), open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def _side_path(target: str, journal_id: str, kind: str) -> str:
+    directory, name = os.path.split(os.path.abspath(target))
+    return os.path.join(directory, f".{name}.{journal_id}.{kind}")
+
+
+def _remove(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+class Journal:
+    def __init__(self, journal_dir: Optional[str] = None):
+        self.journal_dir = journal_dir
+
+    def _record_path(self, journal_id: str) -> Optional[str]:
+        return os.path.join(self.journal_dir, f"{journal_id}.json") if self.journal_dir else None
+
+    def _write_record(self, record: Dict):
+        path = self._record_path(record["id"])
+        if path is None:
+            return
+        os.makedirs(self.journal_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _remove_record(self, journal_id: str):
+        _remove(self._record_path(journal_id))
+
+    def run(self, writers: Dict[str, Writer]) -> List[str]:
+        if not writers:
+            return []
+        journal_id = uuid.uuid4().hex[:12]
+        entries = [{"target": os.path.abspath(target),
+                    "tmp": _side_path(target, journal_id, "tmp"),
+                    "undo": _side_path(target, journal_id, "undo") if os.path.exists(target) else None}
+                   for target in writers]
+        record = {"id": journal_id, "state": "staging", "entries": entries}
+        with span("write", "journal commit", ", ".join(os.path.basename(target) for target in writers)):
+            return self._run(record, entries, writers)
+
+    def _run(self, record: Dict, entries: List[Dict], writers: Dict[str, Writer]) -> List[str]:
+        journal_id = record["id"]
+        self._write_record(record)
+
+        try:
+            for entry, writer in zip(entries, writers.values()):
+                writer(entry["tmp"])
+                _fsync_file(entry["tmp"])
+                if entry["undo"]:
+                    shutil.copymode(entry["target"], entry["tmp"])
+                    try:
+                        os.link(entry["target"], entry["undo"])
+                    except OSError:
+                        shutil.copy2(entry["target"], entry["undo"])
+        except BaseException:
+            self._discard(record)
+            raise
+
+        record["state"] = "committing"
+        self._write_record(record)
+        committed = []
+        try:
+            for entry in entries:
+                os.replace(entry["tmp"], entry["target"])
+                committed.append(entry)
+        except BaseException:
+            logging.error(f"Commit {journal_id} failed, undoing {len(committed)} file(s)")
+            self._undo(record, committed)
+            raise
+
+        for entry in entries:
+            _remove(entry["undo"])
+        self._remove_record(journal_id)
+        return [entry["target"] for entry in entries]
+
+    def _discard(self, record: Dict):
+        for entry in record["entries"]:
+            _remove(entry["tmp"])
+            _remove(entry["undo"])
+        self._remove_record(record["id"])
+
+    def _undo(self, record: Dict, committed: List[Dict]):
+        for entry in committed:
+            if entry["undo"]:
+                os.replace(entry["undo"], entry["target"])
+            else:
+                _remove(entry["target"])
+        self._discard(record)
+
+    def recover(self) -> List[str]:
+        if not self.journal_dir or not os.path.isdir(self.journal_dir):
+            return []
+        recovered = []
+        for name in sorted(os.listdir(self.journal_dir)):
+            if name.endswith(".json.tmp"):
+                # a record that was being rewritten; the previous state is still in the .json
+                _remove(os.path.join(self.journal_dir, name))
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.journal_dir, name), "r") as f:
+                    record = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"Unreadable journal {name}: {str(e)}")
+                continue
+            if record["state"] == "committing":
+                for entry in record["entries"]:
+                    if os.path.exists(entry["tmp"]):
+                        os.replace(entry["tmp"], entry["target"])
+                    _remove(entry["undo"])
+                    recovered.append(entry["target"])
+                self._remove_record(record["id"])
+                logging.warning(f"Replayed interrupted commit {record['id']} ({len(record['entries'])} file(s))")
+            else:
+                self._discard(record)
+                logging.warning(f"Discarded interrupted commit {record['id']} before it changed any file")
+        return recovered
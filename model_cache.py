@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from sdl import ENCODING, SdlDocument
+from tracing import span
+
+# In-memory copies of the files the settings windows read, keyed by path and validated
+# against the file's mtime and size on every access. The text is kept as read and the
+# parsed SdlDocument is built from it on first use. Documents handed out are shared
+# and must not be modified; edits go through a Transaction, which stores what it
+# wrote back into the cache.
+
+
+class _Entry:
+    __slots__ = ("stamp", "text", "document")
+
+    def __init__(self, stamp: Tuple[int, int], text: str):
+        self.stamp = stamp
+        self.text = text
+        self.document: Optional[SdlDocument] = None
+
+
+def _read(file_path: str) -> str:
+    with span("read", path=file_path) as timing, open(file_path, "r", encoding=ENCODING, newline="") as file:
+        content = file.read()
+        timing.size = len(content)
+        return content
+
+
+def _stamp(file_path: str) -> Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModelCache:
+    def __init__(self):
+        self.entries: Dict[str, _Entry] = {}
+        self.lock = threading.Lock()
+        self.loads = 0
+
+    def _entry(self, file_path: str) -> _Entry:
+        file_path = os.path.normpath(file_path)
+        stamp = _stamp(file_path)
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is None or entry.stamp != stamp:
+                entry = self.entries[file_path] = _Entry(stamp, _read(file_path))
+                self.loads += 1
+            return entry
+
+    def text(self, file_path: str) -> str:
+        return self._entry(file_path).text
+
+    def document(self, file_path: str) -> SdlDocument:
+        entry = self._entry(file_path)
+        with self.lock:
+            if entry.document is None:
+                with span("parse", path=file_path, size=len(entry.text)):
+                    entry.document = SdlDocument.parse(entry.text)
+            return entry.document
+
+    def store(self, file_path: str, text: str, document: Optional[SdlDocument] = None):
+        file_path = os.path.normpath(file_path)
+        entry = _Entry(_stamp(file_path), text)
+        entry.document = document
+        with self.lock:
+            self.entries[file_path] = entry
+
+    def stamp(self, file_path: str) -> Optional[Tuple[int, int]]:
+        # (mtime_ns, size) of the cached version, None if the file is not cached
+        with self.lock:
+            entry = self.entries.get(os.path.normpath(file_path))
+            return entry.stamp if entry else None
+
+    def invalidate(self, file_path: Optional[str] = None):
+        with self.lock:
+            if file_path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.normpath(file_path), None)
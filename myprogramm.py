@@ -1,16 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import logging
-import json
-import re
 import os
-import shutil
-from typing import Dict, Any
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from configurator_core import ConfiguratorCore, PREPARATION_TIME_KEYS, RESOURCE_PATHS, RISK_LEVEL_PATHS
+from preview import FileDiff
+from research_curves import CurveParams, format_params
+from tracing import traced, tracer
+from transaction import Transaction
+from watcher import ChangeWatcher
+from worker import CANCELLED, DONE, FAILED, PROGRESS, Worker
+
+POLL_INTERVAL_MS = 50
+WATCH_INTERVAL_MS = 2000
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
                     filename='ce_configurator.log', filemode='w')
 
+TRACE_FILE = 'ce_configurator_trace.json'
+
 
 class Configurator:
     def __init__(self, root):
@@ -21,21 +32,22 @@ class Configurator:
         self.root.resizable(False, False)
 
 
-        self.config = self.load_config()
+        self.core = ConfiguratorCore()
+        self.config = self.core.config
         self.difficulty = tk.StringVar(value="normal")
         self.ai_army_size = tk.StringVar(value="6")
         self.points_to_win = tk.StringVar(value="24000")
         self.ammo_regen = tk.StringVar(value="No regen")
         self.damage_mode = tk.StringVar(value="Mod Damage")
+        self.batch_mode = tk.BooleanVar(value=False)
+        self.pending = Transaction()
+        self.worker = Worker()
+        self.tasks_running = 0
+        self.watcher = ChangeWatcher(self.core)
         self.setup_styles()
         self.setup_ui()
+        self.root.after(WATCH_INTERVAL_MS, self.check_changes)
 
-    def load_config(self) -> Dict[str, Any]:
-        try:
-            with open('config.json', 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return self.create_default_config()
     def setup_styles(self):
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -51,22 +63,6 @@ class Configurator:
         self.style.configure("Title.TLabel", font=("Helvetica", 16, "bold"))
         self.style.configure("Subtitle.TLabel", font=("Helvetica", 12, "bold"))
         self.style.configure("Section.TFrame", background="#e0e0e0")
-    def create_default_config(self) -> Dict[str, Any]:
-        config = {
-            "base_dir": os.path.dirname(os.path.abspath(__file__)),
-            "backup_dir": os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups"),
-            "periods": ["normal", "early", "mid", "late"],
-            "files_to_update": [
-                "units_fin.set", "units_fin2.set", "units_ger.set", "units_ger2.set",
-                "units_rus.set", "units_rus2.set", "bot.wave_system.lua", "bot.lua",
-                "dcg_easy.inc", "dcg_normal.inc", "dcg_hard.inc", "dcg_heroic.inc",
-                "unit_research_fin.set", "unit_research_fin2.set", "unit_research_ger.set",
-                "unit_research_ger2.set", "unit_research_rus.set", "unit_research_rus2.set"
-            ]
-        }
-        with open('config.json', 'w') as f:
-            json.dump(config, f, indent=4)
-        return config
 
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="20", style="TFrame")
@@ -138,7 +134,8 @@ class Configurator:
             ("Resources at Start", self.resources_starting),
             ("Resource Income", self.resource_income),
             ("AI Defense Research", self.ai_fortifications),
-            ("AI Research Speed", self.ai_researches)
+            ("AI Research Speed", self.ai_researches),
+            ("Restore Backup", self.open_backup_window)
         ]
 
         for i, (text, command) in enumerate(buttons):
@@ -149,92 +146,255 @@ class Configurator:
         button_frame.columnconfigure(1, weight=1)
         button_frame.columnconfigure(2, weight=1)
 
+        # Batched changes
+        batch_frame = ttk.Frame(main_frame, style="TFrame")
+        batch_frame.grid(column=0, row=3, columnspan=2)
+        ttk.Checkbutton(batch_frame, text="Queue changes and apply them all at once",
+                        variable=self.batch_mode).grid(column=0, row=0, padx=5)
+        ttk.Button(batch_frame, text="Apply All", command=self.apply_pending).grid(column=1, row=0, padx=5)
+        ttk.Button(batch_frame, text="Preview", command=self.preview_pending).grid(column=2, row=0, padx=5)
+        ttk.Button(batch_frame, text="Discard", command=self.discard_pending).grid(column=3, row=0, padx=5)
+        ttk.Button(batch_frame, text="Undo", command=self.undo_last).grid(column=4, row=0, padx=5)
+        ttk.Button(batch_frame, text="Redo", command=self.redo_last).grid(column=5, row=0, padx=5)
+        self.root.bind("<Control-z>", lambda event: self.undo_last())
+        self.root.bind("<Control-y>", lambda event: self.redo_last())
+
         # Help Button
-        ttk.Button(main_frame, text="Help", command=self.show_help).grid(column=0, row=3, columnspan=2, pady=20)
+        ttk.Button(main_frame, text="Help", command=self.show_help).grid(column=0, row=4, pady=20)
+        ttk.Button(main_frame, text="Export Timings", command=self.export_timings).grid(column=1, row=4, pady=20)
 
         # Footer
         ttk.Label(main_frame, text="Made by MrCookie for Conquest Enhanced mod. Code available on GitHub.",
-                  font=("Helvetica", 8)).grid(column=0, row=4, columnspan=2, pady=10)
+                  font=("Helvetica", 8)).grid(column=0, row=5, columnspan=2, pady=10)
 
     def update_ai_army_size(self):
         try:
             size = float(self.ai_army_size.get())
             if 1 <= size <= 10:
-                self.save_numeric_setting("BotResources", str(size), r"BotResources +\d+")
-                messagebox.showinfo("Success", "AI Army Size updated successfully!")
+                transaction = Transaction()
+                self.core.stage_bot_resources(transaction, self.get_difficulty_file(), str(size))
+                self.submit(transaction, "AI Army Size updated successfully!")
             else:
                 messagebox.showerror("Error", "AI Army Size must be between 1 and 10")
         except ValueError:
             messagebox.showerror("Error", "Invalid input for AI Army Size")
+        except Exception as e:
+            logging.error(f"Error updating BotResources: {str(e)}")
+            messagebox.showerror("Error", "Failed to update BotResources")
 
     def update_points_to_win(self):
         try:
             points = int(self.points_to_win.get())
             if points > 0:
-                file_path = "./resource/set/multiplayer/games/campaign_capture_the_flag.set"
-                self.save_numeric_setting_to_file(file_path, "winpoints", str(points), r"winpoints *?\d+")
-                messagebox.showinfo("Success", "Points to Win updated successfully!")
+                transaction = Transaction()
+                self.core.stage_points_to_win(transaction, str(points))
+                self.submit(transaction, "Points to Win updated successfully!")
             else:
                 messagebox.showerror("Error", "Points to Win must be a positive integer")
         except ValueError:
             messagebox.showerror("Error", "Invalid input for Points to Win")
+        except Exception as e:
+            logging.error(f"Error updating winpoints: {str(e)}")
+            messagebox.showerror("Error", "Failed to update winpoints")
 
     def update_ammo_regen(self):
-        file_path = "./resource/properties/resupply.inc"
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            if self.ammo_regen.get() == "Regen":
-                content = content.replace("{regenerationPeriod 0};", "{regenerationPeriod 5};")
-            else:
-                content = content.replace("{regenerationPeriod 5};", "{regenerationPeriod 0};")
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "Ammo regeneration settings updated successfully!")
+            transaction = Transaction()
+            self.core.stage_ammo_regen(transaction, self.core.resupply_file(), self.ammo_regen.get() == "Regen")
+            self.submit(transaction, "Ammo regeneration settings updated successfully!")
         except Exception as e:
             logging.error(f"Error updating ammo regeneration settings: {str(e)}")
             messagebox.showerror("Error", "Failed to update ammo regeneration settings")
 
     def update_damage_settings(self):
         try:
-            source_file = "./configurator files/moddedballistics.set" if self.damage_mode.get() == "Mod Damage" else "./configurator files/vanillaballistics.set"
-            target_file = "./resource/set/ballistics.set"
-            shutil.copy2(source_file, target_file)
-            messagebox.showinfo("Success", f"{self.damage_mode.get()} settings applied successfully!")
+            transaction = Transaction()
+            self.core.stage_damage_mode(transaction, self.damage_mode.get() == "Mod Damage")
+            self.submit(transaction, f"{self.damage_mode.get()} settings applied successfully!")
         except Exception as e:
             logging.error(f"Error updating damage settings: {str(e)}")
             messagebox.showerror("Error", "Failed to update damage settings")
 
-    def save_numeric_setting(self, setting: str, value: str, pattern: str):
-        file_to_read = self.get_difficulty_file()
-        self.save_numeric_setting_to_file(file_to_read, setting, value, pattern)
+    def submit(self, transaction: Transaction, success_message: str):
+        if self.batch_mode.get():
+            self.pending.merge(transaction)
+            messagebox.showinfo("Queued", f"Change queued ({len(self.pending)} pending). "
+                                          f"Use 'Apply All' to write every pending change at once.")
+        else:
+            self.run_task("Saving Changes", lambda progress: self.core.commit(transaction, progress),
+                          lambda _: messagebox.showinfo("Success", success_message),
+                          "Failed to save changes, no file was modified.")
+
+    def apply_pending(self):
+        if not len(self.pending):
+            messagebox.showinfo("Apply All", "There are no pending changes.")
+            return
+        transaction, self.pending = self.pending, Transaction()
+
+        def restore_pending():
+            # keep the changes queued, including any queued while the commit was running
+            transaction.merge(self.pending)
+            self.pending = transaction
+
+        self.run_task("Applying Changes", lambda progress: self.core.commit(transaction, progress),
+                      lambda written: messagebox.showinfo("Success", f"Pending changes applied, "
+                                                                     f"{len(written)} file(s) written."),
+                      "Failed to apply pending changes, no file was modified.", restore_pending)
+
+    def run_task(self, title: str, func: Callable[[Callable[[int, int, str], None]], Any],
+                 on_done: Callable[[Any], None], error_message: str, on_abort: Optional[Callable[[], None]] = None):
+        # Runs func on the worker thread and follows its progress without blocking the Tk event loop
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(title)
+        progress = ttk.Progressbar(progress_window, length=300, mode='determinate')
+        progress.pack(pady=10)
+        status_label = ttk.Label(progress_window, text=f"{title}...")
+        status_label.pack()
 
-    def save_numeric_setting_to_file(self, file_path: str, setting: str, value: str, pattern: str):
+        task = self.worker.submit(func)
+        started = time.perf_counter_ns()
+        self.tasks_running += 1
+        ttk.Button(progress_window, text="Cancel", command=task.cancel).pack(pady=10)
+        progress_window.protocol("WM_DELETE_WINDOW", task.cancel)
+
+        def poll():
+            for kind, payload in task.poll():
+                if kind == PROGRESS:
+                    done, total, file = payload
+                    progress['value'] = done / total * 100 if total else 100
+                    status_label.config(text=f"{file} ({done}/{total})")
+                    continue
+                progress_window.destroy()
+                self.tasks_running -= 1
+                tracer.record("task", title, started)
+                if kind == DONE:
+                    on_done(payload)
+                    return
+                if on_abort:
+                    on_abort()
+                if kind == CANCELLED:
+                    messagebox.showinfo("Cancelled", f"{title} cancelled, no file was modified.")
+                elif kind == FAILED:
+                    messagebox.showerror("Error", f"{error_message} Check the log for details.")
+                return
+            self.root.after(POLL_INTERVAL_MS, poll)
+
+        self.root.after(POLL_INTERVAL_MS, poll)
+
+    def check_changes(self):
+        # game patches and Workshop updates overwrite files under resource/ behind our back;
+        # skipped while a task is writing files itself
+        if not self.tasks_running:
+            try:
+                external = [change for change in self.watcher.poll() if change.external]
+                if external:
+                    diverged = {file for file, _, _ in self.core.period_divergence()}
+                    names = sorted({os.path.basename(change.path) for change in external})
+                    logging.warning(f"Files changed outside the configurator: {names}")
+                    message = f"{len(names)} file(s) changed outside the configurator:\n" + "\n".join(names[:10])
+                    if diverged & set(names):
+                        message += "\n\nThese no longer match the selected war period:\n" + \
+                                   "\n".join(sorted(diverged & set(names)))
+                    messagebox.showwarning("Files Changed", message)
+            except Exception as e:
+                logging.error(f"Error checking for changed files: {str(e)}")
+        self.root.after(WATCH_INTERVAL_MS, self.check_changes)
+
+    def preview_pending(self):
+        if not len(self.pending):
+            messagebox.showinfo("Preview", "There are no pending changes.")
+            return
+        self.show_preview("Pending Changes", self.core.preview(self.pending))
+
+    def show_preview(self, title: str, diffs: Iterator[FileDiff]):
+        # Fills the window one file per event loop turn, so the first diffs show while the rest are computed
+        preview_window = tk.Toplevel(self.root)
+        preview_window.title(f"Preview: {title}")
+        preview_window.geometry('800x600')
+        summary_label = ttk.Label(preview_window, text="Comparing files...")
+        summary_label.pack(pady=5)
+        text_frame = ttk.Frame(preview_window)
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(text_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(text_frame, wrap=tk.NONE, font=("Courier", 9), yscrollcommand=scrollbar.set)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=text.yview)
+        text.tag_config("file", font=("Courier", 9, "bold"))
+        text.tag_config("added", foreground="green")
+        text.tag_config("removed", foreground="red")
+        ttk.Button(preview_window, text="Close", command=preview_window.destroy).pack(pady=5)
+        counts = {"changed": 0, "unchanged": 0}
+
+        def step():
+            if not preview_window.winfo_exists():
+                return
+            try:
+                diff = next(diffs)
+            except StopIteration:
+                summary_label.config(text=f"{counts['changed']} file(s) will change, "
+                                          f"{counts['unchanged']} unchanged.")
+                return
+            except Exception as e:
+                logging.error(f"Error previewing {title}: {str(e)}")
+                summary_label.config(text="Preview failed. Check the log for details.")
+                return
+            name = diff.label or diff.path
+            if not diff.changed:
+                counts["unchanged"] += 1
+                text.insert(tk.END, f"{diff.status}: {name}\n")
+            else:
+                counts["changed"] += 1
+                added, removed = diff.line_counts()
+                text.insert(tk.END, f"{diff.status}: {name} (+{added} -{removed})\n", "file")
+                for line in diff.unified().splitlines(True)[2:]:
+                    tag = "added" if line.startswith("+") else "removed" if line.startswith("-") else ""
+                    text.insert(tk.END, line, tag)
+                text.insert(tk.END, "\n")
+            summary_label.config(text=f"Comparing files... {counts['changed']} changed so far")
+            self.root.after(1, step)
+
+        self.root.after(1, step)
+
+    def export_timings(self):
+        # how long each read, parse, write, copy and window took, for bug reports about slow operations
+        file_path = filedialog.asksaveasfilename(title="Export Timings", initialfile=TRACE_FILE,
+                                                 defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if not file_path:
+            return
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            content = re.sub(pattern, f"{setting} {value}", content)
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-        except Exception as e:
-            logging.error(f"Error updating {setting}: {str(e)}")
-            messagebox.showerror("Error", f"Failed to update {setting}")
+            tracer.export(file_path)
+            logging.info(f"Timing summary:\n{tracer.summary_table()}")
+            messagebox.showinfo("Export Timings", f"Timings saved to {file_path}.\n"
+                                                  f"Open it in chrome://tracing or ui.perfetto.dev.")
+        except OSError as e:
+            logging.error(f"Error exporting timings: {str(e)}")
+            messagebox.showerror("Error", "Failed to export timings")
+
+    def discard_pending(self):
+        self.pending.discard()
+        messagebox.showinfo("Discard", "Pending changes discarded.")
+
+    def undo_last(self):
+        if not self.core.history.undo_stack:
+            messagebox.showinfo("Undo", "There is nothing to undo.")
+            return
+        self.run_task("Undoing", lambda progress: self.core.undo(),
+                      lambda entry: messagebox.showinfo("Undo", f"Undone: {entry.label}"),
+                      "Failed to undo the last change, no file was modified.")
+
+    def redo_last(self):
+        if not self.core.history.redo_stack:
+            messagebox.showinfo("Redo", "There is nothing to redo.")
+            return
+        self.run_task("Redoing", lambda progress: self.core.redo(),
+                      lambda entry: messagebox.showinfo("Redo", f"Redone: {entry.label}"),
+                      "Failed to redo the change, no file was modified.")
 
     def get_difficulty_file(self):
-        difficulty_files = {
-            "performance": "./resource/set/dynamic_campaign/dcg_easy.inc",
-            "normal": "./resource/set/dynamic_campaign/dcg_normal.inc",
-            "hard": "./resource/set/dynamic_campaign/dcg_hard.inc",
-            "unfair": "./resource/set/dynamic_campaign/dcg_heroic.inc"
-        }
-        return difficulty_files.get(self.difficulty.get(), difficulty_files["normal"])
+        return self.core.difficulty_file(self.difficulty.get())
 
+    @traced("dialog")
     def open_period_window(self):
         period_window = tk.Toplevel(self.root)
         period_window.title("Choose War Period")
@@ -252,7 +412,10 @@ class Configurator:
 
         for i, (text, period) in enumerate(periods):
             ttk.Button(period_window, text=text, command=lambda p=period: self.set_period(p, period_window)).grid(
-                row=i + 1, column=0, columnspan=2, pady=5)
+                row=i + 1, column=0, pady=5)
+            ttk.Button(period_window, text="Preview",
+                       command=lambda p=period, t=text: self.show_preview(t, self.core.preview_period(p))).grid(
+                row=i + 1, column=1, pady=5)
 
         ttk.Button(period_window, text="Cancel", command=period_window.destroy).grid(row=len(periods) + 1, column=0,
                                                                                      columnspan=2, pady=10)
@@ -263,91 +426,50 @@ class Configurator:
                                                                                            pady=10)
 
     def set_period(self, period: str, window: tk.Toplevel):
-        try:
-            self.backup_files()
-            self.update_files(period)
-            messagebox.showinfo("Success", f"{period.capitalize()} war period set successfully!")
+        def on_done(stats: Dict[str, int]):
+            messagebox.showinfo("Success", f"{period.capitalize()} war period set successfully!\n"
+                                           f"{stats['copied_files']} file(s) updated ({stats['copied_bytes']} bytes), "
+                                           f"{stats['skipped_files']} already up to date "
+                                           f"({stats['skipped_bytes']} bytes skipped).")
             window.destroy()
-        except Exception as e:
-            logging.error(f"Error setting {period} period: {str(e)}")
-            messagebox.showerror("Error", f"Failed to set {period} period. Check the log for details.")
-            self.rollback()
-
-    def backup_files(self):
-        backup_dir = self.config['backup_dir']
-        os.makedirs(backup_dir, exist_ok=True)
-        file_locations = {}
-
-        for file in self.config['files_to_update']:
-            if file in file_locations:
-                src = file_locations[file]
-            else:
-                for root, _, files in os.walk(os.path.join(self.config['base_dir'], "resource")):
-                    if file in files:
-                        src = os.path.join(root, file)
-                        file_locations[file] = src
-                        break
-                else:
-                    logging.warning(f"File not found, skipping backup: {file}")
-                    continue
-
-            dst = os.path.join(backup_dir, file)
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            try:
-                shutil.copy2(src, dst)
-            except PermissionError:
-                raise Exception(f"Permission denied when trying to backup {src}")
-
-    def update_files(self, period: str):
-        progress_window = tk.Toplevel(self.root)
-        progress_window.title("Updating Files")
-        progress = ttk.Progressbar(progress_window, length=300, mode='determinate')
-        progress.pack(pady=10)
-        status_label = ttk.Label(progress_window, text="Updating files...")
-        status_label.pack()
-
-        total_files = len(self.config['files_to_update'])
-        file_locations = {}
 
-        for i, file in enumerate(self.config['files_to_update']):
-            if file in file_locations:
-                src = file_locations[file]
-            else:
-                for root, _, files in os.walk(
-                        os.path.join(self.config['base_dir'], "configurator files", f"{period}war")):
-                    if file in files:
-                        src = os.path.join(root, file)
-                        file_locations[file] = src
-                        break
-                else:
-                    logging.warning(f"File not found, skipping update: {file}")
-                    continue
+        self.run_task("Updating Files", lambda progress: self.core.set_period(period, progress), on_done,
+                      f"Failed to set {period} period, no file was modified.")
+
+    @traced("dialog")
+    def open_backup_window(self):
+        backup_window = tk.Toplevel(self.root)
+        backup_window.title("Restore Backup")
+        backup_window.geometry('600x350')
+
+        snapshots = list(reversed(self.core.snapshots.list()))
+        ttk.Label(backup_window, text="Select a backup to restore", font=("Helvetica", 14)).grid(row=0, column=0,
+                                                                                               pady=10)
+        listbox = tk.Listbox(backup_window, width=90, height=12)
+        listbox.grid(row=1, column=0, padx=10)
+        for manifest in snapshots:
+            listbox.insert(tk.END, f"{manifest['created']}  -  {manifest['label'] or 'backup'}  "
+                                   f"({len(manifest['files'])} files)")
+
+        ttk.Button(backup_window, text="Restore",
+                   command=lambda: self.restore_backup(snapshots, listbox.curselection(), backup_window)).grid(
+            row=2, column=0, pady=10)
+
+    def restore_backup(self, snapshots, selection, window: tk.Toplevel):
+        if not selection:
+            messagebox.showerror("Error", "Select a backup to restore")
+            return
+
+        def on_done(stats: Dict[str, int]):
+            messagebox.showinfo("Success", f"Backup restored, {stats['restored_files']} file(s) written, "
+                                           f"{stats['skipped_files']} already identical.")
+            window.destroy()
 
-            dst = os.path.join(self.config['base_dir'], "resource", file)
-            try:
-                with open(src, "r") as source_file, open(dst, "w") as dest_file:
-                    dest_file.write(source_file.read())
-            except PermissionError:
-                raise Exception(f"Permission denied when trying to update {dst}")
-
-            progress['value'] = (i + 1) / total_files * 100
-            status_label.config(text=f"Updating {file}...")
-            progress_window.update()
-
-        progress_window.destroy()
-
-    def rollback(self):
-        backup_dir = self.config['backup_dir']
-        for file in self.config['files_to_update']:
-            src = os.path.join(backup_dir, file)
-            dst = os.path.join(self.config['base_dir'], "resource", file)
-            if os.path.exists(src):
-                try:
-                    shutil.copy2(src, dst)
-                except Exception as e:
-                    logging.error(f"Error during rollback of {file}: {str(e)}")
-        messagebox.showinfo("Rollback", "Changes have been rolled back due to an error.")
+        snapshot_id = snapshots[selection[0]]['id']
+        self.run_task("Restoring Backup", lambda progress: self.core.restore(snapshot_id, progress), on_done,
+                      "Failed to restore backup, no file was modified.")
 
+    @traced("dialog")
     def player_army_size(self):
         player_size_window = tk.Toplevel(self.root)
         player_size_window.title("Player Army Size")
@@ -358,15 +480,9 @@ class Configurator:
 
         file_to_read = self.get_difficulty_file()
 
-        with open(file_to_read, "r") as length_file:
-            whole_file = length_file.read()
-            stage_cp = re.search(r"\{StageCP ([^\}]+)\}", whole_file)
-            if stage_cp:
-                each_stage_size.set(stage_cp.group(1))
-
-            start_budget = re.search(r'\{Start "([^"]+)"\}', whole_file)
-            if start_budget:
-                whole_budget.set(start_budget.group(1))
+        stage_size, budget = self.core.read_player_army_size(file_to_read)
+        each_stage_size.set(stage_size)
+        whole_budget.set(budget)
 
         ttk.Label(player_size_window,
                   text="Size of each stage (keep the space between each number, should be 7 numbers):").grid(row=1,
@@ -388,42 +504,26 @@ class Configurator:
 
     def save_player_army_size(self, file_path: str, stage_size: str, budget: str, window: tk.Toplevel):
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            content = re.sub(r"\{StageCP [^\}]+\}", f"{{StageCP {stage_size}}}", content)
-            content = re.sub(r'\{Start "[^"]+"\}', f'{{Start "{budget}"}}', content)
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "Player army size updated successfully!")
+            transaction = Transaction()
+            self.core.stage_player_army_size(transaction, file_path, stage_size, budget)
+            self.submit(transaction, "Player army size updated successfully!")
             window.destroy()
         except Exception as e:
             logging.error(f"Error updating player army size: {str(e)}")
             messagebox.showerror("Error", "Failed to update player army size. Check the log for details.")
 
+    @traced("dialog")
     def preparation_time(self):
         prep_window = tk.Toplevel(self.root)
         prep_window.title("Preparation Time")
         prep_window.geometry('800x400')
 
-        times = {
-            "oneFlagOffsetTime": tk.StringVar(),
-            "twoFlagOffsetTime": tk.StringVar(),
-            "threeFlagOffsetTime": tk.StringVar(),
-            "fourFlagOffsetTime": tk.StringVar(),
-            "fiveFlagOffsetTime": tk.StringVar()
-        }
+        times = {key: tk.StringVar() for key in PREPARATION_TIME_KEYS}
 
-        file_path = "./resource/conquest_configuration/bot.conquest_configuration.lua"
+        file_path = self.core.preparation_file()
 
-        with open(file_path, "r") as file:
-            content = file.read()
-            for key in times:
-                match = re.search(rf"{key} = (\d+)", content)
-                if match:
-                    times[key].set(match.group(1))
+        for key, value in self.core.read_preparation_times(file_path).items():
+            times[key].set(value)
 
         row = 0
         for key, var in times.items():
@@ -439,21 +539,15 @@ class Configurator:
 
     def save_preparation_time(self, file_path: str, times: Dict[str, tk.StringVar], window: tk.Toplevel):
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            for key, var in times.items():
-                content = re.sub(rf"{key} = \d+", f"{key} = {var.get()}", content)
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "Preparation times updated successfully!")
+            transaction = Transaction()
+            self.core.stage_preparation_time(transaction, file_path, {key: var.get() for key, var in times.items()})
+            self.submit(transaction, "Preparation times updated successfully!")
             window.destroy()
         except Exception as e:
             logging.error(f"Error updating preparation times: {str(e)}")
             messagebox.showerror("Error", "Failed to update preparation times. Check the log for details.")
 
+    @traced("dialog")
     def resources_starting(self):
         resources_window = tk.Toplevel(self.root)
         resources_window.title("Starting Resources")
@@ -468,12 +562,8 @@ class Configurator:
 
         file_to_read = self.get_difficulty_file()
 
-        with open(file_to_read, "r") as file:
-            content = file.read()
-            for resource, var in resources.items():
-                match = re.search(rf"{resource.replace(' ', '')}.*?StartVal (\d+)", content, re.DOTALL)
-                if match:
-                    var.set(match.group(1))
+        for resource, value in self.core.read_difficulty_values(file_to_read, RESOURCE_PATHS).items():
+            resources[resource].set(value)
 
         row = 0
         for resource, var in resources.items():
@@ -488,22 +578,16 @@ class Configurator:
 
     def save_resources_starting(self, file_path: str, resources: Dict[str, tk.StringVar], window: tk.Toplevel):
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            for resource, var in resources.items():
-                content = re.sub(rf"({resource.replace(' ', '')}).*?StartVal \d+", rf"\1\nStartVal {var.get()}",
-                                 content, flags=re.DOTALL)
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "Starting resources updated successfully!")
+            transaction = Transaction()
+            self.core.stage_resources_starting(transaction, file_path,
+                                          {resource: var.get() for resource, var in resources.items()})
+            self.submit(transaction, "Starting resources updated successfully!")
             window.destroy()
         except Exception as e:
             logging.error(f"Error updating starting resources: {str(e)}")
             messagebox.showerror("Error", "Failed to update starting resources. Check the log for details.")
 
+    @traced("dialog")
     def resource_income(self):
         income_window = tk.Toplevel(self.root)
         income_window.title("Resource Income Multiplier")
@@ -517,12 +601,8 @@ class Configurator:
 
         file_to_read = self.get_difficulty_file()
 
-        with open(file_to_read, "r") as file:
-            content = file.read()
-            rewards = re.findall(r"\{Rewards ([^}]+)\}", content)
-            for i, var in enumerate(risk_levels.values()):
-                if i < len(rewards):
-                    var.set(rewards[i])
+        for risk, value in self.core.read_difficulty_values(file_to_read, RISK_LEVEL_PATHS).items():
+            risk_levels[risk].set(value)
 
         row = 0
         for risk, var in risk_levels.items():
@@ -537,22 +617,17 @@ class Configurator:
 
     def save_resource_income(self, file_path: str, risk_levels: Dict[str, tk.StringVar], window: tk.Toplevel):
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            rewards = [var.get() for var in risk_levels.values()]
-            content = re.sub(r"\{Rewards [^}]+\}", lambda m: f"{{Rewards {rewards.pop(0)}}}", content)
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "Resource income multipliers updated successfully!")
+            transaction = Transaction()
+            self.core.stage_resource_income(transaction, file_path,
+                                            {risk: var.get() for risk, var in risk_levels.items()})
+            self.submit(transaction, "Resource income multipliers updated successfully!")
             window.destroy()
         except Exception as e:
             logging.error(f"Error updating resource income multipliers: {str(e)}")
             messagebox.showerror("Error",
                                  "Failed to update resource income multipliers. Check the log for details.")
 
+    @traced("dialog")
     def ai_fortifications(self):
         fort_window = tk.Toplevel(self.root)
         fort_window.title("AI Defense Research Speed")
@@ -565,12 +640,8 @@ class Configurator:
 
         file_to_read = self.get_difficulty_file()
 
-        with open(file_to_read, "r") as file:
-            content = file.read()
-            for level, var in levels.items():
-                match = re.search(rf"{level}.*?unlock games (\d+)", content, re.DOTALL)
-                if match:
-                    var.set(match.group(1))
+        for level, value in self.core.read_ai_fortifications(file_to_read).items():
+            levels[level].set(value)
 
         row = 0
         for level, var in levels.items():
@@ -586,26 +657,20 @@ class Configurator:
 
     def save_ai_fortifications(self, file_path: str, levels: Dict[str, tk.StringVar], window: tk.Toplevel):
         try:
-            with open(file_path, "r") as file:
-                content = file.read()
-
-            for level, var in levels.items():
-                content = re.sub(rf"({level}).*?unlock games \d+", rf"\1\nunlock games {var.get()}", content,
-                                 flags=re.DOTALL)
-
-            with open(file_path, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "AI defense research speed updated successfully!")
+            transaction = Transaction()
+            self.core.stage_ai_fortifications(transaction, file_path,
+                                              {level: var.get() for level, var in levels.items()})
+            self.submit(transaction, "AI defense research speed updated successfully!")
             window.destroy()
         except Exception as e:
             logging.error(f"Error updating AI defense research speed: {str(e)}")
             messagebox.showerror("Error", "Failed to update AI defense research speed. Check the log for details.")
 
+    @traced("dialog")
     def ai_researches(self):
         research_window = tk.Toplevel(self.root)
         research_window.title("AI Research Speed")
-        research_window.geometry('400x200')
+        research_window.geometry('450x450')
 
         ai_prog = tk.StringVar(value="normal")
 
@@ -625,31 +690,64 @@ class Configurator:
                    command=lambda: self.save_ai_researches(ai_prog.get(), research_window)).grid(
             row=len(progressions), column=0, pady=10)
 
+        # Custom curve: level(game) = min(max level, start + (game - delay) * levels per game)
+        curve = {
+            "Start level": tk.StringVar(value="1"),
+            "Levels per game": tk.StringVar(value="1.0"),
+            "Delay (games)": tk.StringVar(value="0"),
+            "Max level": tk.StringVar(value="20")
+        }
+        row = len(progressions) + 1
+        ttk.Label(research_window, text="Custom progression:").grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        for i, (label, var) in enumerate(curve.items()):
+            ttk.Label(research_window, text=label).grid(row=row + i + 1, column=0, padx=10, sticky="w")
+            ttk.Spinbox(research_window, from_=0, to=100, increment=0.05 if "per game" in label else 1,
+                        textvariable=var, width=8).grid(row=row + i + 1, column=1, padx=10, pady=2)
+        row += len(curve) + 1
+        ttk.Button(research_window, text="Preview",
+                   command=lambda: self.preview_research_curve(curve)).grid(row=row, column=0, pady=10)
+        ttk.Button(research_window, text="Save Custom Curve",
+                   command=lambda: self.save_research_curve(curve, research_window)).grid(row=row, column=1, pady=10)
+
     def save_ai_researches(self, progression: str, window: tk.Toplevel):
-        file_to_read = self.get_difficulty_file()
         try:
-            with open(file_to_read, "r") as file:
-                content = file.read()
-
-            progressions = {
-                "normal": '{ResearchStages "0:1 1:2 2:3 3:4 4:5 5:6 6:7 7:8 8:9 9:10 10:11 11:12 12:13 13:14 14:15 15:16 16:17 17:18 18:19 19:20"}',
-                "slow30": '{ResearchStages "0:1 1:1 2:2 3:2 4:3 5:4 6:5 7:6 8:7 9:8 10:9 11:10 12:11 13:12 14:13 15:14 16:15 17:16 18:17 19:18 20:19 21:20"}',
-                "slow60": '{ResearchStages "0:1 1:1 2:2 3:2 4:2 5:3 6:3 7:4 8:4 9:5 10:5 11:6 12:7 13:8 14:9 15:9 16:10 17:11 18:12 19:13 20:14 21:15 22:16 23:17 24:18 25:19 25:20"}',
-                "fast": '{ResearchStages "0:2 1:2 2:4 3:4 4:6 5:6 6:8 7:8 8:10 9:10 10:12 11:13 12:14 13:15 14:16 15:18 16:19 17:20"}'
-            }
-
-            for prog, stages in progressions.items():
-                content = content.replace(stages, progressions[progression])
-
-            with open(file_to_read, "w") as file:
-                file.write(content)
-
-            messagebox.showinfo("Success", "AI research speed updated successfully!")
+            transaction = Transaction()
+            self.core.stage_ai_researches(transaction, self.get_difficulty_file(), progression)
+            self.submit(transaction, "AI research speed updated successfully!")
             window.destroy()
         except Exception as e:
             logging.error(f"Error updating AI research speed: {str(e)}")
             messagebox.showerror("Error", "Failed to update AI research speed. Check the log for details.")
 
+    @staticmethod
+    def curve_params(curve: Dict[str, tk.StringVar]) -> CurveParams:
+        return CurveParams(int(curve["Start level"].get()), float(curve["Levels per game"].get()),
+                           int(curve["Delay (games)"].get()), int(curve["Max level"].get()))
+
+    def preview_research_curve(self, curve: Dict[str, tk.StringVar]):
+        try:
+            params = self.curve_params(curve)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid custom progression values")
+            return
+        rows = self.core.preview_research_curves(params, ["installed"], [self.difficulty.get()])
+        text = "\n\n".join(f"{row.duration}\nCurrent: {row.current}\nFitted: {format_params(row.fitted)}\n"
+                             f"New: {row.new}" for row in rows)
+        messagebox.showinfo("Preview", text or "No ResearchStages found in the selected difficulty file.")
+
+    def save_research_curve(self, curve: Dict[str, tk.StringVar], window: tk.Toplevel):
+        try:
+            transaction = Transaction()
+            self.core.stage_research_curves(transaction, self.curve_params(curve), ["installed"],
+                                            [self.difficulty.get()])
+            self.submit(transaction, "AI research curve updated successfully!")
+            window.destroy()
+        except ValueError:
+            messagebox.showerror("Error", "Invalid custom progression values")
+        except Exception as e:
+            logging.error(f"Error updating AI research curve: {str(e)}")
+            messagebox.showerror("Error", "Failed to update AI research curve. Check the log for details.")
+
     def show_help(self):
         help_text = """
         CE Configurator Help:
@@ -670,17 +768,33 @@ class Configurator:
            - Resources at Start: Adjust starting resources for the player.
            - Resource Income: Modify resource income multipliers based on risk levels.
            - AI Defense Research Speed: Change how quickly AI researches defenses.
-           - AI Research Speed: Adjust the speed of AI research progression.
-
-        4. File Operations:
+           - AI Research Speed: Adjust the speed of AI research progression, or build a custom progression
+             from a start level, levels per game, a delay and a max level (use Preview to compare).
+
+        4. Applying Several Changes at Once:
+           - Tick "Queue changes" to collect changes from every window instead of writing them immediately.
+           - "Apply All" writes all queued changes, each file is written once and either fully or not at all.
+           - "Preview" shows the lines each queued change would modify, without writing anything.
+             The Preview button next to each war period does the same for a period switch.
+           - "Undo" (Ctrl+Z) takes back the last saved change or period switch, "Redo" (Ctrl+Y) repeats it.
+             Only the changed parts of the files it touched are rewritten, and the history is kept between
+             sessions. A file that was changed elsewhere in the meantime is left alone.
+
+        5. File Operations:
            - The configurator automatically selects the correct files based on the chosen difficulty.
-           - Backups are created before making changes. In case of errors, changes are rolled back.
+           - Backups are created before making changes. Every change is journaled: if an error or crash interrupts it,
+             it is completed or undone so no file is left half-updated.
+           - Saving, switching periods and restoring run in the background. Press Cancel in the progress
+             window to stop, a cancelled operation leaves every file unchanged.
+           - Restore Backup: Go back to any earlier backup, only files that differ are rewritten.
 
-        5. After Making Changes:
+        6. After Making Changes:
            - Always check the game to ensure the desired effect.
            - If you encounter any issues, check the log file (ce_configurator.log) for details.
+           - If something is slow, "Export Timings" saves how long each file operation took; the timings
+             of the last session are also in ce_configurator_trace.json.
 
-        6. Additional Information:
+        7. Additional Information:
            - For more detailed information, please refer to the mod description.
            - If you need further assistance, contact the mod author on Discord.
 
@@ -691,4 +805,10 @@ class Configurator:
 if __name__ == "__main__":
     root = tk.Tk()
     app = Configurator(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    # the last session's timings stay next to the log until the next start
+    try:
+        tracer.export(TRACE_FILE)
+        logging.info(f"Timing summary:\n{tracer.summary_table()}")
+    except OSError as e:
+        logging.error(f"Error exporting timings: {str(e)}")
\ No newline at end of file
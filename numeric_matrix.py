@@ -0,0 +1,175 @@
+import fnmatch
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sdl import ATOM, STRING, SdlDocument, Token
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the list fallback gives the same results, only slower
+    np = None
+
+# Every numeric value of a set of dcg_*.inc files in one flat array, so an operation like
+# "scale Bots/DefenseLevel/*/DefenseBudget* by 0.8 on hard and heroic" is a single masked
+# pass over all (period, difficulty) files at once.
+#
+# A value is addressed by its field and its position in the field:
+#   {StageCP 90 90 95}                      field "StageCP", elements 0..2
+#   {StartMP 0.05 min 3002 ...}             fields "Bots/StartMP" and "Bots/StartMP@min"
+#   {Base "0:0,60:0,540:11"}                field "Bots/CP/Base", one element per value after ':'
+# Field paths are relative to the difficulty block, duplicated siblings keep their [n] suffix.
+
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?\Z")
+SERIES_VALUE_RE = re.compile(r":(-?\d+(?:\.\d+)?)(?=[\s,]|\Z)")
+
+
+class Slot(NamedTuple):
+    file: int
+    path: str
+    token: int
+    element: int
+
+
+def decimal_places(text: str) -> int:
+    return len(text.split(".", 1)[1]) if "." in text else 0
+
+
+def format_number(value: float, decimals: int) -> str:
+    return str(int(round(value))) if decimals == 0 else f"{value:.{decimals}f}"
+
+
+def numeric_slots(document: SdlDocument) -> List[Tuple[str, List[Tuple[int, int, str]]]]:
+    # (field, [(token index, element index, text)]) for every numeric value of the document
+    top = f"{document.top_key}/"
+    fields: Dict[str, List[Tuple[int, int, str]]] = {}
+    for path, block in document.index.items():
+        if path.endswith("[0]") or not path.startswith(top):
+            continue
+        tokens = block.value_tokens()
+        for i, token in enumerate(tokens):
+            if token.kind == STRING:
+                for element, match in enumerate(SERIES_VALUE_RE.finditer(token.value)):
+                    fields.setdefault(path[len(top):], []).append((i, element, match.group(1)))
+            elif NUMBER_RE.match(token.text):
+                previous = tokens[i - 1] if i else None
+                param = previous.text if previous is not None and previous.kind == ATOM and \
+                    not NUMBER_RE.match(previous.text) else ""
+                field = path[len(top):] + (f"@{param}" if param else "")
+                fields.setdefault(field, []).append((i, len(fields.get(field, [])), token.text))
+    return list(fields.items())
+
+
+class NumericMatrix:
+    def __init__(self, files: Sequence[Tuple[str, str, str]], documents: Sequence[SdlDocument]):
+        # files are (period, difficulty, path) and documents their parsed content, in the same order
+        self.files = list(files)
+        self.fields: List[str] = []
+        self.slots: List[Slot] = []
+        field_ids: Dict[str, int] = {}
+        file_ids, slot_fields, values, decimals = [], [], [], []
+        for file_id, document in enumerate(documents):
+            for field, entries in numeric_slots(document):
+                if field not in field_ids:
+                    field_ids[field] = len(self.fields)
+                    self.fields.append(field)
+                path = f"{document.top_key}/{field.split('@', 1)[0]}"
+                for token, element, text in entries:
+                    self.slots.append(Slot(file_id, path, token, element))
+                    file_ids.append(file_id)
+                    slot_fields.append(field_ids[field])
+                    values.append(float(text))
+                    decimals.append(decimal_places(text))
+        self.original = self._array(values)
+        self.values = self._array(values)
+        self.decimals = self._array(decimals, int)
+        self.file_ids = self._array(file_ids, int)
+        self.field_ids = self._array(slot_fields, int)
+
+    @staticmethod
+    def _array(values: list, dtype=float):
+        return np.array(values, dtype=dtype) if np is not None else list(values)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def select(self, pattern: str = "*", periods: Optional[Sequence[str]] = None,
+               difficulties: Optional[Sequence[str]] = None):
+        # fnmatch on the field path ('*' also crosses '/'); returns a boolean mask over all values
+        field_ok = [fnmatch.fnmatchcase(field, pattern) or fnmatch.fnmatchcase(field.split("@", 1)[0], pattern)
+                    for field in self.fields]
+        file_ok = [(periods is None or period in periods) and (difficulties is None or difficulty in difficulties)
+                   for period, difficulty, _ in self.files]
+        if np is not None:
+            return np.array(field_ok, dtype=bool)[self.field_ids] & np.array(file_ok, dtype=bool)[self.file_ids]
+        return [field_ok[field] and file_ok[file] for field, file in zip(self.field_ids, self.file_ids)]
+
+    def apply(self, mask, scale: float = 1.0, offset: float = 0.0, minimum: Optional[float] = None,
+              maximum: Optional[float] = None) -> int:
+        # values[mask] = clamp(values[mask] * scale + offset); returns the number of values selected
+        if np is not None:
+            selected = self.values[mask] * scale + offset
+            if minimum is not None or maximum is not None:
+                selected = np.clip(selected, minimum, maximum)
+            self.values[mask] = selected
+            return int(mask.sum())
+        count = 0
+        for i, selected in enumerate(mask):
+            if selected:
+                value = self.values[i] * scale + offset
+                if minimum is not None:
+                    value = max(minimum, value)
+                if maximum is not None:
+                    value = min(maximum, value)
+                self.values[i] = value
+                count += 1
+        return count
+
+    def changes(self) -> Dict[int, List[Tuple[Slot, str]]]:
+        # new text per changed slot, grouped by file; values that format the same are not changes
+        if np is not None:
+            candidates = np.nonzero(self.values != self.original)[0].tolist()
+        else:
+            candidates = [i for i, (new, old) in enumerate(zip(self.values, self.original)) if new != old]
+        changes: Dict[int, List[Tuple[Slot, str]]] = {}
+        for i in candidates:
+            decimals = int(self.decimals[i])
+            text = format_number(float(self.values[i]), decimals)
+            if text != format_number(float(self.original[i]), decimals):
+                changes.setdefault(self.slots[i].file, []).append((self.slots[i], text))
+        return changes
+
+    def reset(self):
+        self.values = self._array(list(self.original))
+
+    def summary(self, mask) -> List[Tuple[str, str, str, float, float]]:
+        # (period, difficulty, field, old, new) of the selected values
+        rows = []
+        indices = np.nonzero(mask)[0].tolist() if np is not None else [i for i, selected in enumerate(mask) if selected]
+        for i in indices:
+            period, difficulty, _ = self.files[int(self.file_ids[i])]
+            rows.append((period, difficulty, self.fields[int(self.field_ids[i])],
+                         float(self.original[i]), float(self.values[i])))
+        return rows
+
+
+def apply_slot_changes(document: SdlDocument, changes: List[Tuple[Slot, str]]):
+    # rewrites only the changed numbers, in atoms and inside time-series strings
+    by_token: Dict[Tuple[str, int], List[Tuple[int, str]]] = {}
+    for slot, text in changes:
+        by_token.setdefault((slot.path, slot.token), []).append((slot.element, text))
+    for (path, index), elements in by_token.items():
+        token: Token = document.get(path).value_tokens()[index]
+        if token.kind != STRING:
+            token.text = elements[0][1]
+            continue
+        # the element index of a series value is its position among the matches
+        replacements = dict(elements)
+        body = token.text[:-1]
+        pieces = []
+        position = 0
+        for element, match in enumerate(SERIES_VALUE_RE.finditer(body)):
+            if element in replacements:
+                pieces.append(body[position:match.start()])
+                pieces.append(f":{replacements[element]}")
+                position = match.end()
+        token.text = "".join(pieces) + body[position:] + token.text[-1]
@@ -0,0 +1,110 @@
+import difflib
+import os
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from hash_cache import HashCache
+from model_cache import ModelCache
+from sdl import SdlDocument, SdlSyntaxError
+from transaction import Transaction, read_text
+
+# Dry runs: what a transaction or a period switch would write, file by file, without
+# writing anything. Results are yielded as each file is computed, so a window can show
+# the first files while the rest are still being rendered.
+#
+# A period switch compares the period folder with resource/ by cached digest first;
+# identical files are reported without being read. The unified and field-level diffs
+# of a FileDiff are only computed when asked for.
+
+UNCHANGED = "unchanged"
+MODIFIED = "modified"
+CREATED = "created"
+MISSING = "missing"
+SDL_EXTENSIONS = (".set", ".inc")
+
+
+class FieldChange(NamedTuple):
+    path: str
+    old: Optional[str]
+    new: Optional[str]
+
+
+class FileDiff(NamedTuple):
+    path: str
+    status: str
+    old: str = ""
+    new: str = ""
+    label: str = ""  # shown instead of path, e.g. the file name inside resource/
+
+    @property
+    def changed(self) -> bool:
+        return self.status in (MODIFIED, CREATED)
+
+    def unified(self, context: int = 3) -> str:
+        if not self.changed:
+            return ""
+        name = self.label or self.path
+        lines = difflib.unified_diff(self.old.splitlines(True), self.new.splitlines(True), f"a/{name}", f"b/{name}",
+                                     n=context)
+        return "".join(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n" for line in lines)
+
+    def fields(self) -> List[FieldChange]:
+        # changed SDL values by block path; empty for files that are not SDL
+        if not self.changed or not self.path.endswith(SDL_EXTENSIONS):
+            return []
+        try:
+            old = SdlDocument.parse(self.old) if self.old else None
+            new = SdlDocument.parse(self.new)
+        except SdlSyntaxError:
+            return []
+        old_fields = _field_values(old) if old else {}
+        new_fields = _field_values(new)
+        changes = []
+        for path in list(old_fields) + [path for path in new_fields if path not in old_fields]:
+            if old_fields.get(path) != new_fields.get(path):
+                changes.append(FieldChange(path, old_fields.get(path), new_fields.get(path)))
+        return changes
+
+    def line_counts(self) -> Tuple[int, int]:
+        # (added, removed) lines
+        added = removed = 0
+        for line in self.unified(0).splitlines():
+            if line.startswith("+") and not line.startswith("+++"):
+                added += 1
+            elif line.startswith("-") and not line.startswith("---"):
+                removed += 1
+        return added, removed
+
+
+def _field_values(document: SdlDocument) -> Dict[str, str]:
+    # "[0]"-suffixed paths are aliases of the unsuffixed first sibling
+    return {path: " ".join(block.values) for path, block in document.index.items()
+            if not path.endswith("[0]") and block.values}
+
+
+def preview_transaction(transaction: Transaction, cache: Optional[ModelCache] = None,
+                        label: Optional[Callable[[str], str]] = None,
+                        sources: Optional[Dict[str, str]] = None) -> Iterator[FileDiff]:
+    # sources maps a target to the file it will be replaced by first (a period switch), the edits apply to that
+    for file_path, edits in transaction.edits.items():
+        if not os.path.exists(file_path):
+            yield FileDiff(file_path, MISSING, label=label(file_path) if label else "")
+            continue
+        original = cache.text(file_path) if cache else read_text(file_path)
+        source = (sources or {}).get(file_path)
+        content = Transaction.render(read_text(source) if source else original, edits, file_path)
+        yield FileDiff(file_path, MODIFIED if content != original else UNCHANGED, original, content,
+                       label(file_path) if label else "")
+
+
+def preview_copies(copies: List[Tuple[str, str]], hash_cache: HashCache,
+                   label: Optional[Callable[[str], str]] = None) -> Iterator[FileDiff]:
+    # copies are (source, target); identical pairs are settled by digest without reading either file
+    for src, dst in copies:
+        name = label(dst) if label else ""
+        if not os.path.exists(dst):
+            yield FileDiff(dst, CREATED, "", read_text(src), name)
+        elif hash_cache.same_content(src, dst):
+            yield FileDiff(dst, UNCHANGED, label=name)
+        else:
+            old, new = read_text(dst), read_text(src)
+            yield FileDiff(dst, MODIFIED if old != new else UNCHANGED, old, new, name)
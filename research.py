@@ -0,0 +1,171 @@
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sdl import ENCODING, STRING, Block, SdlDocument, Token
+
+# Research trees from unit_research_*.set. Entries look like
+#   {"squad_officer_kubel_con"   requires "squad_officer_con(ger)"   costs 2 }
+#   { tech "defense_level_2"     requires "reinforcement_stage_3 defense_level_1"   costs 4 }
+# and a file may pull in another one with (include "unit_research_ger2.set").
+#
+# Names required but never defined are either available from the start (base units and
+# vehicles of the roster) or dangling references; known_units tells them apart.
+
+
+class ResearchEntry(NamedTuple):
+    name: str
+    requires: Tuple[str, ...]
+    cost: int
+    tech: bool
+    file: str
+
+
+def _entry_name(block: Block) -> Optional[str]:
+    return next((item.value for item in block.items if isinstance(item, Token) and item.kind == STRING), None)
+
+
+def research_blocks(document: SdlDocument) -> List[Tuple[Block, str]]:
+    # top-level blocks that define a research entry, with their name
+    blocks = []
+    for block in document.root.blocks:
+        if block.open == "{" and block.param_token("requires") is not None:
+            name = _entry_name(block)
+            if name is not None:
+                blocks.append((block, name))
+    return blocks
+
+
+def parse_research(text: str, file: str = "") -> Tuple[List[ResearchEntry], List[str]]:
+    document = SdlDocument.parse(text)
+    includes = [_entry_name(block) for block in document.root.blocks if block.open == "(" and block.key == "include"]
+    entries = []
+    for block, name in research_blocks(document):
+        cost = block.param_token("costs")
+        entries.append(ResearchEntry(name, tuple(block.param_token("requires").value.split()),
+                                     int(cost.value) if cost is not None else 0, block.key == "tech", file))
+    return entries, [include for include in includes if include]
+
+
+def load_research(file_path: str) -> Tuple[List[ResearchEntry], List[str]]:
+    # returns the entries of file_path and of everything it includes, and the files read
+    entries: List[ResearchEntry] = []
+    files: List[str] = []
+
+    def visit(path: str):
+        path = os.path.normpath(path)
+        if path in files or not os.path.exists(path):
+            return
+        files.append(path)
+        with open(path, "r", encoding=ENCODING, newline="") as file:
+            file_entries, includes = parse_research(file.read(), path)
+        for include in includes:
+            visit(os.path.join(os.path.dirname(path), include))
+        entries.extend(file_entries)
+
+    visit(file_path)
+    return entries, files
+
+
+def _set_bits(mask: int) -> Iterator[int]:
+    # indexes of the set bits, lowest first, one step per set bit
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ResearchTree:
+    def __init__(self, entries: List[ResearchEntry], known_units: Optional[Set[str]] = None,
+                 files: Optional[List[str]] = None):
+        self.files = files or []
+        self.entries: Dict[str, ResearchEntry] = {}
+        self.duplicates: List[str] = []
+        for entry in entries:
+            if entry.name in self.entries:
+                self.duplicates.append(entry.name)
+            self.entries[entry.name] = entry
+
+        # base: required but not researched; dangling: base names the roster doesn't know either
+        required = {name for entry in self.entries.values() for name in entry.requires}
+        self.base = sorted(required - set(self.entries))
+        self.dangling = sorted(name for name in self.base if known_units is not None and
+                               _unit_name(name) not in known_units)
+        self.order: List[str] = []
+        self.depth: Dict[str, int] = {}
+        self.total_cost: Dict[str, int] = {}
+        self.cyclic: List[str] = []
+        self._ancestors: Dict[str, int] = {}
+        self._build()
+
+    def _build(self):
+        # Kahn's algorithm over the researched entries; base names are already unlocked
+        dependents: Dict[str, List[str]] = {name: [] for name in self.entries}
+        pending: Dict[str, int] = {}
+        for name, entry in self.entries.items():
+            requires = {required for required in entry.requires if required in self.entries}
+            pending[name] = len(requires)
+            for required in requires:
+                dependents[required].append(name)
+
+        ready = [name for name, count in pending.items() if count == 0]
+        while ready:
+            name = ready.pop()
+            self.order.append(name)
+            for dependent in dependents[name]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        self.cyclic = sorted(name for name, count in pending.items() if count > 0)
+
+        # ancestor sets as bitsets, so a prerequisite shared by several paths is only paid once
+        bits = {name: 1 << i for i, name in enumerate(self.order)}
+        costs = [self.entries[name].cost for name in self.order]
+        for name in self.order:
+            ancestors = 0
+            depth = 0
+            researched = {required for required in self.entries[name].requires if required in bits}
+            for required in researched:
+                ancestors |= self._ancestors[required] | bits[required]
+                depth = max(depth, self.depth[required] + 1)
+            self._ancestors[name] = ancestors
+            self.depth[name] = depth
+            if len(researched) == 1:
+                # a single prerequisite's ancestors can't overlap it, its total already counts them once
+                required, = researched
+                self.total_cost[name] = self.entries[name].cost + self.total_cost[required]
+            else:
+                self.total_cost[name] = self.entries[name].cost + sum(costs[i] for i in _set_bits(ancestors))
+
+    def prerequisites(self, name: str) -> List[str]:
+        # every entry that has to be researched before name, in unlock order
+        return [self.order[i] for i in _set_bits(self._ancestors.get(name, 0))]
+
+    def cost_to_unlock(self, name: str) -> Optional[int]:
+        return self.total_cost.get(name)
+
+    def problems(self) -> List[str]:
+        problems = [f"cycle through {name}" for name in self.cyclic]
+        problems += [f"dangling requirement {name}" for name in self.dangling]
+        problems += [f"duplicate entry {name}" for name in self.duplicates]
+        return problems
+
+
+def _unit_name(name: str) -> str:
+    # "single_officer(ger)" is roster unit single_officer of side ger
+    return name.split("(", 1)[0]
+
+
+def rebalance_costs(document: SdlDocument, scale: float = 1.0, offset: int = 0, minimum: int = 0,
+                    names: Optional[Set[str]] = None) -> int:
+    # Scales the costs of every entry (or of names) in place; returns the number of entries changed
+    changed = 0
+    for block, name in research_blocks(document):
+        token = block.param_token("costs")
+        if token is None or (names is not None and name not in names):
+            continue
+        cost = int(token.value)
+        new_cost = max(minimum, int(round(cost * scale)) + offset) if cost > 0 else cost
+        if new_cost != cost:
+            token.text = str(new_cost)
+            changed += 1
+    return changed
@@ -0,0 +1,93 @@
+import math
+from typing import List, NamedTuple, Optional, Tuple
+
+# {ResearchStages "0:1 1:1 2:2 ..."} maps games played to the research tree level bots
+# can use. Curves are generated from a few parameters instead of being typed by hand:
+#
+#   level(game) = min(cap, start + offset + floor(max(0, game - delay) * rate))
+#
+# and written for every game until the cap is reached.
+
+Curve = List[Tuple[int, Optional[int]]]
+
+MAX_GAMES = 100
+# games after which previews compare the current and the new curve
+CHECKPOINTS = (5, 10, 20)
+
+
+class CurveParams(NamedTuple):
+    start: int = 1
+    rate: float = 1.0
+    delay: int = 0
+    cap: int = 20
+
+
+class CurvePreview(NamedTuple):
+    period: str
+    difficulty: str
+    duration: str
+    current: str
+    fitted: Optional[CurveParams]  # parameters closest to the current curve
+    new: str
+
+
+def parse_curve(text: str) -> Curve:
+    # tolerant of hand-edited entries such as "17:" (game without level)
+    points = []
+    for pair in text.split():
+        game, _, level = pair.partition(":")
+        if game.lstrip("-").isdigit():
+            points.append((int(game), int(level) if level.lstrip("-").isdigit() else None))
+    return points
+
+
+def format_curve(points: Curve) -> str:
+    return " ".join(f"{game}:{level}" for game, level in points)
+
+
+def generate_curve(params: CurveParams, offset: int = 0) -> Curve:
+    cap = max(params.cap, 0)
+    points = []
+    for game in range(MAX_GAMES):
+        level = min(cap, max(0, params.start + offset + math.floor(max(0, game - params.delay) * params.rate + 1e-9)))
+        points.append((game, level))
+        if level >= cap or (params.rate <= 0 and game >= params.delay):
+            break
+    return points
+
+
+def fit_curve(points: Curve) -> Optional[CurveParams]:
+    # parameters of a generated curve closest to an existing one
+    levels = [(game, level) for game, level in points if level is not None]
+    if not levels:
+        return None
+    start = levels[0][1]
+    cap = max(level for _, level in levels)
+    first_step = next((game for game, level in levels if level > start), None)
+    if first_step is None:
+        return CurveParams(start, 0.0, 0, cap)
+    reached = next(game for game, level in levels if level == cap)
+    rate = (cap - start) / (reached - first_step + 1)
+    return CurveParams(start, rate, max(first_step - round(1 / rate), 0), cap)
+
+
+def level_at(points: Curve, game: int) -> Optional[int]:
+    # level in effect after `game` games, the last entry at or before it wins
+    current = None
+    for point_game, level in points:
+        if point_game > game:
+            break
+        if level is not None:
+            current = level
+    return current
+
+
+def levels_at(text: str, games=CHECKPOINTS) -> List[Optional[int]]:
+    points = parse_curve(text)
+    return [level_at(points, game) for game in games]
+
+
+def format_params(params: Optional[CurveParams]) -> str:
+    if params is None:
+        return "no levels"
+    return f"start {params.start}, rate {round(params.rate, 2):g}, delay {params.delay}, cap {params.cap}"
@@ -0,0 +1,245 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from hash_cache import HashCache
+from sdl import ENCODING, STRING, Block, Token, parse
+
+# Queryable index of the roster files (units_*.set) of every war period, kept in an
+# SQLite database next to the other caches. Each source file is re-parsed only when
+# its content hash differs from the one the index was built from.
+#
+# A roster entry is either a bare template line
+#   ("squad_with3types_conquest" side(ger) period(mid) min_stage(3) max_stage(99) name(squad_x) c1(nco:1) ...)
+# or a named block holding a template line and extra settings
+#   {"mg34_lafette" ("vehicle2" side(ger) ... crew1(mg_crew:1)) {cost 130} {tags "a b"}}
+# or a named block with settings only ({"bf110_e2" {tags "conquest"} {cp 10} ...}).
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, digest TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    roster TEXT NOT NULL,
+    faction TEXT NOT NULL,
+    name TEXT,
+    template TEXT,
+    side TEXT,
+    period TEXT,
+    min_stage INTEGER,
+    max_stage INTEGER,
+    cw INTEGER,
+    cp INTEGER,
+    cost INTEGER,
+    vehicle TEXT,
+    for_sale INTEGER NOT NULL,
+    line INTEGER
+);
+CREATE TABLE IF NOT EXISTS members (unit_id INTEGER NOT NULL, unit TEXT NOT NULL, count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS tags (unit_id INTEGER NOT NULL, tag TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS units_lookup ON units (side, roster, min_stage, max_stage);
+CREATE INDEX IF NOT EXISTS units_source ON units (source);
+CREATE INDEX IF NOT EXISTS units_vehicle ON units (vehicle);
+CREATE INDEX IF NOT EXISTS members_unit ON members (unit, unit_id);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag, unit_id);
+"""
+
+UNIT_COLUMNS = ["id", "source", "roster", "faction", "name", "template", "side", "period", "min_stage", "max_stage",
+                "cw", "cp", "cost", "vehicle", "for_sale", "line"]
+MEMBER_PARAM_RE = re.compile(r"(c|crew)\d*")
+FACTION_RE = re.compile(r"units_(\w+)\.set")
+
+
+def _block_text(block: Block) -> str:
+    return " ".join(item.value for item in block.items if isinstance(item, Token) and not item.trivia)
+
+
+def _to_int(text: Optional[str]) -> Optional[int]:
+    try:
+        return int(text) if text is not None else None
+    except ValueError:
+        return None
+
+
+def template_params(block: Block) -> Tuple[Dict[str, str], List[Tuple[str, int]]]:
+    # side(ger) is an atom followed by a "(" block; members are c1(unit:2), crew(unit:2), crew3(unit:1), ...
+    params: Dict[str, str] = {}
+    members: List[Tuple[str, int]] = []
+    items = block.args
+    for item, following in zip(items, items[1:]):
+        if not (isinstance(item, Token) and isinstance(following, Block) and following.open == "("):
+            continue
+        value = _block_text(following)
+        if MEMBER_PARAM_RE.fullmatch(item.value):
+            unit, _, count = value.partition(":")
+            members.append((unit, _to_int(count) or 1))
+        else:
+            params[item.value] = value
+    return params, members
+
+
+def _settings(block: Block) -> Dict[str, str]:
+    return {child.key: " ".join(child.values) for child in block.blocks if child.open == "{" and child.key}
+
+
+def _apply_settings(entry: Dict[str, Any], settings: Dict[str, str]):
+    if "cost" in settings:
+        entry["cost"] = _to_int(settings["cost"])
+    for key in ("cw", "cp"):
+        if entry[key] is None and key in settings:
+            entry[key] = _to_int(settings[key])
+    if settings.get("not_for_sale", "0") != "0" or settings.get("not_for_player_sale", "0") != "0":
+        entry["for_sale"] = 0
+    entry["tags"].extend(settings.get("tags", "").split())
+
+
+def _entry(name: Optional[str], template: Optional[Block], line: int) -> Dict[str, Any]:
+    params, members = template_params(template) if template else ({}, [])
+    return {
+        "name": name or params.get("name"),
+        "template": template.key if template else None,
+        "side": params.get("side"),
+        "period": params.get("period"),
+        "min_stage": _to_int(params.get("min_stage")),
+        "max_stage": _to_int(params.get("max_stage")),
+        "cw": _to_int(params.get("cw")),
+        "cp": _to_int(params.get("cp")),
+        "cost": None,
+        "vehicle": params.get("vehicle"),
+        "for_sale": 1,
+        "line": line,
+        "members": members,
+        "tags": [],
+    }
+
+
+def parse_roster(text: str) -> List[Dict[str, Any]]:
+    entries: List[Dict[str, Any]] = []
+    previous: List[Dict[str, Any]] = []
+    line = 1
+    for item in parse(text).items:
+        if isinstance(item, Token):
+            line += item.text.count("\n")
+            continue
+        start_line = line
+        parts: List[str] = []
+        item.emit(parts)
+        line += "".join(parts).count("\n")
+
+        first = next((token for token in item.items if isinstance(token, Token) and not token.trivia), None)
+        if item.open == "(":
+            previous = [_entry(None, item, start_line)]
+        elif first is not None and first.kind == STRING:
+            templates = [child for child in item.blocks if child.open == "("] or [None]
+            previous = [_entry(item.key, template, start_line) for template in templates]
+            for entry in previous:
+                _apply_settings(entry, _settings(item))
+        else:
+            # a bare {cost 4}{not_for_player_sale 1} after a template line belongs to that line
+            for entry in previous:
+                _apply_settings(entry, {item.key: " ".join(item.values)} if item.key else {})
+            continue
+        entries.extend(previous)
+    return entries
+
+
+class RosterIndex:
+    def __init__(self, db_path: str, hash_cache: HashCache):
+        self.db_path = db_path
+        self.hash_cache = hash_cache
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def refresh(self, sources: Dict[str, str]) -> Dict[str, int]:
+        # sources maps each roster file path to the period folder it belongs to
+        stats = {"parsed_files": 0, "unchanged_files": 0, "removed_files": 0, "units": 0}
+        with self.lock, self.connection:
+            known = dict(self.connection.execute("SELECT path, digest FROM sources"))
+            for path in set(known) - set(sources):
+                self._drop(path)
+                stats["removed_files"] += 1
+            for path, roster in sources.items():
+                digest = self.hash_cache.digest(path)
+                if known.get(path) == digest:
+                    stats["unchanged_files"] += 1
+                    continue
+                self._drop(path)
+                stats["units"] += self._load(path, roster)
+                self.connection.execute("INSERT INTO sources (path, digest) VALUES (?, ?)", (path, digest))
+                stats["parsed_files"] += 1
+        self.hash_cache.save()
+        if stats["parsed_files"] or stats["removed_files"]:
+            logging.info(f"Roster index updated: {stats}")
+        return stats
+
+    def _drop(self, path: str):
+        ids = "SELECT id FROM units WHERE source = ?"
+        self.connection.execute(f"DELETE FROM members WHERE unit_id IN ({ids})", (path,))
+        self.connection.execute(f"DELETE FROM tags WHERE unit_id IN ({ids})", (path,))
+        self.connection.execute("DELETE FROM units WHERE source = ?", (path,))
+        self.connection.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def _load(self, path: str, roster: str) -> int:
+        match = FACTION_RE.fullmatch(os.path.basename(path))
+        faction = match.group(1) if match else os.path.basename(path)
+        with open(path, "r", encoding=ENCODING, newline="") as file:
+            entries = parse_roster(file.read())
+        for entry in entries:
+            cursor = self.connection.execute(
+                "INSERT INTO units (source, roster, faction, name, template, side, period, min_stage, max_stage, "
+                "cw, cp, cost, vehicle, for_sale, line) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, roster, faction, entry["name"], entry["template"], entry["side"], entry["period"],
+                 entry["min_stage"], entry["max_stage"], entry["cw"], entry["cp"], entry["cost"], entry["vehicle"],
+                 entry["for_sale"], entry["line"]))
+            self.connection.executemany("INSERT INTO members (unit_id, unit, count) VALUES (?, ?, ?)",
+                                        [(cursor.lastrowid, unit, count) for unit, count in entry["members"]])
+            self.connection.executemany("INSERT INTO tags (unit_id, tag) VALUES (?, ?)",
+                                        [(cursor.lastrowid, tag) for tag in entry["tags"]])
+        return len(entries)
+
+    def query(self, side: Optional[str] = None, roster: Optional[str] = None, stage: Optional[int] = None,
+              period: Optional[str] = None, vehicle: Optional[str] = None, member: Optional[str] = None,
+              tag: Optional[str] = None, name: Optional[str] = None, for_sale: Optional[bool] = None) \
+            -> List[Dict[str, Any]]:
+        # roster is the period folder the file belongs to, period the entry's own period(...) value
+        conditions, params = [], []
+        for column, value in (("side", side), ("roster", roster), ("period", period), ("vehicle", vehicle),
+                              ("name", name)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if stage is not None:
+            conditions.append("min_stage <= ? AND max_stage >= ?")
+            params.extend([stage, stage])
+        if for_sale is not None:
+            conditions.append("for_sale = ?")
+            params.append(int(for_sale))
+        if member is not None:
+            conditions.append("id IN (SELECT unit_id FROM members WHERE unit = ?)")
+            params.append(member)
+        if tag is not None:
+            conditions.append("id IN (SELECT unit_id FROM tags WHERE tag = ?)")
+            params.append(tag)
+        sql = f"SELECT {', '.join(UNIT_COLUMNS)} FROM units"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql + " ORDER BY id", params)]
+
+    def members(self, unit_id: int) -> List[Tuple[str, int]]:
+        with self.lock:
+            return [(row["unit"], row["count"]) for row in
+                    self.connection.execute("SELECT unit, count FROM members WHERE unit_id = ?", (unit_id,))]
+
+    def tags(self, unit_id: int) -> List[str]:
+        with self.lock:
+            return [row["tag"] for row in self.connection.execute("SELECT tag FROM tags WHERE unit_id = ?",
+                                                                  (unit_id,))]
@@ -0,0 +1,275 @@
+import re
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# Lossless parser for the SDL syntax used by dcg_*.inc, units_*.set and unit_research_*.set.
+# Whitespace and comments are kept as tokens, so dumps() re-emits the file byte-for-byte
+# apart from the values that were explicitly changed.
+
+WS = "ws"
+COMMENT = "comment"
+STRING = "string"
+ATOM = "atom"
+
+# latin-1 maps every byte to one character, so any file round-trips unchanged
+ENCODING = "latin-1"
+
+_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>;[^\n]*)
+  | (?P<string>"[^"]*")
+  | (?P<open>[{(])
+  | (?P<close>[})])
+  | (?P<atom>[^\s{}()";]+)
+''', re.VERBOSE)
+
+_CLOSERS = {"{": "}", "(": ")"}
+_ATOM_RE = re.compile(r'[^\s{}()";]+')
+
+
+class SdlSyntaxError(ValueError):
+    def __init__(self, message: str, line: int):
+        super().__init__(f"{message} (line {line})")
+        self.line = line
+
+
+class Token:
+    __slots__ = ("kind", "text")
+
+    def __init__(self, kind: str, text: str):
+        self.kind = kind
+        self.text = text
+
+    @property
+    def trivia(self) -> bool:
+        return self.kind == WS or self.kind == COMMENT
+
+    @property
+    def value(self) -> str:
+        return self.text[1:-1] if self.kind == STRING else self.text
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r})"
+
+
+class Block:
+    __slots__ = ("open", "close", "items", "parent")
+
+    def __init__(self, open_: str, parent: Optional["Block"] = None):
+        self.open = open_
+        self.close = ""
+        self.items: List[Union[Token, "Block"]] = []
+        self.parent = parent
+
+    def _significant(self) -> Iterator[Union[Token, "Block"]]:
+        return (item for item in self.items if isinstance(item, Block) or not item.trivia)
+
+    @property
+    def key(self) -> Optional[str]:
+        first = next(self._significant(), None)
+        return first.value if isinstance(first, Token) else None
+
+    @property
+    def args(self) -> List[Union[Token, "Block"]]:
+        significant = list(self._significant())
+        if significant and isinstance(significant[0], Token):
+            return significant[1:]
+        return significant
+
+    @property
+    def blocks(self) -> List["Block"]:
+        return [item for item in self.items if isinstance(item, Block)]
+
+    def value_tokens(self) -> List[Token]:
+        return [item for item in self.args if isinstance(item, Token)]
+
+    @property
+    def values(self) -> List[str]:
+        return [token.value for token in self.value_tokens()]
+
+    def param_token(self, name: str) -> Optional[Token]:
+        tokens = self.value_tokens()
+        for token, following in zip(tokens, tokens[1:]):
+            if token.kind == ATOM and token.text == name:
+                return following
+        return None
+
+    def emit(self, parts: List[str]):
+        parts.append(self.open)
+        for item in self.items:
+            if isinstance(item, Block):
+                item.emit(parts)
+            else:
+                parts.append(item.text)
+        parts.append(self.close)
+
+    def clone(self, parent: Optional["Block"] = None) -> "Block":
+        copy = Block(self.open, parent)
+        copy.close = self.close
+        copy.items = [item.clone(copy) if isinstance(item, Block) else Token(item.kind, item.text)
+                      for item in self.items]
+        return copy
+
+    def __repr__(self):
+        return f"Block({self.open}{self.key})"
+
+
+def _format_token(value, quoted: bool) -> Token:
+    text = str(value)
+    if quoted:
+        if '"' in text:
+            raise ValueError(f"Quoted SDL value cannot contain '\"': {text!r}")
+        return Token(STRING, f'"{text}"')
+    if not _ATOM_RE.fullmatch(text):
+        raise ValueError(f"Invalid SDL value: {text!r}")
+    return Token(ATOM, text)
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, str, int]]:
+    line = 1
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise SdlSyntaxError("Unterminated string", line)
+        yield match.lastgroup, match.group(), line
+        line += match.group().count("\n")
+        pos = match.end()
+
+
+def parse(text: str) -> Block:
+    root = Block("")
+    current = root
+    for kind, value, line in tokenize(text):
+        if kind == "open":
+            block = Block(value, current)
+            current.items.append(block)
+            current = block
+        elif kind == "close":
+            if current is root or _CLOSERS[current.open] != value:
+                raise SdlSyntaxError(f"Unexpected '{value}'", line)
+            current.close = value
+            current = current.parent
+        else:
+            current.items.append(Token(kind, value))
+    if current is not root:
+        raise SdlSyntaxError(f"Unclosed '{current.open}{current.key or ''}'", text.count("\n") + 1)
+    return root
+
+
+class SdlDocument:
+    def __init__(self, root: Block):
+        self.root = root
+        self.index: Dict[str, Block] = {}
+        self._index_children(root, "")
+
+    def reindex(self):
+        # after blocks were added or removed
+        self.index = {}
+        self._index_children(self.root, "")
+
+    def _index_children(self, block: Block, prefix: str):
+        seen: Dict[Optional[str], int] = {}
+        for child in block.blocks:
+            key = child.key
+            count = seen.get(key, 0)
+            seen[key] = count + 1
+            if key is None:
+                path = f"{prefix}[{count}]"
+            else:
+                path = f"{prefix}{key}[{count}]"
+                if count == 0:
+                    self.index[f"{prefix}{key}"] = child
+            self.index[path] = child
+            self._index_children(child, (f"{prefix}{key}" if count == 0 and key is not None else path) + "/")
+
+    @classmethod
+    def parse(cls, text: str) -> "SdlDocument":
+        return cls(parse(text))
+
+    @classmethod
+    def load(cls, file_path: str) -> "SdlDocument":
+        with open(file_path, "r", encoding=ENCODING, newline="") as file:
+            return cls.parse(file.read())
+
+    def dumps(self) -> str:
+        parts: List[str] = []
+        self.root.emit(parts)
+        return "".join(parts)
+
+    def save(self, file_path: str):
+        with open(file_path, "w", encoding=ENCODING, newline="") as file:
+            file.write(self.dumps())
+
+    @property
+    def top_key(self) -> Optional[str]:
+        blocks = self.root.blocks
+        return blocks[0].key if blocks else None
+
+    def find(self, path: str) -> Optional[Block]:
+        return self.index.get(path)
+
+    def get(self, path: str) -> Block:
+        block = self.index.get(path)
+        if block is None:
+            raise KeyError(f"No SDL block at {path}")
+        return block
+
+    def find_all(self, pattern: str) -> List[Tuple[str, Block]]:
+        # '*' matches any single path segment, e.g. "*/Duration/*/Bots/ResearchStages";
+        # a plain segment also matches its repeated siblings ("item" -> item, item[1], ...)
+        regex = re.compile("/".join(r"[^/]+" if part == "*" else re.escape(part) + r"(?:\[\d+\])?"
+                                    for part in pattern.split("/")) + r"\Z")
+        return [(path, block) for path, block in self.index.items()
+                if not path.endswith("[0]") and regex.match(path)]
+
+    def get_values(self, path: str) -> List[str]:
+        return self.get(path).values
+
+    def get_value(self, path: str) -> str:
+        values = self.get_values(path)
+        if not values:
+            raise KeyError(f"SDL block {path} has no value")
+        return values[0]
+
+    def set_value(self, path: str, value):
+        self.set_values(path, [value])
+
+    def set_values(self, path: str, values):
+        # values replace the value tokens in place; nested blocks and comments between them stay where they are
+        block = self.get(path)
+        tokens = block.value_tokens()
+        for token, value in zip(tokens, values):
+            new = _format_token(value, token.kind == STRING)
+            token.kind, token.text = new.kind, new.text
+
+        # surplus tokens go with the whitespace before them
+        for token in tokens[len(values):]:
+            index = block.items.index(token)
+            previous = block.items[index - 1] if index else None
+            del block.items[index - 1 if isinstance(previous, Token) and previous.kind == WS else index:index + 1]
+
+        # added values follow the last value token (or the key), with the kind of the last token
+        if len(values) > len(tokens):
+            quoted = bool(tokens) and tokens[-1].kind == STRING
+            if tokens:
+                position = block.items.index(tokens[-1]) + 1
+            else:
+                position = next(i for i, item in enumerate(block.items)
+                                if isinstance(item, Token) and not item.trivia) + 1
+            new_items: List[Union[Token, Block]] = []
+            for value in values[len(tokens):]:
+                new_items += [Token(WS, " "), _format_token(value, quoted)]
+            block.items[position:position] = new_items
+
+    def get_param(self, path: str, name: str) -> str:
+        token = self.get(path).param_token(name)
+        if token is None:
+            raise KeyError(f"SDL block {path} has no '{name}' parameter")
+        return token.value
+
+    def set_param(self, path: str, name: str, value):
+        token = self.get(path).param_token(name)
+        if token is None:
+            raise KeyError(f"SDL block {path} has no '{name}' parameter")
+        new = _format_token(value, token.kind == STRING)
+        token.kind, token.text = new.kind, new.text
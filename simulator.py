@@ -0,0 +1,234 @@
+import bisect
+import itertools
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sdl import Block, SdlDocument
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the list fallback gives the same results, only slower
+    np = None
+
+# Offline model of the bots' army size, to compare settings without playing a match.
+#
+# From a dcg_*.inc difficulty block:
+#   {Bots {StartMP 0.05 min 3002 attackerMultiplier 14.0} {FinishMP 0.15 attackerMultiplier 55.5}
+#         {CP {Base "0:0,60:0,540:11,..."} {RoundMultiplier "0:0.1 1:0.3 ..."} {AttackMultiplier 3.9}}
+#         {DefenseLevel {level_1 {DefenseBudgetPlayer 114.0} {DefenseBudgetAI 111.25} {unlock games 0 progress 0.0}}}}
+# and from bot.conquest_configuration.lua the first wave time per flag count and the typhoon waves.
+#
+# The bots' CP limit after t seconds of a match is
+#   Base(t) * RoundMultiplier(games played) * (AttackMultiplier when the bots attack)
+# where both curves hold their last value until the next point. bot.lua spawns nothing before
+# firstWaveOffsetTime, then one unit per spawn cooldown; in typhoon wave mode it spawns with a
+# 2 second cooldown for typhoonWaveDuration seconds, then waits typhoonWaveInterval seconds.
+# The army grows by unit_cp per spawn until it reaches the limit; losses are not modelled.
+#
+# StartMP/FinishMP are the bots' share of the player's MP at the start and the end of the
+# campaign (never below min); attackerMultiplier applies when the bots attack. The defense
+# budgets come from the highest DefenseLevel unlocked by games played or campaign progress.
+#
+# SpawnCooldownTime is set in the game's bot.data, which is not shipped with the mod, so the
+# normal cooldown and the CP of a spawned unit are inputs of each scenario.
+
+Series = List[Tuple[float, float]]
+
+SERIES_RE = re.compile(r"(-?\d+(?:\.\d+)?):(-?\d+(?:\.\d+)?)")
+WAVE_KEYS = ["oneFlagOffsetTime", "twoFlagOffsetTime", "threeFlagOffsetTime", "fourFlagOffsetTime",
+             "fiveFlagOffsetTime", "typhoonWaveInterval", "typhoonWaveDuration"]
+CAMPAIGN_GAMES = 20
+TYPHOON_COOLDOWN = 2.0
+DEFAULT_SPAWN_COOLDOWN = 15.0
+DEFAULT_UNIT_CP = 5.0
+
+
+class DefenseLevel(NamedTuple):
+    games: int
+    progress: float
+    budget_player: float
+    budget_ai: float
+
+
+class BotModel(NamedTuple):
+    base: Series
+    round_multiplier: Series
+    attack_multiplier: float
+    start_mp: float
+    start_min: float
+    start_attacker: float
+    finish_mp: float
+    finish_attacker: float
+    defense_levels: List[DefenseLevel]
+
+
+class WaveModel(NamedTuple):
+    flag_offsets: Tuple[float, ...] = (540.0, 729.0, 1600.0, 1800.0, 820.0)
+    typhoon_interval: float = 100.0
+    typhoon_duration: float = 35.0
+
+
+class Scenario(NamedTuple):
+    games: int = 0
+    flags: int = 1
+    attacking: bool = True
+    typhoon: bool = False
+    progress: Optional[float] = None  # campaign progress 0..1, defaults to games / CAMPAIGN_GAMES
+    base_scale: float = 1.0
+    round_scale: float = 1.0
+    attack_multiplier: Optional[float] = None
+    first_wave: Optional[float] = None
+    typhoon_interval: Optional[float] = None
+    typhoon_duration: Optional[float] = None
+    spawn_cooldown: float = DEFAULT_SPAWN_COOLDOWN
+    unit_cp: float = DEFAULT_UNIT_CP
+    player_mp: float = 0.0
+
+
+def parse_series(text: str) -> Series:
+    # "0:0,60:0,540:11" and "0:0.1 1:0.3" alike
+    return sorted((float(x), float(y)) for x, y in SERIES_RE.findall(text))
+
+
+def step_value(series: Series, x: float) -> float:
+    # value of the last point at or before x
+    i = bisect.bisect_right([point for point, _ in series], x)
+    return series[i - 1][1] if i else 0.0
+
+
+def _number(block: Optional[Block], name: Optional[str] = None, default: float = 0.0) -> float:
+    if block is None:
+        return default
+    token = block.param_token(name) if name else next(iter(block.value_tokens()), None)
+    try:
+        return float(token.value) if token is not None else default
+    except ValueError:
+        return default
+
+
+def read_bot_model(document: SdlDocument) -> BotModel:
+    bots = f"{document.top_key}/Bots"
+    base = document.find(f"{bots}/CP/Base")
+    rounds = document.find(f"{bots}/CP/RoundMultiplier")
+    start = document.find(f"{bots}/StartMP")
+    finish = document.find(f"{bots}/FinishMP")
+    levels = []
+    for path, _ in document.find_all(f"{bots}/DefenseLevel/*"):
+        unlock = document.find(f"{path}/unlock")
+        levels.append(DefenseLevel(int(_number(unlock, "games")), _number(unlock, "progress"),
+                                   _number(document.find(f"{path}/DefenseBudgetPlayer")),
+                                   _number(document.find(f"{path}/DefenseBudgetAI"))))
+    return BotModel(parse_series("".join(base.values)) if base else [],
+                    parse_series("".join(rounds.values)) if rounds else [],
+                    _number(document.find(f"{bots}/CP/AttackMultiplier"), default=1.0),
+                    _number(start), _number(start, "min"), _number(start, "attackerMultiplier", 1.0),
+                    _number(finish), _number(finish, "attackerMultiplier", 1.0),
+                    sorted(levels))
+
+
+def read_wave_model(content: str) -> WaveModel:
+    values = {}
+    for key in WAVE_KEYS:
+        match = re.search(rf"{key} = (-?\d+(?:\.\d+)?)", content)
+        if match:
+            values[key] = float(match.group(1))
+    default = WaveModel()
+    return WaveModel(tuple(values.get(key, offset) for key, offset in zip(WAVE_KEYS, default.flag_offsets)),
+                     values.get("typhoonWaveInterval", default.typhoon_interval),
+                     values.get("typhoonWaveDuration", default.typhoon_duration))
+
+
+def sweep(**axes: Sequence[Any]) -> List[Scenario]:
+    # every combination of the given Scenario fields, e.g. sweep(games=range(20), typhoon=[False, True])
+    names = list(axes)
+    return [Scenario(**dict(zip(names, values))) for values in itertools.product(*(axes[name] for name in names))]
+
+
+class Simulation(NamedTuple):
+    scenarios: List[Scenario]
+    times: List[float]
+    army: Any  # scenarios x times, CP of the bots' army
+    cap: Any  # per scenario, highest CP limit of the match
+    first_wave: Any
+    mp: Any
+    defense_ai: Any
+    defense_player: Any
+
+    def army_at(self, scenario: int, seconds: float) -> float:
+        index = min(max(bisect.bisect_right(self.times, seconds) - 1, 0), len(self.times) - 1)
+        return float(self.army[scenario][index])
+
+    def peak(self, scenario: int) -> float:
+        return float(max(self.army[scenario]))
+
+    def rows(self, minutes: Sequence[int] = (10, 20, 30)) -> List[Dict[str, Any]]:
+        rows = []
+        for i, scenario in enumerate(self.scenarios):
+            row = dict(scenario._asdict())
+            row.update({"first_wave": float(self.first_wave[i]), "cap": float(self.cap[i]), "peak": self.peak(i),
+                        "mp": float(self.mp[i]), "defense_ai": float(self.defense_ai[i]),
+                        "defense_player": float(self.defense_player[i])})
+            row.update({f"army_{minute}m": self.army_at(i, minute * 60) for minute in minutes})
+            rows.append(row)
+        return rows
+
+
+def _scenario_constants(model: BotModel, waves: WaveModel, scenario: Scenario) -> Tuple[float, ...]:
+    progress = min(1.0, scenario.games / CAMPAIGN_GAMES) if scenario.progress is None else scenario.progress
+    attack = model.attack_multiplier if scenario.attack_multiplier is None else scenario.attack_multiplier
+    multiplier = scenario.base_scale * scenario.round_scale * step_value(model.round_multiplier, scenario.games)
+    if scenario.attacking:
+        multiplier *= attack
+    first_wave = scenario.first_wave if scenario.first_wave is not None else \
+        waves.flag_offsets[min(max(scenario.flags, 1), len(waves.flag_offsets)) - 1]
+    interval = waves.typhoon_interval if scenario.typhoon_interval is None else scenario.typhoon_interval
+    duration = waves.typhoon_duration if scenario.typhoon_duration is None else scenario.typhoon_duration
+
+    share = model.start_mp + (model.finish_mp - model.start_mp) * progress
+    mp = max(model.start_min, share * scenario.player_mp)
+    attacker = model.start_attacker + (model.finish_attacker - model.start_attacker) * progress
+    level = model.defense_levels[0] if model.defense_levels else DefenseLevel(0, 0.0, 0.0, 0.0)
+    for candidate in model.defense_levels:
+        if scenario.games >= candidate.games or progress >= candidate.progress:
+            level = candidate
+    cooldown = TYPHOON_COOLDOWN if scenario.typhoon else scenario.spawn_cooldown
+    # while typhoon waves are off, the wave "window" covers the whole cycle
+    window = duration if scenario.typhoon else 1.0
+    cycle = duration + interval if scenario.typhoon else 1.0
+    return (multiplier, first_wave, scenario.unit_cp / cooldown, window, cycle,
+            mp * attacker if scenario.attacking else mp, mp * level.budget_ai, level.budget_player * scenario.flags)
+
+
+def simulate(model: BotModel, waves: WaveModel, scenarios: Sequence[Scenario], duration: float = 3600.0,
+             step: float = 10.0) -> Simulation:
+    scenarios = list(scenarios)
+    times = [i * step for i in range(int(duration // step) + 1)]
+    base = [step_value(model.base, t) for t in times]
+    columns = list(zip(*(_scenario_constants(model, waves, scenario) for scenario in scenarios))) or [()] * 8
+    multiplier, first_wave, rate, window, cycle, mp, defense_ai, defense_player = columns
+
+    if np is not None:
+        multiplier, first_wave, rate, window, cycle = (np.array(column, dtype=float) for column in
+                                                       (multiplier, first_wave, rate, window, cycle))
+        army = np.zeros((len(scenarios), len(times)))
+        current = np.zeros(len(scenarios))
+        for j, t in enumerate(times):
+            since = t - first_wave
+            spawning = (since >= 0) & (np.mod(np.maximum(since, 0), cycle) < window)
+            current = current + np.clip(base[j] * multiplier - current, 0, np.where(spawning, rate * step, 0))
+            army[:, j] = current
+        cap = multiplier * max(base)
+        return Simulation(scenarios, times, army, cap, first_wave, np.array(mp), np.array(defense_ai),
+                          np.array(defense_player))
+
+    army = []
+    for k, f, r, w, c in zip(multiplier, first_wave, rate, window, cycle):
+        current = 0.0
+        row = []
+        for t, b in zip(times, base):
+            if t >= f and (t - f) % c < w:
+                current += min(max(b * k - current, 0.0), r * step)
+            row.append(current)
+        army.append(row)
+    return Simulation(scenarios, times, army, [k * max(base) for k in multiplier], list(first_wave), list(mp),
+                      list(defense_ai), list(defense_player))
@@ -0,0 +1,167 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from hash_cache import HashCache
+from journal import Journal
+from tracing import span
+
+# Content-addressed backup store. File contents are stored once as blobs named by
+# their SHA-1 (blobs/ab/abcdef...[.gz]); each snapshot is a small JSON manifest that
+# maps file names to their location under base_dir and the blob holding their content.
+
+
+class SnapshotStore:
+    def __init__(self, root: str, base_dir: str, hash_cache: HashCache, compress: bool = True,
+                 journal: Optional[Journal] = None):
+        self.root = root
+        self.base_dir = base_dir
+        self.hash_cache = hash_cache
+        self.compress = compress
+        self.journal = journal or Journal()
+        self.blob_dir = os.path.join(root, "blobs")
+        self.manifest_dir = os.path.join(root, "snapshots")
+
+    def _blob_path(self, digest: str, compressed: bool) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest + (".gz" if compressed else ""))
+
+    def _find_blob(self, digest: str) -> Optional[str]:
+        for compressed in (True, False):
+            path = self._blob_path(digest, compressed)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _write_blob(self, src: str, digest: str) -> int:
+        dst = self._blob_path(digest, self.compress)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".tmp")
+        try:
+            with span("copy", "backup blob", src, os.path.getsize(src)), open(src, "rb") as source, \
+                    os.fdopen(fd, "wb") as raw:
+                if self.compress:
+                    with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as target:
+                        shutil.copyfileobj(source, target)
+                else:
+                    shutil.copyfileobj(source, raw)
+            os.replace(tmp_path, dst)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return os.path.getsize(dst)
+
+    def _read_blob(self, blob: str, dst: str):
+        with span("copy", "restore blob", blob, os.path.getsize(blob)), \
+                (gzip.open(blob, "rb") if blob.endswith(".gz") else open(blob, "rb")) as source, \
+                open(dst, "wb") as target:
+            shutil.copyfileobj(source, target)
+
+    def _blob_writer(self, blob: str, name: str) -> Callable[[str, Callable[[str], None]], None]:
+        def write(tmp_path: str, count: Callable[[str], None]):
+            self._read_blob(blob, tmp_path)
+            count(name)
+        return write
+
+    def snapshot(self, files: Dict[str, str], label: str = "") -> Dict[str, Any]:
+        entries = {}
+        new_blobs = new_bytes = 0
+        for name, path in files.items():
+            try:
+                digest = self.hash_cache.digest(path)
+            except PermissionError:
+                raise Exception(f"Permission denied when trying to backup {path}")
+            if self._find_blob(digest) is None:
+                new_bytes += self._write_blob(path, digest)
+                new_blobs += 1
+            entries[name] = {"path": os.path.relpath(path, self.base_dir).replace(os.sep, "/"),
+                             "hash": digest, "size": os.path.getsize(path)}
+
+        created = datetime.now()
+        manifest = {"id": created.strftime("%Y%m%d-%H%M%S-%f"), "created": created.isoformat(timespec="seconds"),
+                    "label": label, "files": entries}
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        with open(os.path.join(self.manifest_dir, f"{manifest['id']}.json"), "w") as f:
+            json.dump(manifest, f, indent=4)
+        self.hash_cache.save()
+        logging.info(f"Snapshot {manifest['id']}: {len(entries)} file(s), {new_blobs} new blob(s), {new_bytes} bytes")
+        return manifest
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.manifest_dir):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.manifest_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.manifest_dir, name), "r") as f:
+                    manifests.append(json.load(f))
+        return manifests
+
+    def load(self, snapshot_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if snapshot_id is None:
+            manifests = self.list()
+            return manifests[-1] if manifests else None
+        try:
+            with open(os.path.join(self.manifest_dir, f"{snapshot_id}.json"), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def restore(self, snapshot_id: Optional[str] = None, names: Optional[List[str]] = None,
+                progress: Optional[Callable[[int, int, str], None]] = None) -> Dict[str, int]:
+        manifest = self.load(snapshot_id)
+        if manifest is None:
+            raise Exception(f"No snapshot {snapshot_id or 'available'} to restore")
+
+        stats = {"restored_files": 0, "skipped_files": 0}
+        writers = {}
+        digests = {}
+        for name, entry in manifest["files"].items():
+            if names is not None and name not in names:
+                continue
+            dst = os.path.join(self.base_dir, *entry["path"].split("/"))
+            if os.path.exists(dst) and self.hash_cache.digest(dst) == entry["hash"]:
+                stats["skipped_files"] += 1
+                continue
+            blob = self._find_blob(entry["hash"])
+            if blob is None:
+                logging.error(f"Missing blob {entry['hash']} for {name} in snapshot {manifest['id']}")
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            writers[dst] = self._blob_writer(blob, name)
+            digests[dst] = entry["hash"]
+
+        # only the files that differ from the snapshot are journaled and rewritten
+        total = len(writers)
+        done = 0
+
+        def count(name: str):
+            nonlocal done
+            done += 1
+            if progress:
+                progress(done, total, name)
+
+        self.journal.run({dst: lambda tmp_path, write=write: write(tmp_path, count) for dst, write in writers.items()})
+        for dst, digest in digests.items():
+            self.hash_cache.record(dst, digest)
+        stats["restored_files"] = len(writers)
+        self.hash_cache.save()
+        logging.info(f"Restored snapshot {manifest['id']}: {stats}")
+        return stats
+
+    def prune(self, keep: int):
+        manifests = self.list()
+        for manifest in manifests[:-keep] if keep > 0 else []:
+            os.unlink(os.path.join(self.manifest_dir, f"{manifest['id']}.json"))
+        referenced = {entry["hash"] for manifest in self.list() for entry in manifest["files"].values()}
+        if not os.path.isdir(self.blob_dir):
+            return
+        for prefix in os.listdir(self.blob_dir):
+            for name in os.listdir(os.path.join(self.blob_dir, prefix)):
+                if name.split(".")[0] not in referenced:
+                    os.unlink(os.path.join(self.blob_dir, prefix, name))
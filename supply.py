@@ -0,0 +1,221 @@
+import fnmatch
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from numeric_matrix import NUMBER_RE, decimal_places, format_number
+from sdl import ATOM, STRING, WS, Block, SdlDocument, Token
+
+# Structured access to resupply.inc and ballistics.set, so values can be adjusted and the
+# modded/vanilla files merged per entry instead of copying whole files.
+#
+# resupply.inc holds item tables and supply zones, one (define "name" ...) each:
+#   (define "items_light_ger"
+#       {item "mgun_ger" "belt" "ap"  "ammo" 50 {value 5}}    ;// item, variant, ammo, supply cost
+#       {item "grenade" "m24"                 1 {value 5}})
+#   (define "truck_ammo_heavyger" {extender "supply_zone" ... {regenerationPeriod 0} ...})
+# ballistics.set holds damage-over-distance curves:
+#   {ballistics {curve "bullet" {0.05 8.1} {0.10 6.6} ...} ...}
+#
+# All edits change tokens in place, so a written file differs only on the lines whose
+# values changed.
+
+SUPPLY_FIELDS = ("ammo", "value")
+
+
+class SupplyItem(NamedTuple):
+    define: str
+    item: str
+    variant: str
+    ammo: float
+    value: float
+
+
+class BallisticsPoint(NamedTuple):
+    curve: str
+    distance: float
+    damage: float
+
+
+def _name(block: Block) -> Optional[str]:
+    return next((token.value for token in block.value_tokens() if token.kind == STRING), None)
+
+
+def supply_defines(document: SdlDocument) -> List[Tuple[str, Block]]:
+    return [(_name(block), block) for block in document.root.blocks
+            if block.open == "(" and block.key == "define" and _name(block)]
+
+
+def _item_tokens(block: Block) -> Tuple[str, str, Optional[Token], Optional[Token]]:
+    # (item, variant, ammo token, value token) of {item "mgun_ger" "belt" "ap" "ammo" 50 {value 5}}
+    tokens = block.value_tokens()
+    names = [token.value for token in tokens if token.kind == STRING]
+    if names and names[-1] == "ammo" and len(names) > 1:
+        names.pop()
+    ammo = next((token for token in tokens if token.kind == ATOM and NUMBER_RE.match(token.text)), None)
+    value_block = next((child for child in block.blocks if child.key == "value"), None)
+    value = next(iter(value_block.value_tokens()), None) if value_block else None
+    return names[0] if names else "", " ".join(names[1:]), ammo, value
+
+
+def supply_items(document: SdlDocument) -> List[Tuple[SupplyItem, Block]]:
+    items = []
+    for define, block in supply_defines(document):
+        for child in block.blocks:
+            if child.key != "item":
+                continue
+            item, variant, ammo, value = _item_tokens(child)
+            items.append((SupplyItem(define, item, variant, float(ammo.text) if ammo else 0.0,
+                                     float(value.text) if value else 0.0), child))
+    return items
+
+
+def supply_table(document: SdlDocument) -> List[SupplyItem]:
+    return [item for item, _ in supply_items(document)]
+
+
+def _matches(item: SupplyItem, define: str, name: str, variant: str) -> bool:
+    return fnmatch.fnmatchcase(item.define, define) and fnmatch.fnmatchcase(item.item, name) and \
+        fnmatch.fnmatchcase(item.variant, variant)
+
+
+def adjust_supply(document: SdlDocument, field: str, scale: float = 1.0, offset: float = 0.0,
+                  minimum: Optional[float] = None, define: str = "*", item: str = "*", variant: str = "*") -> int:
+    # field is "ammo" or "value"; returns the number of entries whose value changed
+    if field not in SUPPLY_FIELDS:
+        raise ValueError(f"Unknown resupply field: {field}")
+    changed = 0
+    for entry, block in supply_items(document):
+        if not _matches(entry, define, item, variant):
+            continue
+        token = _item_tokens(block)[2 if field == "ammo" else 3]
+        if token is None:
+            continue
+        value = float(token.text) * scale + offset
+        if minimum is not None:
+            value = max(minimum, value)
+        text = format_number(value, decimal_places(token.text))
+        if text != token.text:
+            token.text = text
+            changed += 1
+    return changed
+
+
+def supply_settings(document: SdlDocument) -> Dict[Tuple[str, str], str]:
+    # numeric supply zone settings, {(define, "regenerationPeriod"): "5", ...}
+    settings = {}
+    for define, block in supply_defines(document):
+        for extender in block.blocks:
+            if extender.key != "extender":
+                continue
+            for setting in extender.blocks:
+                values = setting.values
+                if setting.key and len(values) == 1 and NUMBER_RE.match(values[0]):
+                    settings[(define, setting.key)] = values[0]
+    return settings
+
+
+def set_supply_setting(document: SdlDocument, key: str, value: str, defines: Sequence[str] = ("*",)) -> int:
+    changed = 0
+    for define, block in supply_defines(document):
+        if not any(fnmatch.fnmatchcase(define, pattern) for pattern in defines):
+            continue
+        for extender in block.blocks:
+            for setting in extender.blocks if extender.key == "extender" else []:
+                tokens = setting.value_tokens()
+                if setting.key == key and len(tokens) == 1 and tokens[0].text != str(value):
+                    tokens[0].text = str(value)
+                    changed += 1
+    return changed
+
+
+def _insert_after(parent: Block, anchor: Optional[Block], block: Block, indent: str):
+    # after anchor, or after the key and name of an empty parent
+    if anchor is not None:
+        position = parent.items.index(anchor) + 1
+    else:
+        position = 0
+        for i, item in enumerate(parent.items):
+            if isinstance(item, Block):
+                break
+            if not item.trivia:
+                position = i + 1
+    parent.items[position:position] = [Token(WS, indent), block.clone(parent)]
+
+
+def merge_supply(document: SdlDocument, source: SdlDocument, define: str = "*", item: str = "*",
+                 variant: str = "*", add_missing: bool = True) -> int:
+    # takes ammo, value and the supply zone settings of every matching entry from source;
+    # entries source has and document lacks are added to the same define
+    changed = 0
+    target = {(entry.define, entry.item, entry.variant): block for entry, block in supply_items(document)}
+    defines = dict(supply_defines(document))
+    for entry, source_block in supply_items(source):
+        if not _matches(entry, define, item, variant):
+            continue
+        block = target.get((entry.define, entry.item, entry.variant))
+        if block is None:
+            parent = defines.get(entry.define)
+            if add_missing and parent is not None:
+                items = [child for child in parent.blocks if child.key == "item"]
+                _insert_after(parent, items[-1] if items else None, source_block, "\n\t")
+                changed += 1
+            continue
+        entry_changed = False
+        for token, source_token in zip(_item_tokens(block)[2:], _item_tokens(source_block)[2:]):
+            if token is not None and source_token is not None and token.text != source_token.text:
+                token.text = source_token.text
+                entry_changed = True
+        changed += entry_changed
+
+    for (define_name, key), value in supply_settings(source).items():
+        if fnmatch.fnmatchcase(define_name, define) and item == "*" and variant == "*":
+            changed += set_supply_setting(document, key, value, [define_name])
+    document.reindex()
+    return changed
+
+
+def ballistics_curves(document: SdlDocument) -> Dict[str, Block]:
+    curves = {}
+    for ballistics in document.root.blocks:
+        if ballistics.key == "ballistics":
+            for block in ballistics.blocks:
+                if block.key == "curve" and _name(block):
+                    curves[_name(block)] = block
+    return curves
+
+
+def ballistics_table(document: SdlDocument) -> List[BallisticsPoint]:
+    points = []
+    for curve, block in ballistics_curves(document).items():
+        for point in block.blocks:
+            values = [token.text for token in point.items if isinstance(token, Token) and not token.trivia]
+            if len(values) == 2 and all(NUMBER_RE.match(value) for value in values):
+                points.append(BallisticsPoint(curve, float(values[0]), float(values[1])))
+    return points
+
+
+def merge_ballistics(document: SdlDocument, source: SdlDocument, curves: Optional[Sequence[str]] = None) -> int:
+    # replaces each curve (or those named) by the source's version; returns the number of curves changed
+    changed = 0
+    target = ballistics_curves(document)
+    for name, source_block in ballistics_curves(source).items():
+        if curves is not None and name not in curves:
+            continue
+        block = target.get(name)
+        if block is None:
+            parent = next((item for item in document.root.blocks if item.key == "ballistics"), None)
+            if parent is not None:
+                anchor = list(target.values())[-1] if target else None
+                _insert_after(parent, anchor, source_block, "\n\n\t")
+                changed += 1
+            continue
+        old: List[str] = []
+        new: List[str] = []
+        block.emit(old)
+        source_block.emit(new)
+        if old != new:
+            block.items = source_block.clone(block).items
+            for child in block.blocks:
+                child.parent = block
+            changed += 1
+    document.reindex()
+    return changed
@@ -0,0 +1,57 @@
+import os
+from typing import Any, Dict
+
+import pytest
+
+from configurator_core import ConfiguratorCore
+
+# A small install: resource/ with one difficulty file, bot.lua and the preparation times,
+# and two war periods in "configurator files" that differ in the difficulty file and bot.lua.
+
+DCG = """{Normal
+\t{StageCP 11 11 11 } 
+\t{Resources
+\t\t{Standard
+\t\t\t{Budget
+\t\t\t\t{Start 0:"5511"}
+\t\t\t\t{Limit 1001} ;// Max CP
+\t\t\t}
+\t\t}
+\t}
+}
+"""
+MID_DCG = DCG.replace("11 11 11", "12 12 12")
+BOT = "local waves = 3\n"
+MID_BOT = "local waves = 5\n"
+PREPARATION = "oneFlagOffsetTime = 540,\ntwoFlagOffsetTime = 729,\n"
+
+
+def write(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="latin-1", newline="") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def config(tmp_path) -> Dict[str, Any]:
+    base_dir = str(tmp_path)
+    write(os.path.join(base_dir, "resource", "set", "dynamic_campaign", "dcg_normal.inc"), DCG)
+    write(os.path.join(base_dir, "resource", "script", "bot.lua"), BOT)
+    write(os.path.join(base_dir, "resource", "conquest_configuration", "bot.conquest_configuration.lua"), PREPARATION)
+    write(os.path.join(base_dir, "configurator files", "normal", "dcg_normal.inc"), DCG)
+    write(os.path.join(base_dir, "configurator files", "normal", "bot.lua"), BOT)
+    write(os.path.join(base_dir, "configurator files", "midwar", "dcg_normal.inc"), MID_DCG)
+    write(os.path.join(base_dir, "configurator files", "midwar", "bot.lua"), MID_BOT)
+    return {
+        "base_dir": base_dir,
+        "backup_dir": os.path.join(base_dir, "backups"),
+        "periods": ["normal", "mid"],
+        "files_to_update": ["dcg_normal.inc", "bot.lua"],
+    }
+
+
+@pytest.fixture
+def core(config) -> ConfiguratorCore:
+    core = ConfiguratorCore(config)
+    yield core
+    core.close_bundles()
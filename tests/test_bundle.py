@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from bundle import build_bundle, open_bundle
+from configurator_core import ConfiguratorCore
+from tests.conftest import BOT, DCG, MID_BOT, MID_DCG
+from transaction import read_text, write_text
+
+
+def installed(core: ConfiguratorCore):
+    return read_text(core.difficulty_file("normal")), read_text(core.resource_target("bot.lua"))
+
+
+@pytest.mark.parametrize("options", [{}, {"bundle_compress": True}, {"period_bundles": False}])
+def test_period_switch_installs_the_period_files(config, options):
+    core = ConfiguratorCore({**config, **options})
+    stats = core.set_period("mid")
+    assert installed(core) == (MID_DCG, MID_BOT)
+    assert stats["copied_files"] == 2 and core.selected_period() == "mid"
+    assert os.path.exists(core.bundle_path("mid")) == options.get("period_bundles", True)
+
+    stats = core.set_period("mid")
+    assert stats["copied_files"] == 0 and stats["skipped_files"] == 2
+    core.set_period("normal")
+    assert installed(core) == (DCG, BOT)
+    core.close_bundles()
+
+
+def test_bundle_is_reused_until_a_source_changes(core):
+    core.set_period("mid")
+    built = os.stat(core.bundle_path("mid")).st_mtime_ns
+    core.set_period("normal")
+    core.set_period("mid")
+    assert os.stat(core.bundle_path("mid")).st_mtime_ns == built
+
+    source = os.path.join(core.period_root("mid"), "bot.lua")
+    write_text(source, "local waves = 7 -- edited\n")
+    core.set_period("normal")
+    core.set_period("mid")
+    assert read_text(core.resource_target("bot.lua")) == "local waves = 7 -- edited\n"
+    assert core.period_bundle("mid").read("bot.lua").tobytes() == b"local waves = 7 -- edited\n"
+
+
+def test_unreadable_bundle_is_rebuilt(core):
+    os.makedirs(os.path.dirname(core.bundle_path("mid")), exist_ok=True)
+    write_text(core.bundle_path("mid"), "not a bundle")
+    core.set_period("mid")
+    assert installed(core) == (MID_DCG, MID_BOT)
+
+
+def test_bundle_members_round_trip(tmp_path):
+    sources = {}
+    for name, text in (("a.txt", "alpha\n"), ("b.txt", ""), ("c.txt", "gamma" * 1000)):
+        sources[name] = str(tmp_path / name)
+        write_text(sources[name], text)
+    for compress in (False, True):
+        path = str(tmp_path / f"{compress}.bundle")
+        assert build_bundle(path, sources, compress)["members"] == 3
+        bundle = open_bundle(path)
+        assert {name: bundle.read(name).tobytes().decode() for name in sources} == \
+            {name: read_text(source) for name, source in sources.items()}
+        assert not bundle.stale(sources)
+        assert bundle.stale({**sources, "d.txt": sources["a.txt"]})
+        bundle.close()
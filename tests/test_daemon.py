@@ -0,0 +1,110 @@
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+from daemon import (INVALID_PARAMS, INVALID_REQUEST, METHOD_NOT_FOUND, OPERATION_FAILED, PARSE_ERROR, TOKEN_HEADER,
+                    ConfiguratorDaemon, call, create_server, read_token, token_file)
+from transaction import read_text
+
+
+def request(method, params=None) -> bytes:
+    return json.dumps({"jsonrpc": "2.0", "id": 7, "method": method, "params": params}).encode("utf-8")
+
+
+def error_code(daemon: ConfiguratorDaemon, body: bytes) -> int:
+    return daemon.handle(body)["error"]["code"]
+
+
+@pytest.fixture
+def daemon(core) -> ConfiguratorDaemon:
+    return ConfiguratorDaemon(core)
+
+
+@pytest.fixture
+def server(core):
+    server = create_server(core, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_result_keeps_the_request_id(daemon):
+    response = daemon.handle(request("set_player_army_size", {"start_budget": "0:600"}))
+    assert response["id"] == 7 and response["result"]["written"] == ["resource/set/dynamic_campaign/dcg_normal.inc"]
+    assert daemon.handle(request("read_settings", ["normal"]))["result"]["start_budget"] == "0:600"
+
+
+@pytest.mark.parametrize("body, code", [
+    (b"{not json", PARSE_ERROR),
+    (b"\xff\xfe", PARSE_ERROR),
+    (b"[1, 2]", INVALID_REQUEST),
+    (b'{"jsonrpc": "2.0", "id": 1}', INVALID_REQUEST),
+    (request("drop_tables"), METHOD_NOT_FOUND),
+    # parameters that don't fit the method
+    (request("set_points_to_win", {"amount": 1}), INVALID_PARAMS),
+    (request("set_points_to_win", {"value": 1, "key": "ai_army_size"}), INVALID_PARAMS),
+    (request("read_settings", ["normal", "hard"]), INVALID_PARAMS),
+    (request("status", "now"), INVALID_PARAMS),
+    # values the core rejects
+    (request("read_settings", {"difficulty": "easy"}), INVALID_PARAMS),
+    (request("set_period", {"period": "future"}), INVALID_PARAMS),
+    (request("set_ai_army_size", {"value": 42}), INVALID_PARAMS),
+    (request("set_preparation_times", {"value": {"oneFlagOffsetTime": "1 os.execute('x') --"}}), INVALID_PARAMS),
+    (request("set_preparation_times", {"value": {"sixFlagOffsetTime": 10}}), INVALID_PARAMS),
+    # a TypeError inside the operation is not a parameter error
+    (request("set_ai_army_size", {"value": [6]}), OPERATION_FAILED),
+])
+def test_error_mapping(daemon, body, code):
+    response = daemon.handle(body)
+    assert "result" not in response and response["error"]["code"] == code
+
+
+def test_failed_operation_changes_nothing(daemon, core):
+    file_path = core.difficulty_file("normal")
+    before = read_text(file_path)
+    assert error_code(daemon, request("apply", {"settings": {"start_budget": "0:600", "ai_army_size": 99}})) == \
+        INVALID_PARAMS
+    assert read_text(file_path) == before
+
+
+def test_preparation_times_are_written(daemon, core):
+    daemon.handle(request("set_preparation_times", {"value": {"oneFlagOffsetTime": 300}}))
+    assert read_text(core.preparation_file()).startswith("oneFlagOffsetTime = 300,\ntwoFlagOffsetTime = 729,")
+
+
+def test_undo_without_history_returns_null(daemon):
+    assert daemon.handle(request("undo"))["result"] is None
+
+
+def test_requests_need_the_token_and_json(server, core):
+    port = server.server_address[1]
+    token = read_token(token_file(core.config))
+    assert call("ping", port=port, token=token)["pid"] == os.getpid()
+
+    for headers, status in (({"Content-Type": "application/json"}, 403),
+                            ({"Content-Type": "application/json", TOKEN_HEADER: "guess"}, 403),
+                            ({"Content-Type": "text/plain", TOKEN_HEADER: token}, 415)):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("POST", "/", request("ping"), headers)
+        assert connection.getresponse().status == status
+        connection.close()
+    with pytest.raises(Exception, match="403"):
+        call("ping", port=port, token="guess")
+
+
+def test_shutdown_answers_before_stopping(core):
+    server = create_server(core, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    token = read_token(token_file(core.config))
+    assert call("shutdown", port=server.server_address[1], token=token) is None
+    thread.join(5)
+    assert not thread.is_alive()
+    server.server_close()
+    assert not os.path.exists(token_file(core.config))
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+from configurator_core import ConfiguratorCore
+from history import apply_patches, diff_patches
+from tests.conftest import BOT, DCG, MID_BOT, MID_DCG
+from transaction import Transaction, read_text, write_text
+
+
+def edit_budget(core: ConfiguratorCore, budget: str):
+    transaction = Transaction()
+    core.stage_player_army_size(transaction, core.difficulty_file("normal"), "11 11 11", budget)
+    return core.commit(transaction)
+
+
+@pytest.mark.parametrize("old, new", [
+    ("a\nb\nc\n", "a\nB\nc\n"),
+    ("a\nb\nc\n", "a\nc\n"),
+    ("a\nc", "a\nb\nb2\nc\nd"),
+    ("", "new file\n"),
+    ("x\n" * 50, "x\n" * 20 + "y\n" + "x\n" * 40),
+])
+def test_patches_turn_old_into_new_and_back(old, new):
+    patches = diff_patches(old, new)
+    assert apply_patches(old, patches) == new
+    assert apply_patches(new, patches, reverse=True) == old
+
+
+def test_random_edits_round_trip():
+    rng = random.Random(7)
+    lines = [f"{{Value{i} {i}}}\n" for i in range(200)]
+    for _ in range(50):
+        new = list(lines)
+        for _ in range(rng.randint(1, 5)):
+            index = rng.randrange(len(new))
+            choice = rng.random()
+            if choice < 0.4:
+                new[index] = new[index].replace("}", " 1}")
+            elif choice < 0.7:
+                del new[index]
+            else:
+                new.insert(index, "{Added}\n")
+        old_text, new_text = "".join(lines), "".join(new)
+        patches = diff_patches(old_text, new_text)
+        assert apply_patches(old_text, patches) == new_text
+        assert apply_patches(new_text, patches, reverse=True) == old_text
+
+
+def test_undo_and_redo_restore_the_exact_bytes(core):
+    file_path = core.difficulty_file("normal")
+    edit_budget(core, "0:600")
+    edit_budget(core, "0:700")
+    assert '{Start 0:"700"}' in read_text(file_path)
+
+    assert core.undo().label.startswith("StageCP")
+    assert '{Start 0:"600"}' in read_text(file_path)
+    core.undo()
+    assert read_text(file_path) == DCG
+    assert core.undo() is None
+
+    core.redo()
+    assert '{Start 0:"600"}' in read_text(file_path)
+    # a new edit drops what could still be redone
+    edit_budget(core, "0:800")
+    assert core.redo() is None
+    assert [entry.label.split(", ")[-1] for entry in core.history.undo_stack] == ["Start 0:600", "Start 0:800"]
+
+
+def test_period_switch_is_undone_as_one_entry(core):
+    core.set_period("mid")
+    entry = core.undo()
+    assert entry.label == "mid war period" and len(entry.files) == 2
+    assert read_text(core.difficulty_file("normal")) == DCG
+    assert read_text(core.resource_target("bot.lua")) == BOT
+    core.redo()
+    assert read_text(core.resource_target("bot.lua")) == MID_BOT
+    assert read_text(core.difficulty_file("normal")) == MID_DCG
+
+
+def test_history_survives_a_restart(config, core):
+    edit_budget(core, "0:600")
+    edit_budget(core, "0:700")
+    core.undo()
+
+    restarted = ConfiguratorCore(config)
+    assert len(restarted.history.undo_stack) == 1 and len(restarted.history.redo_stack) == 1
+    restarted.redo()
+    assert '{Start 0:"700"}' in read_text(restarted.difficulty_file("normal"))
+    restarted.undo()
+    restarted.undo()
+    assert read_text(restarted.difficulty_file("normal")) == DCG
+
+
+def test_undo_refuses_a_file_changed_elsewhere(core):
+    file_path = core.difficulty_file("normal")
+    edit_budget(core, "0:600")
+    changed = read_text(file_path).replace("1001", "1500")
+    write_text(file_path, changed)
+    core.models.invalidate(file_path)
+    with pytest.raises(Exception, match="was changed after"):
+        core.undo()
+    assert read_text(file_path) == changed
+    assert len(core.history.undo_stack) == 1
+
+
+def test_history_is_compacted_to_the_kept_entries(config):
+    core = ConfiguratorCore({**config, "history_keep": 3})
+    for budget in range(10):
+        edit_budget(core, f"0:{budget}")
+    core.undo()
+    restarted = ConfiguratorCore({**config, "history_keep": 3})
+    assert len(restarted.history.undo_stack) == 2 and len(restarted.history.redo_stack) == 1
+    with open(restarted.history.history_path) as f:
+        assert len(f.readlines()) <= 2 * 3 + 1
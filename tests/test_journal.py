@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from configurator_core import ConfiguratorCore
+from journal import Journal
+from transaction import Transaction, read_text, write_text
+
+
+def crash_at(monkeypatch, call: int):
+    # the process dies on the given os.replace of the journal: no cleanup runs
+    monkeypatch.setattr(Journal, "_undo", lambda self, record, committed: None)
+    monkeypatch.setattr(Journal, "_discard", lambda self, record: None)
+    replace = os.replace
+    calls = []
+
+    def dying_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == call:
+            raise SystemExit("crash")
+        replace(src, dst)
+
+    monkeypatch.setattr("journal.os.replace", dying_replace)
+
+
+def writer(text: str):
+    return lambda tmp_path: write_text(tmp_path, text)
+
+
+def side_files(directory: str):
+    return [name for name in os.listdir(directory) if name.startswith(".")]
+
+
+def test_transaction_writes_each_file_once_with_all_edits(core):
+    dcg, bot = core.difficulty_file("normal"), core.resource_target("bot.lua")
+    transaction = Transaction()
+    transaction.edit_document(dcg, lambda document: document.set_values("Normal/StageCP", ["9", "9"]))
+    transaction.edit_text(dcg, lambda text: text.replace("1001", "2002"))
+    transaction.edit_text(bot, lambda text: text.replace("3", "4"))
+    assert len(transaction) == 3
+    assert sorted(core.commit(transaction)) == sorted([dcg, bot])
+    assert "{StageCP 9 9 }" in read_text(dcg) and "{Limit 2002}" in read_text(dcg)
+    assert read_text(bot) == "local waves = 4\n"
+    assert len(transaction) == 0
+
+
+def test_failing_edit_leaves_every_file_untouched(core):
+    dcg, bot = core.difficulty_file("normal"), core.resource_target("bot.lua")
+    before = read_text(dcg), read_text(bot)
+    transaction = Transaction()
+    transaction.edit_text(bot, lambda text: text.replace("3", "4"))
+    transaction.edit_document(dcg, lambda document: document.set_value("Normal/Missing", "1"))
+    with pytest.raises(KeyError):
+        core.commit(transaction)
+    assert (read_text(dcg), read_text(bot)) == before
+
+
+def test_writer_error_discards_the_staged_files(tmp_path):
+    journal = Journal(str(tmp_path / "journal"))
+    first, second = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    write_text(first, "a")
+    write_text(second, "b")
+
+    def broken(tmp_path: str):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        journal.run({first: writer("A"), second: broken})
+    assert (read_text(first), read_text(second)) == ("a", "b")
+    assert side_files(str(tmp_path)) == [] and os.listdir(tmp_path / "journal") == []
+
+
+def test_crash_while_committing_is_rolled_forward(tmp_path, monkeypatch):
+    journal_dir = str(tmp_path / "journal")
+    first, second, created = str(tmp_path / "a.txt"), str(tmp_path / "b.txt"), str(tmp_path / "c.txt")
+    write_text(first, "a")
+    write_text(second, "b")
+    # replaces 1 and 2 write the journal record ("staging", then "committing"), 3 on the targets
+    crash_at(monkeypatch, 4)
+    with pytest.raises(SystemExit):
+        Journal(journal_dir).run({first: writer("A"), second: writer("B"), created: writer("C")})
+    assert (read_text(first), read_text(second)) == ("A", "b")
+    monkeypatch.undo()
+
+    assert sorted(Journal(journal_dir).recover()) == sorted([first, second, created])
+    assert (read_text(first), read_text(second), read_text(created)) == ("A", "B", "C")
+    assert side_files(str(tmp_path)) == [] and os.listdir(journal_dir) == []
+
+
+def test_crash_while_staging_is_discarded(tmp_path, monkeypatch):
+    journal_dir = str(tmp_path / "journal")
+    first, second = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    write_text(first, "a")
+    write_text(second, "b")
+    # dies writing the "committing" record, the "staging" one stays
+    crash_at(monkeypatch, 2)
+    with pytest.raises(SystemExit):
+        Journal(journal_dir).run({first: writer("A"), second: writer("B")})
+    monkeypatch.undo()
+    assert side_files(str(tmp_path))
+
+    assert Journal(journal_dir).recover() == []
+    assert (read_text(first), read_text(second)) == ("a", "b")
+    assert side_files(str(tmp_path)) == [] and os.listdir(journal_dir) == []
+
+
+def test_core_recovers_an_interrupted_commit_on_start(config, core, monkeypatch):
+    dcg, bot = core.difficulty_file("normal"), core.resource_target("bot.lua")
+    transaction = Transaction()
+    transaction.edit_text(dcg, lambda text: text.replace("1001", "2002"))
+    transaction.edit_text(bot, lambda text: text.replace("3", "4"))
+    crash_at(monkeypatch, 4)
+    with pytest.raises(SystemExit):
+        core.commit(transaction)
+    monkeypatch.undo()
+    assert "{Limit 2002}" in read_text(dcg) and read_text(bot) == "local waves = 3\n"
+
+    ConfiguratorCore(config)
+    assert "{Limit 2002}" in read_text(dcg) and read_text(bot) == "local waves = 4\n"
@@ -0,0 +1,69 @@
+import pytest
+
+from sdl import SdlDocument, SdlSyntaxError
+from transaction import Transaction, read_text
+
+TEXT = """;// header comment
+{Normal
+\t{StageCP 11 11 11 } 
+\t{Label "two words"}\t;// trailing comment
+\t{Empty}
+\t{Nested {Inner (include "x.inc") 1.5}}
+}
+"""
+
+
+def test_round_trip_is_byte_identical():
+    assert SdlDocument.parse(TEXT).dumps() == TEXT
+
+
+def test_set_value_changes_only_that_token():
+    document = SdlDocument.parse(TEXT)
+    document.set_value("Normal/Label", "three words here")
+    document.set_values("Normal/StageCP", ["12", "13", "14"])
+    assert document.dumps() == TEXT.replace('"two words"', '"three words here"').replace("11 11 11", "12 13 14")
+    assert SdlDocument.parse(document.dumps()).get_values("Normal/StageCP") == ["12", "13", "14"]
+
+
+def test_set_values_keeps_token_kinds_when_the_count_changes():
+    document = SdlDocument.parse(TEXT)
+    document.set_values("Normal/StageCP", ["11", "12"])
+    assert "{StageCP 11 12 }" in document.dumps()
+
+    document = SdlDocument.parse('{Start 0:"5511"}')
+    document.set_values("Start", ["0:", "600", "700"])
+    assert document.dumps() == '{Start 0:"600" "700"}'
+
+
+def test_set_values_keeps_nested_blocks_and_comments():
+    for values, expected in ((["7"], '{X 7 {Y 5} ;c\n}'), (["7", "8", "9"], '{X 7 {Y 5} 8 9 ;c\n}'),
+                             ([], '{X {Y 5} ;c\n}')):
+        document = SdlDocument.parse('{X 1 {Y 5} 2 ;c\n}')
+        document.set_values("X", values)
+        assert document.dumps() == expected
+        assert document.get_values("X/Y") == ["5"]
+    document = SdlDocument.parse('{X 1 {Y 5} 2}')
+    document.set_value("X", "7")
+    assert document.dumps() == '{X 7 {Y 5}}'
+
+
+def test_quoted_value_cannot_contain_a_quote():
+    document = SdlDocument.parse(TEXT)
+    with pytest.raises(ValueError):
+        document.set_value("Normal/Label", 'a "b"')
+
+
+@pytest.mark.parametrize("text", ["{Normal {StageCP 1}", "{Normal}}", '{Label "open}'])
+def test_malformed_text_raises(text):
+    with pytest.raises(SdlSyntaxError):
+        SdlDocument.parse(text)
+
+
+def test_start_budget_round_trips_through_the_core(core):
+    file_path = core.difficulty_file("normal")
+    assert core.read_player_army_size(file_path) == ("11 11 11", "0:5511")
+    transaction = Transaction()
+    core.stage_player_army_size(transaction, file_path, "11 12", "0:600")
+    core.commit(transaction)
+    assert core.read_player_army_size(file_path) == ("11 12", "0:600")
+    assert '{Start 0:"600"}' in read_text(file_path)
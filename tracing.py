@@ -0,0 +1,158 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+# Timing spans around file reads, parses, regex substitutions, writes, copies, directory
+# scans and dialogs. Spans are kept in a fixed-size ring buffer in memory (the oldest are
+# dropped first), so tracing can stay on all the time; recording one costs two
+# perf_counter_ns calls and a deque append.
+#
+#   with span("read", path=file_path) as s:
+#       content = file.read()
+#       s.size = len(content)
+#
+# export() writes the buffer in the Chrome trace event format (open it in
+# chrome://tracing or https://ui.perfetto.dev); summary_table() totals the spans by name.
+
+DEFAULT_CAPACITY = 20000
+
+
+class SpanRecord(NamedTuple):
+    category: str
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread: str
+    path: str
+    size: int
+
+
+class _Span:
+    __slots__ = ("tracer", "category", "name", "path", "size", "start")
+
+    def __init__(self, tracer: "Tracer", category: str, name: str, path: str, size: int):
+        self.tracer = tracer
+        self.category = category
+        self.name = name
+        self.path = path
+        self.size = size
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.tracer.record(self.category, self.name, self.start, self.path, self.size)
+        return False
+
+
+class _NullSpan:
+    # handed out while tracing is off; attributes set on it are ignored
+    path = ""
+    size = 0
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def __setattr__(self, name: str, value: Any):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.spans: Deque[SpanRecord] = deque(maxlen=capacity)
+        self.enabled = True
+        self.recorded = 0
+        self.origin = time.perf_counter_ns()
+
+    def span(self, category: str, name: str = "", path: str = "", size: int = 0):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, category, name or category, path, size)
+
+    def record(self, category: str, name: str, start_ns: int, path: str = "", size: int = 0):
+        # for spans that start and end in different callbacks; start_ns is a perf_counter_ns value
+        if self.enabled:
+            self.spans.append(SpanRecord(category, name, start_ns, time.perf_counter_ns() - start_ns,
+                                         threading.current_thread().name, path, size))
+            self.recorded += 1
+
+    def traced(self, category: str, name: Optional[str] = None) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(category, name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @property
+    def dropped(self) -> int:
+        return self.recorded - len(self.spans)
+
+    def records(self) -> List[SpanRecord]:
+        return list(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+        self.recorded = 0
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        threads: Dict[str, int] = {}
+        events = []
+        for record in self.records():
+            tid = threads.setdefault(record.thread, len(threads) + 1)
+            args: Dict[str, Any] = {}
+            if record.path:
+                args["path"] = record.path
+            if record.size:
+                args["bytes"] = record.size
+            events.append({"name": record.name, "cat": record.category, "ph": "X", "pid": 1, "tid": tid,
+                           "ts": (record.start_ns - self.origin) / 1000, "dur": record.duration_ns / 1000,
+                           "args": args})
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                   for name, tid in threads.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"dropped_spans": self.dropped}}
+
+    def export(self, file_path: str):
+        with open(file_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        # per (category, name): count, total and slowest time, bytes and the slowest span's path
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for record in self.records():
+            group = groups.setdefault((record.category, record.name), {
+                "category": record.category, "name": record.name, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "bytes": 0, "slowest": ""})
+            milliseconds = record.duration_ns / 1e6
+            group["count"] += 1
+            group["total_ms"] += milliseconds
+            group["bytes"] += record.size
+            if milliseconds >= group["max_ms"]:
+                group["max_ms"] = milliseconds
+                group["slowest"] = record.path
+        return sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)
+
+    def summary_table(self, limit: int = 30) -> str:
+        lines = [f"{'category':<9} {'name':<28} {'count':>6} {'total ms':>10} {'max ms':>9} {'bytes':>11}  slowest"]
+        for group in self.summary()[:limit]:
+            lines.append(f"{group['category']:<9} {group['name'][:28]:<28} {group['count']:>6} "
+                         f"{group['total_ms']:>10.2f} {group['max_ms']:>9.2f} {group['bytes']:>11}  {group['slowest']}")
+        if self.dropped:
+            lines.append(f"({self.dropped} older span(s) dropped from the buffer)")
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
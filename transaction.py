@@ -0,0 +1,106 @@
+import logging
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from journal import Journal
+from model_cache import ModelCache
+from sdl import ENCODING, SdlDocument
+from tracing import span
+
+# Edits are grouped per target file: each file is read once, parsed at most once,
+# and written once. The writes go through a Journal, so either every changed file of
+# the transaction is replaced or none is.
+
+SDL_EDIT = "sdl"
+TEXT_EDIT = "text"
+
+
+class Edit(NamedTuple):
+    kind: str
+    func: Callable
+    description: str
+
+
+def read_text(file_path: str) -> str:
+    with span("read", path=file_path) as timing, open(file_path, "r", encoding=ENCODING, newline="") as file:
+        content = file.read()
+        timing.size = len(content)
+        return content
+
+
+def write_text(file_path: str, content: str):
+    with span("write", path=file_path, size=len(content)), \
+            open(file_path, "w", encoding=ENCODING, newline="") as file:
+        file.write(content)
+
+
+class Transaction:
+    def __init__(self):
+        self.edits: Dict[str, List[Edit]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(edits) for edits in self.edits.values())
+
+    @property
+    def files(self) -> List[str]:
+        return list(self.edits)
+
+    def edit_document(self, file_path: str, func: Callable[[SdlDocument], None], description: str = ""):
+        self.edits.setdefault(os.path.normpath(file_path), []).append(Edit(SDL_EDIT, func, description))
+
+    def edit_text(self, file_path: str, func: Callable[[str], str], description: str = ""):
+        self.edits.setdefault(os.path.normpath(file_path), []).append(Edit(TEXT_EDIT, func, description))
+
+    def merge(self, other: "Transaction"):
+        for file_path, edits in other.edits.items():
+            self.edits.setdefault(file_path, []).extend(edits)
+
+    def discard(self):
+        self.edits.clear()
+
+    def descriptions(self) -> List[str]:
+        return [edit.description for edits in self.edits.values() for edit in edits if edit.description]
+
+    @staticmethod
+    def render(original: str, edits: List[Edit], file_path: str = "") -> str:
+        text = original
+        document = None
+        for edit in edits:
+            if edit.kind == SDL_EDIT:
+                if document is None:
+                    with span("parse", path=file_path, size=len(text)):
+                        document = SdlDocument.parse(text)
+                edit.func(document)
+            else:
+                if document is not None:
+                    text = document.dumps()
+                    document = None
+                text = edit.func(text)
+        return document.dumps() if document is not None else text
+
+    def commit(self, journal: Optional[Journal] = None, progress: Optional[Callable[[int, int, str], None]] = None,
+               cache: Optional[ModelCache] = None) -> List[str]:
+        # with a cache, unchanged originals come from memory and the written text is stored back
+        contents = {}
+        for file_path, edits in self.edits.items():
+            original = cache.text(file_path) if cache else read_text(file_path)
+            with span("render", path=file_path, size=len(original)):
+                content = self.render(original, edits, file_path)
+            if content != original:
+                contents[file_path] = content
+
+        # progress is reported as each file is staged; a callback that raises aborts the commit
+        def writer(file_path: str, index: int):
+            def write(tmp_path: str):
+                write_text(tmp_path, contents[file_path])
+                if progress:
+                    progress(index + 1, len(contents), os.path.basename(file_path))
+            return write
+
+        (journal or Journal()).run({file_path: writer(file_path, i) for i, file_path in enumerate(contents)})
+        for file_path in contents:
+            if cache:
+                cache.store(file_path, contents[file_path])
+            logging.info(f"Committed {len(self.edits[file_path])} edit(s) to {file_path}")
+        self.discard()
+        return list(contents)
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from research import ResearchTree, load_research
+from roster import parse_roster
+from sdl import ENCODING, SdlDocument
+
+# Cross-file checks the game only reports by misbehaving:
+#
+#   reference   every research entry and requirement is a research entry or a unit
+#               (name or vehicle) of the same side's units_*.set of that period
+#   requires    requires chains resolve: no cycles, no entry defined twice
+#   stage       roster min_stage/max_stage are ordered and lie within the StageCP
+#               entries of each difficulty file of that period
+#
+# Checks run per war period (and for the installed files) as independent units, one
+# process per period. A unit's result is cached under the digests of the files it reads,
+# so after an edit only the units that read the edited file run again.
+
+ERROR = "error"
+WARNING = "warning"
+CHECKS_VERSION = "1"
+RESEARCH_FILE_RE = re.compile(r"unit_research_(\w+)\.set")
+ROSTER_FILE_RE = re.compile(r"units_(\w+)\.set")
+
+
+class Violation(NamedTuple):
+    severity: str
+    period: str
+    file: str
+    check: str
+    subject: str
+    message: str
+
+
+class CheckUnit(NamedTuple):
+    kind: str  # "research" or "stages"
+    period: str
+    subject: str  # research faction or roster side
+    files: Tuple[str, ...]  # research: root file, its includes, rosters; stages: rosters, then difficulty files
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.period}:{self.subject}"
+
+
+def side_of(faction: str) -> str:
+    # ger2 is the second roster/research file of side ger
+    return faction.rstrip("0123456789")
+
+
+def _unit_name(name: str) -> str:
+    return name.split("(", 1)[0]
+
+
+def _read(file_path: str) -> str:
+    with open(file_path, "r", encoding=ENCODING, newline="") as file:
+        return file.read()
+
+
+def _check_research(unit: CheckUnit, rosters: Dict[str, list]) -> List[Violation]:
+    root = unit.files[0]
+    entries, _ = load_research(root)
+    known = {value for path in unit.files if path in rosters for entry in rosters[path]
+             for value in (entry["name"], entry["vehicle"]) if value}
+    tree = ResearchTree(entries, known)
+    violations = [Violation(ERROR, unit.period, root, "requires", name, f"requires cycle through {name}")
+                  for name in tree.cyclic]
+    violations += [Violation(ERROR, unit.period, tree.entries[name].file, "requires", name,
+                             f"{name} is defined more than once") for name in sorted(set(tree.duplicates))]
+    for name in tree.dangling:
+        users = sorted(entry.name for entry in tree.entries.values() if name in entry.requires)
+        file = tree.entries[users[0]].file if users else root
+        violations.append(Violation(ERROR, unit.period, file, "reference", name,
+                                    f"{name}, required by {', '.join(users)}, is neither researched nor a unit of "
+                                    f"units_{unit.subject}*.set"))
+    for name, entry in tree.entries.items():
+        if not entry.tech and _unit_name(name) not in known:
+            violations.append(Violation(ERROR, unit.period, entry.file, "reference", name,
+                                        f"research entry {name} is not a unit of units_{unit.subject}*.set"))
+    return violations
+
+
+def _check_stages(unit: CheckUnit, rosters: Dict[str, list]) -> List[Violation]:
+    violations = []
+    stage_counts = {}
+    for path in unit.files:
+        if path in rosters:
+            continue
+        document = SdlDocument.parse(_read(path))
+        stage_cp = document.find(f"{document.top_key}/StageCP")
+        if stage_cp is not None:
+            stage_counts[os.path.basename(path)] = len(stage_cp.values)
+    limit = min(stage_counts.values(), default=None)
+
+    for path in unit.files:
+        for entry in rosters.get(path, []):
+            low, high = entry["min_stage"], entry["max_stage"]
+            if low is None or (low == 0 and high == 0):
+                continue  # no stage limits, or a unit that is never sold
+            name = entry["name"] or entry["template"] or "?"
+            where = f"line {entry['line']}: {name}"
+            if low < 1 or (high is not None and high < low):
+                violations.append(Violation(ERROR, unit.period, path, "stage", name,
+                                            f"{where} has min_stage {low} and max_stage {high}"))
+            elif limit is not None and low > limit:
+                files = ", ".join(sorted(file for file, count in stage_counts.items() if low > count))
+                violations.append(Violation(WARNING, unit.period, path, "stage", name,
+                                            f"{where} unlocks at stage {low}, after the {limit} StageCP entries "
+                                            f"of {files}"))
+    return violations
+
+
+def run_checks(units: Sequence[CheckUnit]) -> List[Tuple[str, List[Violation]]]:
+    # runs in a worker process; each roster is parsed once for all units of the batch
+    rosters: Dict[str, list] = {}
+    results = []
+    for unit in units:
+        for path in unit.files:
+            if ROSTER_FILE_RE.fullmatch(os.path.basename(path)) and path not in rosters:
+                rosters[path] = parse_roster(_read(path))
+        try:
+            violations = _check_research(unit, rosters) if unit.kind == "research" else _check_stages(unit, rosters)
+        except Exception as e:
+            violations = [Violation(ERROR, unit.period, unit.files[0], unit.kind, unit.subject,
+                                    f"could not be checked: {str(e)}")]
+        results.append((unit.key, violations))
+    return results
+
+
+def build_units(period: str, files: Dict[str, str], difficulty_files: Sequence[str]) -> List[CheckUnit]:
+    # files maps the file names of files_to_update to their paths in the period (or installed) folder
+    rosters: Dict[str, List[str]] = {}
+    research: Dict[str, str] = {}
+    for name, path in sorted(files.items()):
+        roster = ROSTER_FILE_RE.fullmatch(name)
+        if roster:
+            rosters.setdefault(side_of(roster.group(1)), []).append(path)
+        match = RESEARCH_FILE_RE.fullmatch(name)
+        if match:
+            research[match.group(1)] = path
+
+    # only files no other research file includes are trees of their own (ger includes ger2)
+    included = set()
+    for path in research.values():
+        included.update(include for include in re.findall(r'\(include\s+"([^"]+)"\)', _read(path)))
+    units = []
+    for faction, path in sorted(research.items()):
+        if os.path.basename(path) in included:
+            continue
+        side = side_of(faction)
+        same_side = [other for other_faction, other in sorted(research.items())
+                     if side_of(other_faction) == side and other != path]
+        units.append(CheckUnit("research", period, side, tuple([path] + same_side + rosters.get(side, []))))
+    for side, paths in sorted(rosters.items()):
+        units.append(CheckUnit("stages", period, side, tuple(paths) + tuple(difficulty_files)))
+    return units
+
+
+class ValidationCache:
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        # unit key -> {"digest": ..., "violations": [...]}
+        self.entries: Dict[str, Dict] = {}
+        self.dirty = False
+        if cache_path:
+            try:
+                with open(cache_path, "r") as f:
+                    self.entries = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.entries = {}
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.entries, f)
+            self.dirty = False
+        except OSError as e:
+            logging.warning(f"Could not save validation cache {self.cache_path}: {str(e)}")
+
+    def get(self, key: str, digest: str) -> Optional[List[Violation]]:
+        entry = self.entries.get(key)
+        if entry is None or entry["digest"] != digest:
+            return None
+        return [Violation(*violation) for violation in entry["violations"]]
+
+    def put(self, key: str, digest: str, violations: List[Violation]):
+        self.entries[key] = {"digest": digest, "violations": [list(violation) for violation in violations]}
+        self.dirty = True
+
+
+def unit_digest(unit: CheckUnit, file_digests: Sequence[str]) -> str:
+    return hashlib.sha1("|".join([CHECKS_VERSION, *unit.files, *file_digests]).encode("utf-8")).hexdigest()
+
+
+def validate(units: Sequence[CheckUnit], digests: Dict[str, str], cache: ValidationCache,
+             workers: Optional[int] = None) -> Tuple[List[Violation], int]:
+    # returns the violations of every unit and the number of units that had to run
+    keys = {unit.key: unit_digest(unit, [digests[path] for path in unit.files]) for unit in units}
+    results: Dict[str, List[Violation]] = {}
+    pending: Dict[str, List[CheckUnit]] = {}
+    for unit in units:
+        cached = cache.get(unit.key, keys[unit.key])
+        if cached is None:
+            pending.setdefault(unit.period, []).append(unit)
+        else:
+            results[unit.key] = cached
+
+    workers = min(len(pending), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(run_checks, pending.values()))
+    else:
+        batches = [run_checks(batch) for batch in pending.values()]
+    for batch in batches:
+        for key, violations in batch:
+            cache.put(key, keys[key], violations)
+            results[key] = violations
+    cache.save()
+    return [violation for unit in units for violation in results[unit.key]], sum(map(len, pending.values()))
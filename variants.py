@@ -0,0 +1,180 @@
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from configurator_core import ConfiguratorCore
+from transaction import Transaction
+
+# Builds many variants of the same setup for balance A/B tests. Every combination of a
+# parameter grid becomes its own output tree <out>/<variant>/resource/, written by a
+# separate process:
+#
+#   {"period": "mid",
+#    "base": {"difficulties": ["hard"]},
+#    "grid": {"ai_army_size": [2, 3, 4],
+#             "preparation_times.oneFlagOffsetTime": [420, 540],
+#             "scale.Bots/CP/Base": [0.9, 1.1]}}
+#
+# Grid keys are settings profile keys; "a.b" sets key b of the nested setting a, and
+# scale.<pattern> multiplies the matching numeric dcg values (see numeric_matrix.py).
+# Files a variant leaves unchanged are hardlinks to resource/ and to the period folder;
+# edited files are replaced by the journal, which never writes through a link.
+# <out>/manifest.json maps each variant to its parameters.
+
+MANIFEST_NAME = "manifest.json"
+
+
+class VariantResult(NamedTuple):
+    variant: str
+    directory: str
+    parameters: Dict[str, Any]
+    ok: bool
+    error: str
+    files_written: List[str]
+    linked_files: int
+    seconds: float
+
+
+def expand_grid(base: Dict[str, Any], grid: Dict[str, List[Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    # (parameters, profile) for every combination of the grid values, in grid order
+    keys = list(grid)
+    variants = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        parameters = dict(zip(keys, values))
+        profile = json.loads(json.dumps(base))
+        for key, value in parameters.items():
+            setting, _, nested = key.partition(".")
+            if nested:
+                profile.setdefault(setting, {})[nested] = value
+            else:
+                profile[setting] = value
+        variants.append((parameters, profile))
+    return variants
+
+
+def _link(src: str, dst: str):
+    # hardlink where the filesystem allows it, a copy otherwise
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _shared_files(directory: str) -> int:
+    return sum(1 for root, _, files in os.walk(directory) for file in files
+               if os.stat(os.path.join(root, file)).st_nlink > 1)
+
+
+def variant_config(config: Dict[str, Any], variant_dir: str, state_dir: str) -> Dict[str, Any]:
+    # resource/ of the variant, "configurator files" of the source tree, caches outside the variant
+    variant = dict(config)
+    variant["base_dir"] = variant_dir
+    variant["source_dir"] = config.get("source_dir", config['base_dir'])
+    variant["backup_dir"] = os.path.join(state_dir, "backups")
+    variant["index_file"] = os.path.join(state_dir, "file_index.json")
+    variant["hash_cache_file"] = os.path.join(state_dir, "hash_cache.json")
+    variant["journal_dir"] = os.path.join(state_dir, "journal")
+    variant["roster_index_file"] = os.path.join(state_dir, "roster_index.sqlite")
+    variant["history_file"] = os.path.join(state_dir, "history.jsonl")
+    variant["validation_cache_file"] = os.path.join(state_dir, "validation_cache.json")
+    variant["bundle_dir"] = os.path.join(state_dir, "bundles")
+    variant["watch_manifest_file"] = os.path.join(state_dir, "watch_manifest.json")
+    return variant
+
+
+def build_variant(config: Dict[str, Any], period: Optional[str], variant: str, parameters: Dict[str, Any],
+                  profile: Dict[str, Any], out_dir: str) -> VariantResult:
+    # runs in a worker process; the variant directory is replaced if it exists
+    start = time.perf_counter()
+    variant_dir = os.path.join(out_dir, variant)
+    try:
+        if os.path.exists(variant_dir):
+            shutil.rmtree(variant_dir)
+        resource_root = os.path.join(config['base_dir'], "resource")
+        for directory, _, files in os.walk(resource_root):
+            for file in files:
+                src = os.path.join(directory, file)
+                _link(src, os.path.join(variant_dir, "resource", os.path.relpath(src, resource_root)))
+
+        with tempfile.TemporaryDirectory(prefix="ce-variant-") as state_dir:
+            core = ConfiguratorCore(variant_config(config, variant_dir, state_dir))
+            if period:
+                # the files of the period folder, placed where update_files would copy them
+                core.file_index.refresh(core.period_root(period))
+                core.file_index.refresh(core.resource_root())
+                for file in config['files_to_update']:
+                    src = core.file_index.locate(core.period_root(period), file)
+                    if src is not None:
+                        _link(src, core.resource_target(file))
+                core.file_index.refresh(core.resource_root())
+
+            transaction = Transaction()
+            core.stage_profile(transaction, {key: value for key, value in profile.items()
+                                             if key not in ("period", "scale")})
+            written = core.commit(transaction)
+            if profile.get("scale"):
+                difficulties = profile.get("difficulties") or [profile.get("difficulty", "normal")]
+                matrix = core.numeric_matrix(["installed"])
+                for pattern, factor in profile["scale"].items():
+                    matrix.apply(matrix.select(pattern, ["installed"], difficulties), float(factor))
+                transaction = Transaction()
+                core.stage_numeric_matrix(transaction, matrix)
+                written += [path for path in core.commit(transaction) if path not in written]
+        return VariantResult(variant, variant_dir, parameters, True, "",
+                             [os.path.relpath(path, variant_dir) for path in written], _shared_files(variant_dir),
+                             time.perf_counter() - start)
+    except Exception as e:
+        logging.error(f"Variant {variant} failed: {str(e)}")
+        return VariantResult(variant, variant_dir, parameters, False, str(e), [], 0, time.perf_counter() - start)
+
+
+def generate_variants(config: Dict[str, Any], out_dir: str, grid: Dict[str, List[Any]],
+                      base: Optional[Dict[str, Any]] = None, period: Optional[str] = None,
+                      workers: Optional[int] = None) -> Dict[str, Any]:
+    base = base or {}
+    period = period or base.get("period")
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    variants = expand_grid(base, grid)
+    width = len(str(len(variants)))
+    start = time.perf_counter()
+    results: List[VariantResult] = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(build_variant, config, period, f"v{i:0{width}d}", parameters, profile, out_dir)
+                   for i, (parameters, profile) in enumerate(variants, 1)]
+        for future in as_completed(futures):
+            results.append(future.result())
+    wall_time = time.perf_counter() - start
+
+    results.sort(key=lambda result: result.variant)
+    manifest = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "period": period,
+        "base": base,
+        "grid": grid,
+        "variants": [{"variant": result.variant, "directory": os.path.relpath(result.directory, out_dir),
+                      "parameters": result.parameters, "ok": result.ok, "error": result.error,
+                      "files_written": result.files_written, "linked_files": result.linked_files}
+                     for result in results],
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    succeeded = sum(1 for result in results if result.ok)
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "wall_seconds": wall_time,
+        "variants_per_second": len(results) / wall_time if wall_time else 0.0,
+        "manifest": os.path.join(out_dir, MANIFEST_NAME),
+    }
@@ -0,0 +1,254 @@
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+from configurator_core import ConfiguratorCore
+from hash_cache import file_digest
+from tracing import span
+
+# Notices files under resource/ and configurator files/ that change on disk (game patches,
+# Workshop updates, hand edits) and brings the core's caches up to date for those files only.
+#
+# A manifest of [size, mtime_ns, digest] per file is kept next to the other caches, so
+# changes made while the configurator was closed are found by the first scan. Afterwards
+# inotify reports the changed paths on Linux; elsewhere, or when inotify is unavailable,
+# the files are polled with os.stat. A file counts as changed only if its digest differs.
+# Changes whose size and mtime match what the configurator itself last wrote or read are
+# not external.
+
+ADDED = "added"
+MODIFIED = "modified"
+REMOVED = "removed"
+
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Change(NamedTuple):
+    path: str
+    kind: str
+    external: bool
+
+
+class _Inotify:
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: Dict[int, str] = {}
+
+    def add(self, directory: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watches[wd] = directory
+
+    def read(self, timeout: float) -> Optional[List[tuple]]:
+        # (directory, name, mask) of each event; None when the kernel queue overflowed
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if wd in self.watches:
+                    events.append((self.watches[wd], os.fsdecode(name), mask))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ChangeWatcher:
+    def __init__(self, core: ConfiguratorCore, manifest_path: Optional[str] = None, poll_interval: float = 2.0,
+                 use_inotify: bool = True):
+        self.core = core
+        self.roots = [core.resource_root(), core.source_root()]
+        self.manifest_path = manifest_path or core.config.get(
+            "watch_manifest_file", os.path.join(core.config['base_dir'], "watch_manifest.json"))
+        self.poll_interval = poll_interval
+        self.last_scan = 0.0
+        self.lock = threading.Lock()
+        self.manifest: Dict[str, list] = {}
+        self.baseline = not self._load()
+        self.inotify: Optional[_Inotify] = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.inotify = _Inotify()
+                for root in self.roots:
+                    self._watch_tree(root)
+            except OSError as e:
+                logging.warning(f"inotify unavailable, polling for changes instead: {str(e)}")
+                self.close()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _load(self) -> bool:
+        try:
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+            return True
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.manifest = {}
+            return False
+
+    def save(self):
+        try:
+            with open(self.manifest_path, "w") as f:
+                json.dump(self.manifest, f)
+        except OSError as e:
+            logging.warning(f"Could not save watch manifest {self.manifest_path}: {str(e)}")
+
+    def close(self):
+        self.stop()
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def _watch_tree(self, root: str):
+        for directory, subdirs, _ in os.walk(root):
+            subdirs[:] = [subdir for subdir in subdirs if not subdir.startswith(".")]
+            self.inotify.add(directory)
+
+    @staticmethod
+    def _tracked(path: str) -> bool:
+        # the journal's .name.id.tmp/.undo side files and other hidden files are not tracked
+        return not os.path.basename(path).startswith(".")
+
+    def _files(self) -> Set[str]:
+        files = set()
+        for root in self.roots:
+            with span("walk", "os.walk", root):
+                for directory, subdirs, names in os.walk(root):
+                    subdirs[:] = [subdir for subdir in subdirs if not subdir.startswith(".")]
+                    files.update(os.path.join(directory, name) for name in names if not name.startswith("."))
+        return files
+
+    def _own_write(self, path: str, stat: os.stat_result) -> bool:
+        # the configurator wrote or read exactly this version of the file
+        hashed = self.core.hash_cache.entries.get(os.path.abspath(path))
+        return self.core.models.stamp(path) == (stat.st_mtime_ns, stat.st_size) or \
+            (hashed is not None and hashed[:2] == [stat.st_size, stat.st_mtime_ns])
+
+    def _check(self, paths: Set[str]) -> List[Change]:
+        changes = []
+        for path in sorted(paths):
+            known = self.manifest.get(path)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if known is not None:
+                    del self.manifest[path]
+                    changes.append(Change(path, REMOVED, True))
+                continue
+            if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                continue
+            external = not self._own_write(path, stat)
+            digest = file_digest(path)
+            self.manifest[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            if known is None:
+                changes.append(Change(path, ADDED, external))
+            elif known[2] != digest:
+                changes.append(Change(path, MODIFIED, external))
+        return changes
+
+    def scan(self) -> List[Change]:
+        # stat every file; used at startup, by the polling fallback and after an inotify overflow
+        self.last_scan = time.monotonic()
+        return self._check(self._files() | set(self.manifest))
+
+    def _apply(self, changes: List[Change]):
+        # re-index only what changed: the caches validate everything else by stamp or hash
+        if not changes:
+            return
+        for change in changes:
+            if change.external:
+                self.core.models.invalidate(change.path)
+            if change.kind == REMOVED:
+                self.core.hash_cache.entries.pop(os.path.abspath(change.path), None)
+                self.core.hash_cache.dirty = True
+            else:
+                self.core.hash_cache.record(change.path, self.manifest[change.path][2])
+        self.core.refresh_indexes()
+        self.save()
+
+    def poll(self, timeout: float = 0.0) -> List[Change]:
+        with self.lock:
+            if self.baseline:
+                # first run: record the current state without reporting every file as added
+                self.scan()
+                self.baseline = False
+                self.save()
+                return []
+            if self.inotify is None or not self.last_scan:
+                if time.monotonic() - self.last_scan < self.poll_interval:
+                    if timeout:
+                        time.sleep(timeout)
+                    return []
+                changes = self.scan()
+            else:
+                events = self.inotify.read(timeout)
+                if events is None:
+                    changes = self.scan()
+                else:
+                    paths = set()
+                    for directory, name, mask in events:
+                        path = os.path.join(directory, name)
+                        if mask & IN_ISDIR:
+                            if mask & (IN_CREATE | IN_MOVED_TO) and self._tracked(path):
+                                self._watch_tree(path)
+                                paths.update(file for file in self._files() if file.startswith(path + os.sep))
+                            else:
+                                paths.update(file for file in self.manifest if file.startswith(path + os.sep))
+                        elif self._tracked(path):
+                            paths.add(path)
+                    changes = self._check(paths)
+            self._apply(changes)
+            return changes
+
+    def start(self, callback: Callable[[List[Change]], None]):
+        # polls on a background thread and calls callback (on that thread) with each batch of changes
+        def run():
+            while not self._stop.is_set():
+                try:
+                    changes = self.poll(min(self.poll_interval, 0.5))
+                    if changes:
+                        callback(changes)
+                except Exception as e:
+                    logging.error(f"Change watcher failed: {str(e)}")
+                    self._stop.wait(self.poll_interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="change-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+
+# Runs file operations off the Tk main thread. Tasks run one at a time on a single
+# worker thread, so two operations never write the same files concurrently. A task
+# reports progress through the callback it is given; the events are queued and the
+# GUI drains them with root.after. Cancelling makes the next progress report raise
+# OperationCancelled, which aborts the journaled commit before anything is replaced.
+
+PROGRESS = "progress"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TaskEvent = Tuple[str, Any]
+ProgressCallback = Callable[[int, int, str], None]
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class Task:
+    def __init__(self, func: Callable[[ProgressCallback], Any]):
+        self.func = func
+        self.events: "queue.Queue[TaskEvent]" = queue.Queue()
+        self.cancel_requested = threading.Event()
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    def report(self, done: int, total: int, message: str):
+        if self.cancel_requested.is_set():
+            raise OperationCancelled("cancelled by the user")
+        self.events.put((PROGRESS, (done, total, message)))
+
+    def run(self):
+        try:
+            if self.cancel_requested.is_set():
+                raise OperationCancelled("cancelled by the user")
+            self.events.put((DONE, self.func(self.report)))
+        except OperationCancelled:
+            logging.info("Operation cancelled, no file was modified")
+            self.events.put((CANCELLED, None))
+        except Exception as e:
+            logging.error(f"Background operation failed: {str(e)}")
+            self.events.put((FAILED, e))
+        finally:
+            self.finished.set()
+
+    def poll(self) -> List[TaskEvent]:
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class Worker:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="configurator-worker")
+
+    def submit(self, func: Callable[[ProgressCallback], Any]) -> Task:
+        task = Task(func)
+        self.executor.submit(task.run)
+        return task
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)